@@ -2,52 +2,535 @@ import torch
 import asyncio
 import base64
 import io
+import json
 import os
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from PIL import Image
 from pydantic import BaseModel
-from diffusers import DiffusionPipeline
+from diffusers import AutoencoderTiny, DiffusionPipeline
 
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
 
-# --- 1. Server and Model Setup ---
+try:
+    from backend.observability import (
+        AI_FRAME_HEADER, CODEC_JPEG, FRAME_FLAG_FINAL, FRAME_FLAG_REDUCED, FRAME_VERSION, MetricsRegistry,
+        setup_logging,
+    )
+except ImportError:
+    # Run with --app-dir backend, where the shared module is a top-level one.
+    from observability import (
+        AI_FRAME_HEADER, CODEC_JPEG, FRAME_FLAG_FINAL, FRAME_FLAG_REDUCED, FRAME_VERSION, MetricsRegistry,
+        setup_logging,
+    )
+
+# --- Logging ---
+logger, log_handler = setup_logging("ai_server")
 
-app = FastAPI()
+# --- 1. Server and Model Setup ---
 
 class ScoringRequest(BaseModel):
     prompt: str
     guess: str
 
 
-print("Loading model... This may take a moment.")
-# if torch.backends.mps.is_available():
-#     device = torch.device("mps")
-#     torch_dtype = torch.float16 
-#     print("Using MPS (Apple Silicon GPU) with float16 precision for stability.")
-#     variant = "fp16"
-# else:
-#     device = torch.device("cpu")
-#     torch_dtype = torch.float32
-#     print("MPS not available, using CPU with float32 precision.")
-#     variant = "fp32"
+class BatchScoringRequest(BaseModel):
+    pairs: List[ScoringRequest]
+
+
+# Everything about where and how the models run comes from the environment, so the same server
+# runs on GPU nodes and on CPU-only nodes. "auto" picks CUDA, then MPS, then the CPU.
+AI_DEVICE = os.environ.get("AI_DEVICE", "auto")
+AI_DTYPE = os.environ.get("AI_DTYPE", "auto")
+DIFFUSION_MODEL_ID = os.environ.get("DIFFUSION_MODEL_ID", "stabilityai/sdxl-turbo")
+SCORING_MODEL_ID = os.environ.get("SCORING_MODEL_ID", "all-MiniLM-L6-v2")
+# 0 keeps PyTorch's defaults.
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0"))
+TORCH_NUM_INTEROP_THREADS = int(os.environ.get("TORCH_NUM_INTEROP_THREADS", "0"))
+# CPU mode: channels-last UNet/VAE, optional torch.compile, and an exported runtime for scoring.
+# Defaults to on when running on the CPU.
+CPU_OPTIMIZED = os.environ.get("CPU_OPTIMIZED", "auto")
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
+# "torch", "onnx" or "openvino"; the exported runtimes need sentence-transformers[onnx] etc.
+SCORING_BACKEND = os.environ.get("SCORING_BACKEND", "auto")
+# Optional square output size in pixels, e.g. 256 for faster low-res generation on the CPU.
+GENERATION_IMAGE_SIZE = int(os.environ.get("GENERATION_IMAGE_SIZE", "0")) or None
+
+DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+
+
+def resolve_device(name: str) -> torch.device:
+    if name != "auto":
+        return torch.device(name)
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+def resolve_dtype(name: str, device: torch.device) -> torch.dtype:
+    if name != "auto":
+        return DTYPES[name]
+    # Half precision is fast on GPUs; on the CPU float32 is both faster and more accurate.
+    return {"cuda": torch.bfloat16, "mps": torch.float16}.get(device.type, torch.float32)
+
+
+if TORCH_NUM_THREADS:
+    torch.set_num_threads(TORCH_NUM_THREADS)
+if TORCH_NUM_INTEROP_THREADS:
+    torch.set_num_interop_threads(TORCH_NUM_INTEROP_THREADS)
+
+device = resolve_device(AI_DEVICE)
+torch_dtype = resolve_dtype(AI_DTYPE, device)
+variant = "fp16" if torch_dtype != torch.float32 else None
+cpu_optimized = CPU_OPTIMIZED == "1" or (CPU_OPTIMIZED == "auto" and device.type == "cpu")
+logger.info("Using %s with %s, %d threads%s.", device, torch_dtype, torch.get_num_threads(),
+            " (CPU optimized)" if cpu_optimized else "")
+
+class ModelNotReady(Exception):
+    """Raised when a request needs a model that is still loading (or failed to load)."""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} model is not ready")
+        self.name = name
+
+
+class ModelSlot:
+    """
+    Loads one model in the background, warms it up, and tracks its readiness.
+
+    Every model loads independently, so the small scoring model serves requests long before
+    the diffusion pipeline has finished loading. `load` and `warmup` run in worker threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load: Callable[[], Any],
+        warmup: Optional[Callable[[Any], None]] = None,
+        on_ready: Optional[Callable[[Any], None]] = None,
+    ):
+        self.name = name
+        self.load = load
+        self.warmup = warmup
+        self.on_ready = on_ready
+        self.state = "pending"
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self.load_s: Optional[float] = None
+        self.warmup_s: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        try:
+            self.state = "loading"
+            logger.info("Loading %s model...", self.name)
+            started = time.perf_counter()
+            value = await asyncio.to_thread(self.load)
+            self.load_s = time.perf_counter() - started
+            if WARMUP_MODELS and self.warmup is not None:
+                self.state = "warming_up"
+                started = time.perf_counter()
+                await asyncio.to_thread(self.warmup, value)
+                self.warmup_s = time.perf_counter() - started
+            self.value = value
+            if self.on_ready is not None:
+                self.on_ready(value)
+            self.state = "ready"
+            logger.info("%s model ready (load %.1fs, warmup %.1fs).",
+                        self.name.capitalize(), self.load_s, self.warmup_s or 0)
+        except Exception as e:
+            self.state = "failed"
+            self.error = repr(e)
+            logger.exception("Failed to load the %s model: %r", self.name, e)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def require(self) -> Any:
+        if not self.ready:
+            raise ModelNotReady(self.name)
+        return self.value
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "load_s": self.load_s,
+            "warmup_s": self.warmup_s,
+        }
+
+
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "1") == "1"
+
+
+def load_diffusion_pipeline():
+    pipe = DiffusionPipeline.from_pretrained(
+        DIFFUSION_MODEL_ID,
+        torch_dtype=torch_dtype,
+        variant=variant,
+        use_safetensors=True,
+    ).to(device)
+
+    if cpu_optimized:
+        # Convolutions in the UNet and VAE run considerably faster with NHWC tensors on the CPU.
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+    if TORCH_COMPILE:
+        logger.info("Compiling the UNet; warmup will take a while.")
+        pipe.unet = torch.compile(pipe.unet)
+    return pipe
+
+
+def warm_up_diffusion_pipeline(pipe):
+    # One short generation at the serving size compiles and caches the kernels real requests use.
+    pipe(
+        prompt="a warmup image",
+        num_inference_steps=1,
+        guidance_scale=0.0,
+        height=GENERATION_IMAGE_SIZE,
+        width=GENERATION_IMAGE_SIZE,
+    )
+
+
+# Optional tiny autoencoder (e.g. "madebyollin/taesdxl") for cheap previews of intermediate steps.
+PREVIEW_TINY_VAE = os.environ.get("PREVIEW_TINY_VAE")
+
+
+def load_preview_decoder():
+    return AutoencoderTiny.from_pretrained(PREVIEW_TINY_VAE, torch_dtype=torch_dtype).to(device)
+
+
+def load_similarity_model() -> SentenceTransformer:
+    backend = SCORING_BACKEND
+    if backend == "auto":
+        backend = "onnx" if cpu_optimized else "torch"
+    if backend != "torch":
+        try:
+            return SentenceTransformer(SCORING_MODEL_ID, device=str(device), backend=backend)
+        except Exception as e:
+            # The exported runtimes are optional extras; plain PyTorch always works.
+            logger.warning("Could not load the %s scoring backend (%r); using torch.", backend, e)
+    return SentenceTransformer(SCORING_MODEL_ID, device=str(device))
+
+
+def load_scoring_model() -> SentenceTransformer:
+    model = load_similarity_model()
+    # Scoring reads the catalog, so it is encoded as part of loading, with or without WARMUP_MODELS.
+    # It also warms the model up, so the slot needs no separate warmup.
+    prompt_embeddings.update(load_prompt_embeddings(model))
+    logger.info("Cached embeddings for %d prompts.", len(prompt_embeddings))
+    return model
+
+
+scoring_model = ModelSlot("scoring", load_scoring_model)
+diffusion_model = ModelSlot(
+    "diffusion", load_diffusion_pipeline, warm_up_diffusion_pipeline,
+    on_ready=lambda pipe: generation_scheduler.use_pipeline(pipe),
+)
+preview_model = ModelSlot("preview", load_preview_decoder)
+model_slots = [scoring_model, diffusion_model] + ([preview_model] if PREVIEW_TINY_VAE else [])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for slot in model_slots:
+        slot.start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(ModelNotReady)
+async def model_not_ready_handler(request: Request, exc: ModelNotReady):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
 
-device = torch.device("cuda")
-torch_dtype = torch.bfloat16
-variant = "fp16"
 
-pipeline = DiffusionPipeline.from_pretrained(
-    "stabilityai/sdxl-turbo", 
-    torch_dtype=torch_dtype,
-    variant=variant,
-    use_safetensors=True,
-).to(device)
+@app.get("/health/live")
+async def health_live():
+    """The process is up and its event loop is responsive."""
+    return {"status": "ok"}
 
 
-print("Loading similarity scoring model...")
-similarity_model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
-print("Similarity model loaded.")
+@app.get("/health/ready")
+async def health_ready():
+    """Ready once every model is loaded and warmed up; reports each model's state either way."""
+    models = {slot.name: slot.status() for slot in model_slots}
+    ready = all(slot.ready for slot in model_slots)
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "models": models})
+
+
+@app.get("/health/ready/{model}")
+async def health_model_ready(model: str):
+    """Per-model readiness, so scoring traffic can be routed here before generation is up."""
+    slot = next((slot for slot in model_slots if slot.name == model), None)
+    if slot is None:
+        return JSONResponse(status_code=404, content={"detail": f"unknown model {model!r}"})
+    return JSONResponse(status_code=200 if slot.ready else 503, content=slot.status())
+
+
+# Per-stage latency histograms, gauges and counters (see observability.py), served at /metrics.
+metrics = MetricsRegistry()
+GENERATION_QUEUE_TIME = metrics.histogram(
+    "ai_generation_queue_seconds", "Time a generation request waits before its batch starts."
+)
+GENERATION_STEP_TIME = metrics.histogram(
+    "ai_generation_step_seconds", "Time of one denoising step for a whole batch, excluding decoding."
+)
+FRAME_DECODE_TIME = metrics.histogram(
+    "ai_frame_decode_seconds", "Latent to image decode time per image.", ("mode",)
+)
+FRAME_ENCODE_TIME = metrics.histogram("ai_frame_encode_seconds", "JPEG encode time per image.")
+FRAME_SEND_TIME = metrics.histogram(
+    "ai_frame_send_seconds", "Time to write one message to a generation websocket, including waiting for the socket."
+)
+GENERATION_FINAL_FRAME_TIME = metrics.histogram(
+    "ai_generation_final_frame_seconds", "Time from a generation request arriving to its final frame."
+)
+QUALITY_STEPS = metrics.histogram(
+    "ai_quality_steps", "Inference steps the quality controller picked per request.", buckets=(1, 2, 3, 4, 6, 8)
+)
+QUALITY_IMAGE_SIZE = metrics.histogram(
+    "ai_quality_image_size", "Image size the quality controller picked per request (0: the model's default).",
+    buckets=(0, 256, 384, 512, 768, 1024),
+)
+QUALITY_PREVIEW_EVERY = metrics.histogram(
+    "ai_quality_preview_every", "Steps between the intermediate frames the quality controller picked per request.",
+    buckets=(1, 2, 4, 8),
+)
+QUALITY_ESTIMATED_TIME = metrics.histogram(
+    "ai_quality_estimated_seconds", "Predicted time to the final frame of the quality controller's pick."
+)
+SCORING_ENCODE_TIME = metrics.histogram(
+    "ai_scoring_encode_seconds", "Time to embed one batch of guesses with the scoring model."
+)
+metrics.counter("ai_log_records_dropped_total", "Log records dropped because the log queue was full.",
+                lambda: log_handler.dropped)
+metrics.gauge("ai_generation_queue_depth", "Generation requests waiting for a batch.",
+              lambda: generation_scheduler.queued_jobs())
+metrics.counter("ai_frames_dropped_total", "Intermediate frames replaced by a newer one before they could be sent.",
+                lambda: FrameSender.frames_dropped)
+metrics.counter("ai_quality_degraded_total", "Requests given fewer steps or a smaller image than the best quality.",
+                lambda: generation_scheduler.quality.degraded if generation_scheduler.quality else 0)
+metrics.counter("ai_generation_deadline_misses_total", "Requests whose final frame arrived after their deadline.",
+                lambda: generation_scheduler.deadline_misses)
+metrics.counter("ai_generation_jobs_cancelled_total", "Generation requests cancelled before they finished.",
+                lambda: generation_scheduler.jobs_cancelled_queued + generation_scheduler.jobs_cancelled_running)
+metrics.counter("ai_generation_batches_aborted_total", "Batches stopped early because every request in them was cancelled.",
+                lambda: generation_scheduler.batches_aborted)
+metrics.counter("ai_generation_reclaimed_seconds_total", "Estimated device time saved by stopping cancelled batches early.",
+                lambda: generation_scheduler.reclaimed_s)
+for slot in model_slots:
+    metrics.gauge(f"ai_{slot.name}_model_ready", f"1 once the {slot.name} model is loaded and warmed up.",
+                  lambda slot=slot: int(slot.ready))
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage latency histograms and gauges in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# --- 2. Scoring Endpoint with Embedding Caches ---
+
+# The game server only ever scores guesses against prompts from this catalog.
+PROMPTS_PATH = os.environ.get(
+    "PROMPTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.json")
+)
+GUESS_CACHE_SIZE = int(os.environ.get("GUESS_CACHE_SIZE", "10000"))
+SCORING_BATCH_WINDOW_MS = float(os.environ.get("SCORING_BATCH_WINDOW_MS", "5"))
+SCORING_MAX_BATCH = int(os.environ.get("SCORING_MAX_BATCH", "64"))
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a sentence. The MiniLM tokenizer is uncased and ignores extra whitespace."""
+    return " ".join(text.lower().split())
+
+
+def encode_normalized(model: SentenceTransformer, sentences):
+    """Encodes sentences into unit-length embeddings, so cosine similarity is a dot product."""
+    return model.encode(sentences, convert_to_tensor=True, normalize_embeddings=True)
+
+
+class EmbeddingCache:
+    """A bounded LRU cache of sentence embeddings with hit/miss counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        embedding = self.entries.get(key)
+        if embedding is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return embedding
+
+    def put(self, key: str, embedding):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = embedding
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def load_prompt_embeddings(model: SentenceTransformer) -> dict:
+    """Encodes the whole prompt catalog in one batch at startup."""
+    try:
+        with open(PROMPTS_PATH) as prompts_file:
+            prompts = json.load(prompts_file)
+    except OSError as e:
+        logger.error("Could not read prompt catalog at %s: %s", PROMPTS_PATH, e)
+        return {}
+    keys = list(dict.fromkeys(normalize_text(prompt) for prompt in prompts))
+    embeddings = encode_normalized(model, keys)
+    return {key: embeddings[i] for i, key in enumerate(keys)}
+
+
+# Filled in when the scoring model has loaded.
+prompt_embeddings: dict = {}
+guess_embedding_cache = EmbeddingCache(GUESS_CACHE_SIZE)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding lookups into a single encode(list) call.
+
+    Sentences already in the prompt table or the guess cache resolve immediately. Misses are
+    queued and collected for up to `window_s` (or until `max_batch` sentences are waiting), then
+    encoded together in a worker thread. Concurrent requests for the same sentence share one slot.
+    """
+
+    def __init__(self, window_s: float, max_batch: int):
+        self.window_s = window_s
+        self.max_batch = max(1, max_batch)
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.worker_task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.encoded_sentences = 0
+
+    def ensure_worker(self, loop: asyncio.AbstractEventLoop):
+        if self.worker_task is not None and not self.worker_task.done() and self.worker_task.get_loop() is loop:
+            return
+        # The queue and pending futures belong to the loop the worker ran on, so start afresh.
+        self.queue = asyncio.Queue()
+        self.pending = {}
+        self.worker_task = loop.create_task(self.run())
+
+    async def embed(self, texts: List[str]) -> list:
+        loop = asyncio.get_running_loop()
+        self.ensure_worker(loop)
+
+        results = []
+        for text in texts:
+            key = normalize_text(text)
+            embedding = prompt_embeddings.get(key)
+            if embedding is None:
+                embedding = guess_embedding_cache.get(key)
+            if embedding is not None:
+                results.append(embedding)
+                continue
+            future = self.pending.get(key)
+            if future is None:
+                future = loop.create_future()
+                self.pending[key] = future
+                self.queue.put_nowait(key)
+            results.append(future)
+        return [await r if isinstance(r, asyncio.Future) else r for r in results]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.encode_batch(batch)
+
+    async def encode_batch(self, keys: List[str]):
+        try:
+            started = time.perf_counter()
+            embeddings = await asyncio.to_thread(encode_normalized, scoring_model.require(), keys)
+            SCORING_ENCODE_TIME.observe(time.perf_counter() - started)
+        except Exception as e:
+            for key in keys:
+                future = self.pending.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.encoded_sentences += len(keys)
+        for i, key in enumerate(keys):
+            guess_embedding_cache.put(key, embeddings[i])
+            future = self.pending.pop(key)
+            if not future.done():
+                future.set_result(embeddings[i])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "encoded_sentences": self.encoded_sentences,
+            "avg_batch_size": self.encoded_sentences / self.batches if self.batches else 0.0,
+            "queued": self.queue.qsize(),
+        }
+
+
+embedding_batcher = EmbeddingBatcher(SCORING_BATCH_WINDOW_MS / 1000, SCORING_MAX_BATCH)
+
+
+async def score_pairs(pairs: List[Tuple[str, str]]) -> List[float]:
+    """Scores (prompt, guess) pairs on a 0-100 scale, embedding every distinct sentence at most once."""
+    scoring_model.require()
+    texts = list(dict.fromkeys(text for pair in pairs for text in pair if text))
+    embeddings = dict(zip(texts, await embedding_batcher.embed(texts)))
+
+    scores = []
+    for prompt, guess in pairs:
+        if not prompt or not guess:
+            scores.append(0.0)
+            continue
+        # Both embeddings are unit length, so their dot product is the cosine similarity.
+        cosine_score = torch.dot(embeddings[prompt], embeddings[guess])
+        scores.append(max(0, cosine_score.item()) * 100)
+    return scores
 
-# --- 2. NEW Scoring Endpoint ---
 
 @app.post("/score/similarity")
 async def score_similarity(request: ScoringRequest):
@@ -57,81 +540,765 @@ async def score_similarity(request: ScoringRequest):
     if not request.prompt or not request.guess:
         return {"score": 0.0}
 
-    # Generate embeddings for both prompts
-    embedding1 = similarity_model.encode(request.prompt, convert_to_tensor=True)
-    embedding2 = similarity_model.encode(request.guess, convert_to_tensor=True)
+    similarity_percentage = (await score_pairs([(request.prompt, request.guess)]))[0]
 
-    # Calculate cosine similarity
-    cosine_score = util.cos_sim(embedding1, embedding2)
+    logger.debug("Scoring: '%s' vs '%s' -> %.2f%%", request.prompt, request.guess, similarity_percentage,
+                 extra={"sample": "scoring"})
 
-    # Normalize to a 0-100 scale
-    similarity_percentage = max(0, cosine_score.item()) * 100
+    return {"score": similarity_percentage}
 
-    print(f"Scoring: '{request.prompt}' vs '{request.guess}' -> {similarity_percentage:.2f}%")
 
-    return {"score": similarity_percentage}
+@app.post("/score/similarity/batch")
+async def score_similarity_batch(request: BatchScoringRequest):
+    """Scores many (prompt, guess) pairs in one request. Scores come back in request order."""
+    scores = await score_pairs([(pair.prompt, pair.guess) for pair in request.pairs])
+    return {"scores": scores}
+
+
+@app.get("/score/stats")
+async def score_stats():
+    """Reports embedding cache counters, used to size GUESS_CACHE_SIZE."""
+    return {
+        "prompt_embeddings": len(prompt_embeddings),
+        "guess_cache": guess_embedding_cache.stats(),
+        "batcher": embedding_batcher.stats(),
+    }
 
 
 # --- 3. WebSocket Endpoint for Image Generation ---
+#
+# /ws/generate speaks two protocols on the same socket:
+#
+# * Legacy: the client sends a bare prompt (or a JSON object without an "id") and receives one
+#   base64 JPEG text frame per step, followed by the string "generation_complete". Requests on
+#   one socket are handled one at a time.
+# * Multiplexed: the client sends {"type": "generate", "id", "prompt", "seed", "steps"} and may
+#   have any number of requests in flight on one socket. Every reply is a JSON object tagged
+#   with the request id: {"type": "frame", "id", "step", "total_steps", "elapsed_ms",
+#   "step_ms", "reduced", "image"}, then {"type": "complete", "id", "elapsed_ms"} or
+#   {"type": "error", "id", "message"}. A malformed request, or one reusing the id of a request
+#   still in flight, gets that error reply on its own; the socket and its other requests carry on.
+#   {"type": "cancel", "id"} withdraws a request. A queued request is dropped. A running batch
+#   stops at its next step once every request in it has been cancelled. Otherwise the cancelled
+#   request's frames are no longer decoded. No further replies are sent for it. Closing the
+#   socket cancels all of its requests.
+#   With "binary": true in the request, frames are sent as binary messages instead: an
+#   AI_FRAME_HEADER (see observability.py) followed by the request id and the raw JPEG bytes,
+#   saving the base64 step.
+#
+# Both protocols share one FrameSender per socket. A client that reads slower than frames are
+# produced misses intermediate frames (the newest one per request is kept). It still gets
+# every final frame and completion message, in order.
+#
+# "preview" picks how intermediate steps are decoded (see PREVIEW_MODES); the final frame is
+# always decoded with the full VAE.
+#
+# Under load, the QualityController lowers a request's steps, image size and preview frequency
+# so that its final frame arrives within "deadline_ms" (GENERATION_DEADLINE_S by default).
+# "steps" is an upper bound, total_steps is what was actually run, and skipped previews never
+# send a frame. "reduced" marks frames below the best quality the request could have had, which
+# clients should not cache.
+
+DEFAULT_INFERENCE_STEPS = 4
+MAX_INFERENCE_STEPS = int(os.environ.get("MAX_INFERENCE_STEPS", "8"))
+GENERATION_MAX_BATCH = int(os.environ.get("GENERATION_MAX_BATCH", "4"))
+GENERATION_BATCH_WINDOW_MS = float(os.environ.get("GENERATION_BATCH_WINDOW_MS", "20"))
+# Target time from a request arriving to its final frame, for requests without "deadline_ms".
+GENERATION_DEADLINE_S = float(os.environ.get("GENERATION_DEADLINE_S", "8"))
+# Load-adaptive quality (see QualityController). QUALITY_CONTROL=0 always uses the requested
+# steps at the largest size, with a preview of every step.
+QUALITY_CONTROL = os.environ.get("QUALITY_CONTROL", "1") == "1"
+# Sizes the controller may pick from, largest first, e.g. "512,384,256". Defaults to the single
+# GENERATION_IMAGE_SIZE.
+QUALITY_IMAGE_SIZES = [
+    int(size) // 8 * 8 for size in os.environ.get("QUALITY_IMAGE_SIZES", "").split(",") if size.strip()
+] or [GENERATION_IMAGE_SIZE]
+QUALITY_MIN_STEPS = int(os.environ.get("QUALITY_MIN_STEPS", "1"))
+# Pin one decision instead of adapting it; 0 leaves it to the controller.
+QUALITY_FORCE_STEPS = int(os.environ.get("QUALITY_FORCE_STEPS", "0"))
+QUALITY_FORCE_IMAGE_SIZE = int(os.environ.get("QUALITY_FORCE_IMAGE_SIZE", "0")) // 8 * 8
+QUALITY_FORCE_PREVIEW_EVERY = int(os.environ.get("QUALITY_FORCE_PREVIEW_EVERY", "0"))
+# Messages one /ws/generate connection may have waiting to be sent before queued intermediate
+# frames are dropped.
+GENERATION_SEND_QUEUE = int(os.environ.get("GENERATION_SEND_QUEUE", "32"))
+
+# "full": the pipeline's VAE, the same as the final frame.
+# "tiny": PREVIEW_TINY_VAE, when one is configured; otherwise falls back to "linear".
+# "linear": a fixed latent-to-RGB projection at latent resolution (1/8 of the image size).
+PREVIEW_MODES = ("full", "tiny", "linear")
+DEFAULT_PREVIEW_MODE = os.environ.get("DEFAULT_PREVIEW_MODE", "linear")
+
+# Least-squares fit of SDXL latents to RGB, from the latent preview literature.
+LATENT_RGB_FACTORS = [
+    [0.3651, 0.4232, 0.4341],
+    [-0.2533, -0.0042, 0.1068],
+    [0.1076, 0.1111, -0.0362],
+    [-0.3165, -0.2492, -0.2188],
+]
+LATENT_RGB_BIAS = [0.1084, -0.0175, -0.0011]
+
+
+def decode_message(message: str) -> dict:
+    """Parses a client message; anything that is not a JSON object is a bare prompt."""
+    try:
+        request = json.loads(message)
+    except ValueError:
+        request = None
+    if not isinstance(request, dict):
+        request = {"prompt": message}
+    return request
+
+
+def parse_generation_request(request: dict) -> dict:
+    """
+    Normalizes a generation request {"id", "client", "prompt", "seed", "steps", "preview",
+    "deadline_ms"}. A seed makes the generation deterministic, so callers can cache the resulting
+    frames. "client" identifies the room the request is for, so the scheduler can be fair across
+    rooms. "steps" is an upper bound that the quality controller may lower to meet the deadline.
+    Raises ValueError for a malformed request.
+    """
+    request_id = request.get("id")
+    if request_id is not None and not isinstance(request_id, str):
+        raise ValueError(f"id must be a string, got {request_id!r}")
+    try:
+        seed = request.get("seed")
+        seed = int(seed) if seed is not None else None
+        steps = int(request.get("steps") or DEFAULT_INFERENCE_STEPS)
+        deadline_ms = request.get("deadline_ms")
+        deadline_s = float(deadline_ms) / 1000 if deadline_ms else GENERATION_DEADLINE_S
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"invalid generation request: {e}") from e
+    if not 0 < deadline_s < float("inf"):
+        raise ValueError(f"invalid generation request: deadline_ms must be positive, got {deadline_ms!r}")
+    return {
+        "id": request_id,
+        "client": request.get("client"),
+        "binary": bool(request.get("binary", False)),
+        "prompt": str(request.get("prompt", "")),
+        "seed": seed,
+        "steps": max(1, min(steps, MAX_INFERENCE_STEPS)),
+        "preview": resolve_preview_mode(request.get("preview")),
+        "deadline_s": deadline_s,
+        # Filled in by the quality controller.
+        "size": QUALITY_IMAGE_SIZES[0],
+        "preview_every": 1,
+        "reduced": False,
+    }
+
+
+def resolve_preview_mode(mode: Optional[str]) -> str:
+    mode = mode if mode in PREVIEW_MODES else DEFAULT_PREVIEW_MODE
+    if mode == "tiny" and not preview_model.ready:
+        return "linear"
+    return mode
+
+
+def decode_latents(pipe, latents: torch.Tensor, mode: str) -> list:
+    """Decodes a batch of latents to PIL images with the given preview mode."""
+    if mode == "linear":
+        factors = torch.tensor(LATENT_RGB_FACTORS, device=latents.device)
+        bias = torch.tensor(LATENT_RGB_BIAS, device=latents.device)
+        rgb = torch.einsum("bchw,cr->bhwr", latents.float(), factors) + bias
+        pixels = ((rgb + 1) * 127.5).clamp(0, 255).to(torch.uint8).cpu().numpy()
+        return [Image.fromarray(image) for image in pixels]
+    vae = preview_model.value if mode == "tiny" else pipe.vae
+    return pipe.image_processor.postprocess(
+        vae.decode(latents / vae.config.scaling_factor, return_dict=False)[0]
+    )
+
+
+class GenerationJob:
+    """One queued generation request. `on_frame` is called from the pipeline thread."""
+
+    def __init__(self, request: dict, client_id: str, on_frame: Callable[[int, int, bytes], None],
+                 future: asyncio.Future):
+        self.request = request
+        self.client_id = client_id
+        self.on_frame = on_frame
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        # Set from the event loop, read by the pipeline thread at every step.
+        self.cancelled = False
+
+
+class GenerationCancelled(Exception):
+    """Raised from the step callback to stop a batch whose requests were all cancelled."""
+
+    def __init__(self, remaining_steps: int):
+        super().__init__(f"cancelled with {remaining_steps} steps left")
+        self.remaining_steps = remaining_steps
+
+
+def batch_key(request: dict) -> tuple:
+    """Only requests that agree on these settings can share one pipeline call."""
+    return (request["steps"], request["size"])
+
+
+class QualityController:
+    """
+    Picks the steps, image size and preview frequency of each generation request, so that its
+    final frame should arrive within the request's deadline.
+
+    The prediction is the wait for the batches queued ahead of the request, at the recent batch
+    duration, plus the request's own steps and decodes at the recent latencies for its size.
+    Sizes that have not run yet are estimated from another size by pixel count. Candidates are
+    tried from the best quality down: the largest size first, then the most steps up to the
+    requested count, then a preview of every step before every other step. The first candidate
+    that fits is used. When none fits, the smallest size and fewest steps are used, with only
+    the final frame decoded. Any of the three decisions can be pinned instead.
+    """
+
+    # Weight of the newest sample in the latency averages.
+    smoothing = 0.2
+
+    def __init__(self, sizes: List[Optional[int]], min_steps: int, enabled: bool = True, force_steps: int = 0,
+                 force_size: int = 0, force_preview_every: int = 0):
+        self.sizes = sorted(sizes, key=lambda size: size or 0, reverse=True)
+        self.min_steps = max(1, min_steps)
+        self.enabled = enabled
+        self.force_steps = force_steps
+        self.force_size = force_size
+        self.force_preview_every = force_preview_every
+        # Recent latencies: per-step time of a batch by size, per-image decode time by mode and
+        # size, and the duration of a whole batch.
+        self.step_s: Dict[Optional[int], float] = {}
+        self.decode_s: Dict[str, Dict[Optional[int], float]] = {mode: {} for mode in PREVIEW_MODES}
+        self.batch_s = 0.0
+        self.decisions = 0
+        self.degraded = 0
+
+    def average(self, samples: Dict[Any, float], key, value: float):
+        previous = samples.get(key)
+        samples[key] = value if previous is None else previous + self.smoothing * (value - previous)
+
+    def observe_step(self, size: Optional[int], step_s: float):
+        self.average(self.step_s, size, step_s)
+
+    def observe_decode(self, mode: str, size: Optional[int], decode_s: float):
+        self.average(self.decode_s[mode], size, decode_s)
+
+    def observe_batch(self, batch_s: float):
+        self.batch_s = batch_s if not self.batch_s else self.batch_s + self.smoothing * (batch_s - self.batch_s)
+
+    @staticmethod
+    def scaled(samples: Dict[Optional[int], float], size: Optional[int]) -> float:
+        if size in samples:
+            return samples[size]
+        for other, value in samples.items():
+            if other and size:
+                return value * (size / other) ** 2
+        return 0.0
+
+    def generation_s(self, steps: int, size: Optional[int], preview_every: int, preview: str) -> float:
+        previews = (steps - 1) // preview_every
+        return (steps * self.scaled(self.step_s, size) + previews * self.scaled(self.decode_s[preview], size)
+                + self.scaled(self.decode_s["full"], size))
+
+    def candidates(self, requested_steps: int) -> List[Tuple[int, Optional[int], int]]:
+        """(steps, size, preview_every) from the best quality to the cheapest."""
+        steps_options = (
+            [self.force_steps] if self.force_steps
+            else list(range(requested_steps, min(self.min_steps, requested_steps) - 1, -1))
+        )
+        sizes = [self.force_size] if self.force_size else self.sizes
+        every_options = [self.force_preview_every] if self.force_preview_every else [1, 2]
+        ladder = [(steps, size, every) for size in sizes for steps in steps_options for every in every_options]
+        if not self.enabled:
+            return ladder[:1]
+        if not self.force_preview_every:
+            ladder.append((steps_options[-1], sizes[-1], steps_options[-1]))
+        return ladder
+
+    def plan(self, request: dict, queued_jobs: int, max_batch: int, running: bool):
+        """Sets the request's "steps", "size", "preview_every" and "reduced"."""
+        wait_s = (queued_jobs // max_batch + (0.5 if running else 0.0)) * self.batch_s
+        ladder = self.candidates(request["steps"])
+        steps, size, preview_every = ladder[-1]
+        estimated_s = wait_s + self.generation_s(steps, size, preview_every, request["preview"])
+        for candidate in ladder:
+            candidate_s = wait_s + self.generation_s(*candidate, request["preview"])
+            if candidate_s <= request["deadline_s"]:
+                (steps, size, preview_every), estimated_s = candidate, candidate_s
+                break
+
+        best_steps, best_size, _ = ladder[0]
+        reduced = steps < best_steps or (size or 0) < (best_size or 0)
+        request.update(steps=steps, size=size, preview_every=preview_every, reduced=reduced)
+        self.decisions += 1
+        self.degraded += reduced
+        QUALITY_STEPS.observe(steps)
+        QUALITY_IMAGE_SIZE.observe(size or 0)
+        QUALITY_PREVIEW_EVERY.observe(preview_every)
+        QUALITY_ESTIMATED_TIME.observe(estimated_s)
+
+    def stats(self) -> dict:
+        return {
+            "decisions": self.decisions,
+            "degraded": self.degraded,
+            "batch_ms": round(self.batch_s * 1000, 1),
+            "step_ms": {str(size or "default"): round(s * 1000, 1) for size, s in self.step_s.items()},
+        }
+
+
+class GenerationScheduler:
+    """
+    Runs queued generation requests from every connection as batched pipeline calls.
+
+    Jobs are queued per client (a room, or a connection when no client is given). Each batch
+    takes up to `max_batch` compatible jobs round-robin across clients, and clients that were
+    served move to the back of the line, so a busy client cannot starve the others. The
+    per-step latents of a batch are decoded together and demultiplexed to each job's callback.
+    """
+
+    def __init__(self, pipe, max_batch: int, window_s: float, quality: Optional[QualityController] = None):
+        self.pipe = pipe
+        self.quality = quality
+        self.running = False
+        self.max_batch = max(1, max_batch)
+        self.window_s = window_s
+        self.queues: "OrderedDict[str, deque[GenerationJob]]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.worker_task: Optional[asyncio.Task] = None
+        self.jobs_completed = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        self.busy_s = 0.0
+        self.jobs_cancelled_queued = 0
+        self.jobs_cancelled_running = 0
+        self.batches_aborted = 0
+        self.reclaimed_s = 0.0
+        self.deadline_misses = 0
+        self.queue_waits_ms: "deque[float]" = deque(maxlen=256)
+        self.step_times_ms: "deque[float]" = deque(maxlen=256)
+        # Per-image decode + JPEG encode time, by decoder, to compare the preview modes.
+        self.decode_times_ms: Dict[str, "deque[float]"] = {mode: deque(maxlen=256) for mode in PREVIEW_MODES}
+
+    def use_pipeline(self, pipe):
+        self.pipe = pipe
+
+    def queued_jobs(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def submit(self, request: dict, client_id: str, on_frame: Callable[[int, int, bytes], None]):
+        """Queues a generation and waits until every one of its frames has been produced."""
+        if self.pipe is None:
+            raise ModelNotReady("diffusion")
+        loop = asyncio.get_running_loop()
+        if self.worker_task is None or self.worker_task.done() or self.worker_task.get_loop() is not loop:
+            self.wakeup = asyncio.Event()
+            self.worker_task = loop.create_task(self.run())
+
+        if self.quality is not None:
+            self.quality.plan(request, self.queued_jobs(), self.max_batch, self.running)
+        job = GenerationJob(request, client_id, on_frame, loop.create_future())
+        self.queues.setdefault(client_id, deque()).append(job)
+        self.wakeup.set()
+        try:
+            await job.future
+        except asyncio.CancelledError:
+            # Jobs that have not started yet can simply be forgotten; running ones are stopped
+            # by the pipeline thread.
+            queue = self.queues.get(client_id)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                if not queue:
+                    del self.queues[client_id]
+                self.jobs_cancelled_queued += 1
+            else:
+                job.cancelled = True
+                self.jobs_cancelled_running += 1
+            raise
+
+    def next_batch(self) -> List[GenerationJob]:
+        batch: List[GenerationJob] = []
+        key = None
+        while len(batch) < self.max_batch:
+            added = False
+            for client_id in list(self.queues):
+                queue = self.queues[client_id]
+                job = next((j for j in queue if key is None or batch_key(j.request) == key), None)
+                if job is None:
+                    continue
+                key = batch_key(job.request)
+                queue.remove(job)
+                batch.append(job)
+                added = True
+                if not queue:
+                    del self.queues[client_id]
+                if len(batch) >= self.max_batch:
+                    break
+            if not added:
+                break
+        for job in batch:
+            if job.client_id in self.queues:
+                self.queues.move_to_end(job.client_id)
+        return batch
+
+    async def run(self):
+        while True:
+            if not self.queues:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            if self.queued_jobs() < self.max_batch and self.window_s > 0:
+                # Give requests from other rooms a moment to arrive and share this batch.
+                await asyncio.sleep(self.window_s)
+            batch = self.next_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for job in batch:
+                self.queue_waits_ms.append((started - job.enqueued_at) * 1000)
+                GENERATION_QUEUE_TIME.observe(started - job.enqueued_at)
+            self.running = True
+            try:
+                await asyncio.to_thread(self.run_batch, batch)
+            except Exception as e:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            else:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_result(None)
+            finally:
+                self.running = False
+            if self.quality is not None:
+                self.quality.observe_batch(time.perf_counter() - started)
+            self.busy_s += time.perf_counter() - started
+            self.batches += 1
+            self.batched_jobs += len(batch)
+            self.jobs_completed += sum(not job.cancelled for job in batch)
+
+    def run_batch(self, batch: List[GenerationJob]):
+        """Runs one batched pipeline call; executes in a worker thread."""
+        steps = batch[0].request["steps"]
+        size = batch[0].request["size"]
+        # One generator per job keeps each seeded result independent of what it was batched with.
+        generators = [
+            torch.Generator(device=self.pipe.device).manual_seed(
+                job.request["seed"] if job.request["seed"] is not None else random.randrange(2 ** 32)
+            )
+            for job in batch
+        ]
+        last_step_at = time.perf_counter()
+
+        step_s = 0.0
+
+        def stream_intermediate_images(pipe, step, timestep, callback_kwargs):
+            nonlocal last_step_at, step_s
+            now = time.perf_counter()
+            step_s = now - last_step_at
+            self.step_times_ms.append(step_s * 1000)
+            GENERATION_STEP_TIME.observe(step_s)
+            if self.quality is not None:
+                self.quality.observe_step(size, step_s)
+            if all(job.cancelled for job in batch):
+                # Nobody is waiting for these images, so free the device for the next batch.
+                raise GenerationCancelled(steps - step - 1)
+
+            # Decode the jobs sharing a preview mode together (the final frame always uses the
+            # full VAE), then hand each image to the job it belongs to.
+            latents = callback_kwargs["latents"]
+            final = step + 1 == steps
+            modes: Dict[str, List[int]] = {}
+            for index, job in enumerate(batch):
+                if job.cancelled or (not final and (step + 1) % job.request["preview_every"]):
+                    continue
+                mode = "full" if step + 1 == steps else job.request["preview"]
+                modes.setdefault(mode, []).append(index)
+            for mode, indices in modes.items():
+                decode_started = time.perf_counter()
+                images = decode_latents(pipe, latents[indices], mode)
+                encode_started = time.perf_counter()
+                encoded = []
+                for image in images:
+                    buffer = io.BytesIO()
+                    image.save(buffer, format="JPEG")
+                    encoded.append(buffer.getvalue())
+                encode_finished = time.perf_counter()
+                decode_s = (encode_started - decode_started) / len(indices)
+                encode_s = (encode_finished - encode_started) / len(indices)
+                per_image_ms = (decode_s + encode_s) * 1000
+                self.decode_times_ms[mode].extend([per_image_ms] * len(indices))
+                for _ in indices:
+                    FRAME_DECODE_TIME.observe(decode_s, mode)
+                    FRAME_ENCODE_TIME.observe(encode_s)
+                if self.quality is not None:
+                    self.quality.observe_decode(mode, size, decode_s + encode_s)
+                for index, image_bytes in zip(indices, encoded):
+                    job = batch[index]
+                    if final:
+                        elapsed_s = encode_finished - job.enqueued_at
+                        GENERATION_FINAL_FRAME_TIME.observe(elapsed_s)
+                        self.deadline_misses += elapsed_s > job.request["deadline_s"]
+                    job.on_frame(step + 1, steps, image_bytes)
+            last_step_at = time.perf_counter()
+            return callback_kwargs
+
+        try:
+            self.pipe(
+                prompt=[job.request["prompt"] for job in batch],
+                num_inference_steps=steps,
+                guidance_scale=0.0,
+                generator=generators,
+                height=size,
+                width=size,
+                # Every frame, including the last, is decoded in the callback above.
+                output_type="latent",
+                callback_on_step_end_steps=1,
+                callback_on_step_end=stream_intermediate_images,
+            )
+        except GenerationCancelled as e:
+            self.batches_aborted += 1
+            self.reclaimed_s += e.remaining_steps * step_s
+            logger.info("Stopped a cancelled batch of %d with %d steps left.", len(batch), e.remaining_steps)
+
+    def stats(self) -> dict:
+        waits = sorted(self.queue_waits_ms)
+        return {
+            "queue_depth": self.queued_jobs(),
+            "clients_waiting": len(self.queues),
+            "jobs_completed": self.jobs_completed,
+            "jobs_cancelled_queued": self.jobs_cancelled_queued,
+            "jobs_cancelled_running": self.jobs_cancelled_running,
+            "batches_aborted": self.batches_aborted,
+            "reclaimed_s": round(self.reclaimed_s, 3),
+            "deadline_misses": self.deadline_misses,
+            "batches": self.batches,
+            "avg_batch_size": self.batched_jobs / self.batches if self.batches else 0.0,
+            "busy_s": round(self.busy_s, 3),
+            "queue_wait_ms_p50": waits[len(waits) // 2] if waits else 0.0,
+            "queue_wait_ms_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "avg_step_ms": sum(self.step_times_ms) / len(self.step_times_ms) if self.step_times_ms else 0.0,
+            "avg_decode_ms": {
+                mode: sum(times) / len(times) for mode, times in self.decode_times_ms.items() if times
+            },
+            "quality": self.quality.stats() if self.quality is not None else None,
+        }
+
+
+# The diffusion model hands its pipeline over once it is ready.
+generation_scheduler = GenerationScheduler(
+    None, GENERATION_MAX_BATCH, GENERATION_BATCH_WINDOW_MS / 1000,
+    QualityController(
+        QUALITY_IMAGE_SIZES, QUALITY_MIN_STEPS, QUALITY_CONTROL, QUALITY_FORCE_STEPS, QUALITY_FORCE_IMAGE_SIZE,
+        QUALITY_FORCE_PREVIEW_EVERY,
+    ),
+)
+
+
+@app.get("/generate/stats")
+async def generate_stats():
+    """Queue depth, batching and latency counters for the generation scheduler."""
+    return generation_scheduler.stats()
+
+
+class FrameSender:
+    """
+    The only writer of one /ws/generate socket.
+
+    Generations hand their messages over through a bounded queue, from the pipeline thread for
+    frames, and a single coroutine sends them in order. An intermediate frame that is still
+    queued when a newer one for the same request arrives is replaced by it (latest wins), so a
+    slow client gets fewer frames instead of a growing backlog. Final frames, completion markers
+    and errors are never dropped and keep their order. If a send fails, `on_failure` is called
+    so the connection's generations stop instead of running for nobody.
+    """
+
+    frames_dropped = 0
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[[BaseException], None], max_queued: int):
+        self.websocket = websocket
+        self.on_failure = on_failure
+        self.max_queued = max(1, max_queued)
+        # [request id, droppable, text or bytes]
+        self.queue: "deque[list]" = deque()
+        self.wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.error: Optional[BaseException] = None
+        self.task = self.loop.create_task(self.run())
+
+    def send_threadsafe(self, request_id: str, data, droppable: bool):
+        self.loop.call_soon_threadsafe(self.send, request_id, data, droppable)
+
+    def send(self, request_id: str, data, droppable: bool = False):
+        if self.error is not None:
+            return
+        if droppable:
+            for entry in self.queue:
+                if entry[0] == request_id and entry[1]:
+                    entry[2] = data
+                    FrameSender.frames_dropped += 1
+                    return
+        self.queue.append([request_id, droppable, data])
+        if len(self.queue) > self.max_queued:
+            oldest = next((entry for entry in self.queue if entry[1]), None)
+            if oldest is not None:
+                self.queue.remove(oldest)
+                FrameSender.frames_dropped += 1
+        self.wakeup.set()
+
+    def send_json(self, request_id: str, message: dict):
+        self.send(request_id, json.dumps(message))
+
+    async def run(self):
+        try:
+            while True:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                _, _, data = self.queue.popleft()
+                started = time.perf_counter()
+                if isinstance(data, bytes):
+                    await self.websocket.send_bytes(data)
+                else:
+                    await self.websocket.send_text(data)
+                FRAME_SEND_TIME.observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+            self.queue.clear()
+            logger.warning("Sending to the generation client failed: %r", e)
+            self.on_failure(e)
+
+    async def close(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+def pack_binary_frame(request_id: str, step: int, total_steps: int, elapsed_ms: float, step_ms: float,
+                      img_bytes: bytes, reduced: bool = False) -> bytes:
+    id_bytes = request_id.encode('utf-8')
+    flags = (FRAME_FLAG_FINAL if step >= total_steps else 0) | (FRAME_FLAG_REDUCED if reduced else 0)
+    header = AI_FRAME_HEADER.pack(
+        FRAME_VERSION, flags, CODEC_JPEG, step, total_steps, int(elapsed_ms), int(step_ms), len(id_bytes)
+    )
+    return header + id_bytes + img_bytes
+
+
+async def run_legacy_generation(sender: FrameSender, request: dict, client_id: str):
+    def send_frame(step: int, total_steps: int, img_bytes: bytes):
+        img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+        sender.send_threadsafe(client_id, img_base64, droppable=step < total_steps)
+
+    try:
+        await generation_scheduler.submit(request, client_id, send_frame)
+    except Exception as e:
+        # The legacy protocol has no error message; the endpoint closes the socket with 1011.
+        logger.error("Generation failed: %s", e)
+        raise
+
+    # Queued after every frame, so it is sent after them.
+    sender.send(client_id, "generation_complete")
+    logger.info("Generation complete. Sent end signal.")
+
+
+async def run_multiplexed_generation(sender: FrameSender, request: dict, client_id: str):
+    request_id = request["id"]
+    started = time.perf_counter()
+    last_frame_at = started
+
+    def send_frame(step: int, total_steps: int, img_bytes: bytes):
+        nonlocal last_frame_at
+        now = time.perf_counter()
+        elapsed_ms = (now - started) * 1000
+        step_ms = (now - last_frame_at) * 1000
+        last_frame_at = now
+        if request["binary"]:
+            frame = pack_binary_frame(request_id, step, total_steps, elapsed_ms, step_ms, img_bytes, request["reduced"])
+        else:
+            frame = json.dumps({
+                "type": "frame",
+                "id": request_id,
+                "step": step,
+                "total_steps": total_steps,
+                "elapsed_ms": round(elapsed_ms, 1),
+                "step_ms": round(step_ms, 1),
+                "reduced": request["reduced"],
+                "image": base64.b64encode(img_bytes).decode('utf-8'),
+            })
+        sender.send_threadsafe(request_id, frame, droppable=step < total_steps)
+
+    try:
+        await generation_scheduler.submit(request, client_id, send_frame)
+        sender.send_json(request_id, {
+            "type": "complete",
+            "id": request_id,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        logger.info("Generation complete.", extra={"request_id": request_id, "room_id": request["client"]})
+    except Exception as e:
+        logger.error("Generation failed: %s", e, extra={"request_id": request_id, "room_id": request["client"]})
+        sender.send_json(request_id, {"type": "error", "id": request_id, "message": str(e)})
+
 
 @app.websocket("/ws/generate")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    print("Client connected.")
-    
-    # Get the current asyncio event loop to schedule tasks from another thread.
-    main_loop = asyncio.get_running_loop()
+    logger.info("Client connected.")
+
+    connection_id = uuid.uuid4().hex
+    generation_tasks: Dict[str, asyncio.Task] = {}
 
+    def stop_generations(error: BaseException):
+        for task in list(generation_tasks.values()):
+            task.cancel()
+
+    sender = FrameSender(websocket, stop_generations, GENERATION_SEND_QUEUE)
     try:
         while True:
-            prompt = await websocket.receive_text()
-            print(f"Received prompt: '{prompt}'")
-
-            # --- 3. The Corrected Callback Function ---
-            # This is now a regular (synchronous) function, not async.
-            def stream_intermediate_image(pipe, step, timestep, callback_kwargs):
-                # Decode the latent to a PIL Image
-                latents = callback_kwargs["latents"]
-                image = pipe.image_processor.postprocess(
-                    pipe.vae.decode(latents / pipe.vae.config.scaling_factor, return_dict=False)[0]
-                )[0]
-
-                # Convert the PIL Image to bytes in memory
-                buffer = io.BytesIO()
-                image.save(buffer, format="JPEG")
-                img_bytes = buffer.getvalue()
-
-                # Encode the bytes to a Base64 string
-                img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-
-                # --- THE FIX ---
-                # Use asyncio.run_coroutine_threadsafe to schedule the async send
-                # operation on the main event loop from this synchronous thread.
-                asyncio.run_coroutine_threadsafe(
-                    websocket.send_text(img_base64),
-                    main_loop
-                )
-                
-                return callback_kwargs
-
-            # Run the synchronous pipeline in a separate thread.
-            # This no longer blocks the server.
-            await asyncio.to_thread(
-                pipeline,
-                prompt=prompt,
-                num_inference_steps=4,
-                guidance_scale=0.0,
-                callback_on_step_end_steps=1,
-                callback_on_step_end=stream_intermediate_image,
+            message = decode_message(await websocket.receive_text())
+            if message.get("type") == "cancel":
+                task = generation_tasks.get(message.get("id"))
+                if task is not None:
+                    task.cancel()
+                    logger.info("Generation cancelled by the client.", extra={"request_id": message.get("id")})
+                continue
+            multiplexed = message.get("type") == "generate" and message.get("id") is not None
+            if multiplexed:
+                # A bad request only fails itself, never the other requests sharing the socket.
+                request_id = message["id"]
+                try:
+                    if isinstance(request_id, str) and request_id in generation_tasks:
+                        raise ValueError(f"request id {request_id!r} is already in flight")
+                    request = parse_generation_request(message)
+                except ValueError as e:
+                    logger.warning("Rejected generation request: %s", e, extra={"sample": "bad_request"})
+                    sender.send_json(request_id, {"type": "error", "id": request_id, "message": str(e)})
+                    continue
+            else:
+                request = parse_generation_request(message)
+            logger.info(
+                "Received prompt: '%s' (seed=%s, steps=%d)", request["prompt"], request["seed"], request["steps"],
+                extra={"request_id": request["id"], "room_id": request["client"]},
             )
 
-            # Signal that the generation is complete using the same thread-safe method.
-            # We wait for this one to finish to ensure the message is sent before we loop.
-            await websocket.send_text("generation_complete")
-            print("Generation complete. Sent end signal.")
+            if multiplexed:
+                client_id = request["client"] or connection_id
+                task = asyncio.create_task(run_multiplexed_generation(sender, request, client_id))
+                generation_tasks[request_id] = task
+                task.add_done_callback(lambda _, request_id=request_id: generation_tasks.pop(request_id, None))
+            else:
+                # Legacy requests run one at a time, but as a task so a failed send can stop them.
+                task = asyncio.create_task(run_legacy_generation(sender, request, connection_id))
+                generation_tasks[connection_id] = task
+                await asyncio.wait([task])
+                generation_tasks.pop(connection_id, None)
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
 
     except WebSocketDisconnect:
-        print("Client disconnected.")
+        logger.info("Client disconnected.")
     except Exception as e:
-        print(f"An error occurred: {e}")
-        await websocket.close(code=1011, reason=str(e))
\ No newline at end of file
+        logger.exception("An error occurred: %s", e)
+        # Stop the sender first so the close is the last thing written to the socket.
+        stop_generations(e)
+        await sender.close()
+        await websocket.close(code=1011, reason=str(e))
+    finally:
+        stop_generations(None)
+        await sender.close()
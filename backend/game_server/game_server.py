@@ -1,146 +1,1746 @@
 import asyncio
+from abc import ABC, abstractmethod
+import functools
+import heapq
+import io
 import websockets
 import os
 import random
+import re
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Optional, Any, List
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Optional, Any, List, Tuple, Callable, Awaitable, AsyncIterator
+from urllib.parse import urlsplit
 import httpx
 import string
 import json
+import uuid
+import base64
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import WatchError
+except ImportError:
+    redis_asyncio = None
+
+try:
+    import numpy as np
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    np = onnxruntime = Tokenizer = None
+
+try:
+    from huggingface_hub import hf_hub_download
+except ImportError:
+    hf_hub_download = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from backend.observability import (
+    AI_FRAME_HEADER, CODEC_MIME_TYPES, CODEC_WEBP, FRAME_FLAG_FINAL, FRAME_FLAG_REDUCED, FRAME_VERSION,
+    ContextAdapter, MetricsRegistry, setup_logging,
+)
+
+# --- Logging ---
+logger, log_handler = setup_logging("game_server")
 
 # --- Configuration & Prompts ---
 AI_SERVER_URL = os.environ.get("AI_SERVER_URL", "ws://localhost:8000/ws/generate")
 AI_SCORING_URL = os.environ.get("AI_SCORING_URL", "http://localhost:8000/score/similarity")
 
-print(f"AI_SERVER_URL: {AI_SERVER_URL}")
-print(f"AI_SCORING_URL: {AI_SCORING_URL}")
+# A pool of AI servers, as comma-separated base URLs ("http://gpu-1:8000,http://gpu-2:8000").
+# Empty uses AI_SERVER_URL and AI_SCORING_URL as the only backend.
+AI_POOL_CONFIG = {
+    "BACKENDS": [url.strip().rstrip("/") for url in os.environ.get("AI_BACKENDS", "").split(",") if url.strip()],
+    # How often every backend's per-model readiness is probed.
+    "HEALTH_INTERVAL_S": float(os.environ.get("AI_HEALTH_INTERVAL_S", "2.0")),
+    "HEALTH_TIMEOUT_S": float(os.environ.get("AI_HEALTH_TIMEOUT_S", "1.0")),
+}
+
+if AI_POOL_CONFIG["BACKENDS"]:
+    logger.info("AI_BACKENDS: %s", ", ".join(AI_POOL_CONFIG["BACKENDS"]))
+else:
+    logger.info("AI_SERVER_URL: %s", AI_SERVER_URL)
+    logger.info("AI_SCORING_URL: %s", AI_SCORING_URL)
 
 GAME_CONFIG = {
     "ROUND_DURATION_S": 30,
     "POST_ROUND_DELAY_S": 10,
+    "TOTAL_ROUNDS": 10,
+    # How often players get an authoritative timeLeft while a round runs.
+    "TIME_TICK_S": float(os.environ.get("ROUND_TIME_TICK_S", "5")),
+    # Player changes within this window go out together as one versioned player_update delta.
+    "PLAYER_UPDATE_TICK_S": float(os.environ.get("PLAYER_UPDATE_TICK_S", "0.05")),
+    # Per-player guess rate limit: a token bucket refilled at GUESS_RATE_PER_S, holding up to GUESS_BURST.
+    "GUESS_RATE_PER_S": float(os.environ.get("GUESS_RATE_PER_S", "2")),
+    "GUESS_BURST": int(os.environ.get("GUESS_BURST", "5")),
     "MAX_PLAYERS": 12,
-    "POINTS_FOR_CORRECT_GUESS": 1000
+    "POINTS_FOR_CORRECT_GUESS": 1000,
+    # Generation is seeded so identical (prompt, seed, steps) requests produce identical frames
+    # and can be served from the frame cache.
+    "GENERATION_SEED": int(os.environ.get("GENERATION_SEED", "0")),
+    "GENERATION_STEPS": int(os.environ.get("GENERATION_STEPS", "4")),
+    # How the AI server renders intermediate frames: "linear" (cheapest, low resolution), "tiny"
+    # or "full". The final frame is always full quality.
+    "GENERATION_PREVIEW": os.environ.get("GENERATION_PREVIEW", "linear"),
+    # Target time from requesting an image to its final frame. Under load the AI server lowers
+    # steps, image size and preview frequency to meet it, so keep it well inside ROUND_DURATION_S.
+    "GENERATION_DEADLINE_S": float(os.environ.get("GENERATION_DEADLINE_S", "8")),
 }
 
-PROMPTS = [
-    "A photorealistic portrait of a cat wearing a monocle", "A squirrel in the style of picasso",
-    "Darth vader playing the drums", "An astronaut playing a trumpet on the moon",
-    "Yoda playing the guitar", "An image of a crow sitting in a tree", "very long limo",
-    "happy software engineer", "pug pikachu", "A boat down a river", "A blue coffee cup",
-    "A vintage car", "A white dog sleeping on a couch", "Raindrops on a window",
-    "A empty park bench", "stardew valley", "pope francis as a DJ in a nightclub",
-    "landscape view from the Moon with the earth in the background", "cute toy owl made of suede",
-    "industrial age pocket watch", "futuristic tree house", "oil painting of master chief",
-    "the perfet bonsai tree", "albert einstein beside a chalkboard", "minecraft",
-    "Dinosaur from jurassic park", "majestic royal tall ship on a calm sea",
-    "Astronauts in a jungle, cold color palette", "A sloth riding a skateboard",
-    "A robot chef making sushi", "A paper airplane", "A car driving on a winding road",
-    "A professor giving a lecture", "A rocket launching into space", "A dog catching a frisbee",
-    "A robot serving coffee",
-]
+SEND_CONFIG = {
+    # Disconnect a player whose outbound queue holds this many undelivered messages...
+    "MAX_QUEUED_MESSAGES": int(os.environ.get("SEND_MAX_QUEUED_MESSAGES", "64")),
+    # ...or whose oldest undelivered message is this old.
+    "MAX_LAG_S": float(os.environ.get("SEND_MAX_LAG_S", "5.0")),
+}
+
+# Room registry and cross-worker messaging. Empty keeps every room in this process; a redis://
+# URL lets several workers (e.g. uvicorn --workers, or WEB_CONCURRENCY) share rooms.
+ROOM_BACKEND_URL = os.environ.get("ROOM_BACKEND_URL", "")
+WORKER_ID = os.environ.get("WORKER_ID") or uuid.uuid4().hex[:12]
+ROOM_OWNERSHIP_TTL_S = int(os.environ.get("ROOM_OWNERSHIP_TTL_S", "30"))
+
+AI_GENERATION_CONNECTIONS = int(os.environ.get("AI_GENERATION_CONNECTIONS", "2"))
+FRAME_CACHE_MAX_BYTES = int(os.environ.get("FRAME_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Binary frames from the AI server use observability.AI_FRAME_HEADER. Binary image_update frames
+# sent to players that join with "transport": "binary": version, message type, codec, flags
+# (bit 0: final frame), step and total_steps, followed by the image bytes.
+CLIENT_FRAME_HEADER = struct.Struct("!BBBBHH")
+CLIENT_MESSAGE_IMAGE_UPDATE = 1
+
+# Intermediate frames are also re-encoded as smaller WebP renditions (requires Pillow), and every
+# player gets the largest one its connection keeps up with. Each rung is "max_side:quality";
+# an empty ladder sends every player the original frame. Final frames always go out in full.
+RENDITION_CONFIG = {
+    "LADDER": [
+        tuple(int(part) for part in rung.split(":"))
+        for rung in os.environ.get("FRAME_RENDITIONS", "384:70,192:55").split(",") if rung.strip()
+    ],
+    "WORKERS": int(os.environ.get("FRAME_RENDITION_WORKERS", "2")),
+    # Share of a player's measured throughput a rendition may use per frame interval.
+    "HEADROOM": float(os.environ.get("FRAME_RENDITION_HEADROOM", "0.8")),
+    # How often a worker relaying a player reports their measured throughput to the room owner.
+    "REPORT_INTERVAL_S": float(os.environ.get("FRAME_RENDITION_REPORT_INTERVAL_S", "1")),
+}
+
+SCORING_CONFIG = {
+    "MAX_CONNECTIONS": int(os.environ.get("SCORING_MAX_CONNECTIONS", "32")),
+    # Capped at MAX_CONNECTIONS: a request waiting for a pooled connection would otherwise time
+    # out locally and be counted as a failure of the backend it never reached.
+    "MAX_CONCURRENCY": int(os.environ.get("SCORING_MAX_CONCURRENCY", "32")),
+    "TIMEOUT_S": float(os.environ.get("SCORING_TIMEOUT_S", "2.0")),
+    "RETRIES": int(os.environ.get("SCORING_RETRIES", "2")),
+    "RETRY_BACKOFF_S": float(os.environ.get("SCORING_RETRY_BACKOFF_S", "0.1")),
+    "BREAKER_FAILURE_THRESHOLD": int(os.environ.get("SCORING_BREAKER_FAILURES", "5")),
+    "BREAKER_RESET_S": float(os.environ.get("SCORING_BREAKER_RESET_S", "10.0")),
+    # Scores for (prompt, normalized guess) pairs, shared by every room on this worker.
+    "CACHE_MAX_ENTRIES": int(os.environ.get("SCORE_CACHE_MAX_ENTRIES", "100000")),
+    "CACHE_TTL_S": float(os.environ.get("SCORE_CACHE_TTL_S", "3600")),
+}
+
+# "local" scores guesses in this process with an int8-quantized ONNX export of the scoring model
+# (requires numpy, onnxruntime, tokenizers and, for hub model ids, huggingface_hub). The AI server
+# stays the fallback while the local engine loads or if it fails. "http" always uses the AI server.
+LOCAL_SCORING_CONFIG = {
+    "ENGINE": os.environ.get("SCORING_ENGINE", "http"),
+    # A hub model id or a local directory holding tokenizer.json and MODEL_FILE.
+    "MODEL_ID": os.environ.get("LOCAL_SCORING_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2"),
+    # The quantized exports in the hub repo are onnx/model_quint8_avx2.onnx (portable x86),
+    # onnx/model_qint8_avx512.onnx and onnx/model_qint8_arm64.onnx.
+    "MODEL_FILE": os.environ.get("LOCAL_SCORING_MODEL_FILE", "onnx/model_quint8_avx2.onnx"),
+    "THREADS": int(os.environ.get("LOCAL_SCORING_THREADS", "2")),
+    # Must match the scoring model's max_seq_length on the AI server.
+    "MAX_TOKENS": int(os.environ.get("LOCAL_SCORING_MAX_TOKENS", "256")),
+}
+
+# The prompt catalog is shared with ai_server.py, which precomputes embeddings for it.
+PROMPTS_PATH = os.environ.get(
+    "PROMPTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prompts.json")
+)
+with open(PROMPTS_PATH) as prompts_file:
+    PROMPTS: List[str] = json.load(prompts_file)
+
+# --- Metrics ---
+# Latency histograms, gauges and counters in the Prometheus text format (see observability.py),
+# served at /metrics.
+metrics = MetricsRegistry()
+PROMPT_TO_FIRST_FRAME = metrics.histogram(
+    "game_prompt_to_first_frame_seconds", "Round start to the first image frame being broadcast."
+)
+FRAME_RELAY = metrics.histogram(
+    "game_frame_relay_seconds", "A frame arriving from the AI server to it being queued for every player in a room."
+)
+BROADCAST_DURATION = metrics.histogram(
+    "game_broadcast_seconds", "Time to encode a message once and queue it for every player in a room.", ("type",)
+)
+PLAYER_SEND = metrics.histogram(
+    "game_player_send_seconds", "Time to write one queued message to a player's websocket (client fan-out)."
+)
+GUESS_ROUND_TRIP = metrics.histogram(
+    "game_guess_round_trip_seconds", "A guess arriving to its feedback being queued, including scoring."
+)
+LOCAL_SCORING_TIME = metrics.histogram(
+    "game_local_scoring_seconds", "Time to score a guess with the in-process scoring engine, including queueing."
+)
+RENDITION_ENCODE = metrics.histogram(
+    "game_rendition_encode_seconds", "Time to encode every smaller rendition of one frame, including queueing."
+)
+ROUND_TIMER_LAG = metrics.histogram(
+    "game_round_timer_lag_seconds", "How late the round scheduler ran a room's timer after its deadline."
+)
+
+
+# --- Scoring Client ---
+class CircuitBreaker:
+    """
+    Fails fast while a dependency is unhealthy.
+
+    After `failure_threshold` consecutive failures the breaker opens and rejects calls for
+    `reset_timeout_s`. It then lets a single trial call through (half-open): success closes
+    the breaker again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout_s:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+
+class TokenBucket:
+    """Allows `burst` calls at once, refilling at `rate` per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next call would be allowed."""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+
+# Apostrophes are removed ("cat's" -> "cats"); other punctuation separates words, except a
+# decimal point inside a number.
+GUESS_APOSTROPHES = re.compile(r"['\u2019]")
+GUESS_PUNCTUATION = re.compile(r"[^\w\s.]|_|(?<!\d)\.|\.(?!\d)")
+
+
+def normalize_guess(guess: str) -> str:
+    """Case, whitespace and punctuation do not change what a guess means, so they do not change its score."""
+    guess = GUESS_APOSTROPHES.sub("", guess.lower())
+    return " ".join(GUESS_PUNCTUATION.sub(" ", guess).split())
+
+
+class ScoreCache:
+    """A bounded LRU of scores that expire after `ttl_s`."""
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.entries: OrderedDict[Tuple[str, str], Tuple[float, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple[str, str], score: float):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (score, time.monotonic() + self.ttl_s)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Matches ai_server.normalize_text: the scoring model's tokenizer is uncased."""
+    return " ".join(prompt.lower().split())
+
+
+class LocalScoringEngine:
+    """
+    Scores guesses in-process with a quantized ONNX export of the AI server's scoring model.
+
+    Embeddings are computed the way sentence-transformers does it (mean pooling over the
+    tokens, then unit length), so scores match the AI server's up to quantization error. The
+    catalog prompts are encoded into one matrix at load time, so scoring a guess costs a single
+    encode and a dot product. Inference runs on a small thread pool, one onnxruntime thread per
+    request, and releases the GIL while it runs.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.executor = ThreadPoolExecutor(max_workers=config["THREADS"], thread_name_prefix="local-scoring")
+        self.tokenizer = None
+        self.session = None
+        self.input_names: List[str] = []
+        self.prompt_index: Dict[str, int] = {}
+        self.prompt_matrix = None
+        self.ready = False
+
+    def resolve_file(self, file_name: str) -> str:
+        model_id = self.config["MODEL_ID"]
+        if os.path.isdir(model_id):
+            return os.path.join(model_id, file_name)
+        if hf_hub_download is None:
+            raise RuntimeError("LOCAL_SCORING_MODEL_ID is not a directory and 'huggingface_hub' is not installed")
+        return hf_hub_download(model_id, file_name)
+
+    def load(self):
+        """Loads the tokenizer and model and encodes the prompt catalog. Blocking."""
+        if onnxruntime is None:
+            raise RuntimeError("SCORING_ENGINE=local needs the 'numpy', 'onnxruntime' and 'tokenizers' packages")
+        self.tokenizer = Tokenizer.from_file(self.resolve_file("tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["MAX_TOKENS"])
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            self.resolve_file(self.config["MODEL_FILE"]), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        keys = list(dict.fromkeys(normalize_prompt(prompt) for prompt in PROMPTS))
+        self.prompt_matrix = self.encode(keys)
+        self.prompt_index = {key: i for i, key in enumerate(keys)}
+        self.ready = True
+
+    def encode(self, sentences: List[str]):
+        """Returns one unit-length embedding per sentence, as rows of a float32 matrix."""
+        encodings = self.tokenizer.encode_batch(sentences)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": np.zeros_like(input_ids)}
+        token_embeddings = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        weights = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def score_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Scores (prompt, guess) pairs on the AI server's 0-100 scale. Blocking."""
+        keys = [normalize_prompt(prompt) for prompt, _ in pairs]
+        # Prompts outside the catalog are encoded in the same batch as the guesses.
+        missing = list(dict.fromkeys(key for key in keys if key not in self.prompt_index))
+        embeddings = self.encode([guess for _, guess in pairs] + missing)
+        extra = dict(zip(missing, embeddings[len(pairs):]))
+        prompt_vectors = np.stack([
+            self.prompt_matrix[self.prompt_index[key]] if key in self.prompt_index else extra[key] for key in keys
+        ])
+        cosine = np.einsum("ij,ij->i", prompt_vectors, embeddings[:len(pairs)])
+        return (np.maximum(cosine, 0) * 100).tolist()
+
+    async def score(self, prompt: str, guess: str) -> float:
+        started = time.perf_counter()
+        scores = await asyncio.get_running_loop().run_in_executor(self.executor, self.score_pairs, [(prompt, guess)])
+        LOCAL_SCORING_TIME.observe(time.perf_counter() - started)
+        return scores[0]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ScoringClient:
+    """
+    Application-wide client for the AI scoring endpoint.
+
+    Keeps a pool of keep-alive connections, bounds the number of in-flight requests, retries
+    transient failures with jittered backoff and stops calling the scorer while it is unhealthy.
+    Guesses are normalized first, and scores are cached by (prompt, normalized guess), so a
+    repeat from any room is answered locally; concurrent requests for the same pair share one
+    call to the scorer. Each request goes to the AI backend with the shortest expected wait, and
+    a retry goes to a different one when the pool has another; every backend has its own breaker.
+    With a `local_engine`, guesses are scored in-process once it has loaded, and on the AI
+    servers if it fails. `score` never raises: it returns -1 whenever no score could be obtained.
+    """
+
+    def __init__(self, backends: "AIBackendPool", config: Dict[str, Any],
+                 local_engine: Optional[LocalScoringEngine] = None):
+        self.backends = backends
+        self.config = config
+        self.local_engine = local_engine
+        self.local_engine_task: Optional[asyncio.Task] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore = asyncio.Semaphore(min(config["MAX_CONCURRENCY"], config["MAX_CONNECTIONS"]))
+        self.cache = ScoreCache(config["CACHE_MAX_ENTRIES"], config["CACHE_TTL_S"])
+        self.in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.config["TIMEOUT_S"]),
+            limits=httpx.Limits(
+                max_connections=self.config["MAX_CONNECTIONS"],
+                max_keepalive_connections=self.config["MAX_CONNECTIONS"],
+            ),
+        )
+        if self.local_engine:
+            # Guesses go to the AI server until the local engine has loaded.
+            self.local_engine_task = asyncio.create_task(self.load_local_engine())
+
+    async def load_local_engine(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.local_engine.load)
+        except Exception as e:
+            logger.warning("Local scoring engine unavailable, scoring on the AI server: %r", e)
+            return
+        logger.info(
+            "Local scoring engine ready in %.1fs with %d catalog prompts.",
+            time.perf_counter() - started, len(self.local_engine.prompt_index),
+        )
+
+    async def close(self):
+        if self.local_engine_task:
+            self.local_engine_task.cancel()
+        if self.local_engine:
+            self.local_engine.close()
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def score(self, prompt: str, guess: str) -> float:
+        guess = normalize_guess(guess)
+        if not guess:
+            return 0.0
+        key = (prompt, guess)
+        score = self.cache.get(key)
+        if score is not None:
+            return score
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.in_flight[key] = asyncio.create_task(self.request_score(prompt, guess))
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # One waiter giving up must not cancel the request for the others.
+        return await asyncio.shield(task)
+
+    async def request_score(self, prompt: str, guess: str) -> float:
+        if self.local_engine and self.local_engine.ready:
+            try:
+                score = await self.local_engine.score(prompt, guess)
+                self.cache.put((prompt, guess), score)
+                return score
+            except Exception as e:
+                logger.warning("Local scoring failed, using the AI server: %r", e, extra={"sample": "local_scoring_error"})
+        return await self.request_remote_score(prompt, guess)
+
+    async def request_remote_score(self, prompt: str, guess: str) -> float:
+        if self.client is None:
+            return -1
+        tried: List[AIBackend] = []
+        # The backend whose half-open trial this request holds and has not resolved yet.
+        trial_backend: Optional[AIBackend] = None
+        try:
+            async with self.semaphore:
+                for attempt in range(self.config["RETRIES"] + 1):
+                    backend = self.backends.pick_scorer(tried)
+                    if backend is None:
+                        break
+                    if tried and backend is not tried[-1]:
+                        self.backends.scoring_failovers += 1
+                    tried.append(backend)
+                    # allow_request only lets one caller through a half-open breaker, so a trial
+                    # in flight right after picking is this request's.
+                    trial_backend = backend if backend.breaker.trial_in_flight else None
+                    started = time.perf_counter()
+                    backend.scoring_in_flight += 1
+                    try:
+                        response = await self.client.post(backend.scoring_url, json={"prompt": prompt, "guess": guess})
+                        response.raise_for_status()
+                        backend.observe_scoring_latency(time.perf_counter() - started)
+                        backend.breaker.record_success()
+                        trial_backend = None
+                        score = response.json().get("score", 0.0)
+                        self.cache.put((prompt, guess), score)
+                        return score
+                    except httpx.HTTPError as e:
+                        # Counted against this backend right away, even if a retry elsewhere succeeds.
+                        backend.breaker.record_failure()
+                        trial_backend = None
+                        backend.observe_scoring_failure()
+                        logger.warning(
+                            "Error calling AI scoring server %s (attempt %d): %r", backend.name, attempt + 1, e,
+                            extra={"sample": "scoring_error"},
+                        )
+                        if attempt < self.config["RETRIES"]:
+                            # Full jitter keeps retries from many rooms from arriving in lockstep.
+                            await asyncio.sleep(random.uniform(0, self.config["RETRY_BACKOFF_S"] * 2 ** attempt))
+                    finally:
+                        backend.scoring_in_flight -= 1
+                return -1
+        finally:
+            # A cancelled half-open trial must not leave its breaker waiting on it forever.
+            if trial_backend is not None:
+                trial_backend.breaker.trial_in_flight = False
+
+
+# --- Generation Client ---
+def parse_ai_frame(message: bytes) -> Dict[str, Any]:
+    version, flags, codec, step, total_steps, elapsed_ms, step_ms, id_length = AI_FRAME_HEADER.unpack_from(message)
+    id_start = AI_FRAME_HEADER.size
+    return {
+        "type": "frame",
+        "id": message[id_start:id_start + id_length].decode('utf-8'),
+        "step": step,
+        "total_steps": total_steps,
+        "elapsed_ms": elapsed_ms,
+        "step_ms": step_ms,
+        "codec": codec,
+        "final": bool(flags & FRAME_FLAG_FINAL),
+        "reduced": bool(flags & FRAME_FLAG_REDUCED),
+        "image": message[id_start + id_length:],
+        "received_at": time.perf_counter(),
+    }
+
+
+class GenerationConnection:
+    """
+    One persistent websocket to the AI server that carries many concurrent generation streams.
+
+    Requests and replies use the multiplexed /ws/generate protocol: every reply carries the id
+    of the request it belongs to, and a single reader task routes it to that request's queue.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.websocket: Optional[websockets.ClientConnection] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.streams: Dict[str, asyncio.Queue] = {}
+        self.connect_lock = asyncio.Lock()
+
+    async def ensure_connected(self) -> websockets.ClientConnection:
+        async with self.connect_lock:
+            if self.websocket is None:
+                self.websocket = await websockets.connect(self.url, max_size=None)
+                self.reader_task = asyncio.create_task(self.read_loop(self.websocket))
+            return self.websocket
+
+    async def read_loop(self, websocket: websockets.ClientConnection):
+        try:
+            async for message in websocket:
+                data = parse_ai_frame(message) if isinstance(message, bytes) else json.loads(message)
+                queue = self.streams.get(data.get("id"))
+                if queue is not None:
+                    queue.put_nowait(data)
+        except Exception as e:
+            logger.error("Connection to AI server lost: %r", e)
+        finally:
+            if self.websocket is websocket:
+                self.websocket = None
+            for queue in self.streams.values():
+                queue.put_nowait({"type": "error", "message": "connection to AI server lost"})
+
+    async def generate(
+        self, prompt: str, seed: int, steps: int, client: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields {"step", "total_steps", "elapsed_ms", "step_ms", "codec", "final", "reduced", "image"}
+        for every generated frame, where "image" holds the encoded image bytes. `client` names the room the
+        frames are for, so the AI server can share its GPU fairly between rooms. Closing the
+        generator early cancels the generation on the AI server.
+        """
+        websocket = await self.ensure_connected()
+        request_id = uuid.uuid4().hex
+        queue: asyncio.Queue = asyncio.Queue()
+        self.streams[request_id] = queue
+        finished = False
+        try:
+            await websocket.send(json.dumps({
+                "type": "generate", "id": request_id, "prompt": prompt, "seed": seed, "steps": steps,
+                "preview": GAME_CONFIG["GENERATION_PREVIEW"], "client": client, "binary": True,
+                "deadline_ms": GAME_CONFIG["GENERATION_DEADLINE_S"] * 1000,
+            }))
+            while True:
+                data = await queue.get()
+                message_type = data.get("type")
+                if message_type == "frame":
+                    yield data
+                elif message_type == "complete":
+                    finished = True
+                    return
+                else:
+                    finished = True
+                    raise RuntimeError(data.get("message", "generation failed"))
+        finally:
+            del self.streams[request_id]
+            if not finished and self.websocket is websocket:
+                try:
+                    await websocket.send(json.dumps({"type": "cancel", "id": request_id}))
+                except Exception:
+                    pass  # The connection is gone, which cancels the generation anyway.
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.reader_task is not None:
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+
+
+class GenerationClient:
+    """A small pool of multiplexed connections; each stream goes to the least busy one."""
+
+    def __init__(self, url: str, connections: int):
+        self.connections = [GenerationConnection(url) for _ in range(max(1, connections))]
+
+    def generate(
+        self, prompt: str, seed: int, steps: int, client: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        connection = min(self.connections, key=lambda c: len(c.streams))
+        return connection.generate(prompt, seed, steps, client)
+
+    async def close(self):
+        await asyncio.gather(*(c.close() for c in self.connections))
+
+    def in_flight(self) -> int:
+        return sum(len(c.streams) for c in self.connections)
+
+
+# --- AI Backend Pool ---
+class AIBackend:
+    """One AI server: its generation connections, its scoring breaker, and its health and load."""
+
+    # Weight of the newest sample in the scoring latency average.
+    smoothing = 0.2
+
+    def __init__(self, name: str, generate_url: str, scoring_url: str, health_url: str, scoring_config: Dict[str, Any]):
+        self.name = name
+        self.scoring_url = scoring_url
+        self.health_url = health_url
+        self.generation_client = GenerationClient(generate_url, AI_GENERATION_CONNECTIONS)
+        self.breaker = CircuitBreaker(scoring_config["BREAKER_FAILURE_THRESHOLD"], scoring_config["BREAKER_RESET_S"])
+        self.scoring_timeout_s = scoring_config["TIMEOUT_S"]
+        # Readiness of each model, from the last health probe or a failed generation.
+        self.healthy = {"diffusion": True, "scoring": True}
+        self.scoring_in_flight = 0
+        self.scoring_latency_s = 0.0
+
+    @classmethod
+    def from_base_url(cls, base_url: str, scoring_config: Dict[str, Any]) -> "AIBackend":
+        ws_base = "ws" + base_url[len("http"):] if base_url.startswith("http") else base_url
+        return cls(base_url, f"{ws_base}/ws/generate", f"{base_url}/score/similarity", f"{base_url}/health/ready",
+                   scoring_config)
+
+    @classmethod
+    def from_urls(cls, generate_url: str, scoring_url: str, scoring_config: Dict[str, Any]) -> "AIBackend":
+        origin = urlsplit(scoring_url)
+        return cls(origin.netloc, generate_url, scoring_url, f"{origin.scheme}://{origin.netloc}/health/ready",
+                   scoring_config)
+
+    def can_score(self) -> bool:
+        return self.healthy["scoring"] and self.breaker.state == "closed"
+
+    def scoring_wait_s(self) -> float:
+        """Expected wait for one more score: the scores ahead of it at the recent latency."""
+        return (self.scoring_in_flight + 1) * self.scoring_latency_s
+
+    def observe_scoring_latency(self, latency_s: float):
+        if not self.scoring_latency_s:
+            self.scoring_latency_s = latency_s
+        else:
+            self.scoring_latency_s += self.smoothing * (latency_s - self.scoring_latency_s)
+
+    def observe_scoring_failure(self):
+        # A failed attempt costs the guess about a timeout, so it weighs like one.
+        self.observe_scoring_latency(self.scoring_timeout_s)
+
+
+class AIBackendPool:
+    """
+    The AI servers this worker sends generations and guesses to.
+
+    A background task probes every backend's per-model readiness; a failed generation also
+    marks its backend down until the next good probe. Each generation goes to the healthy
+    backend with the fewest generations in flight, and each score to the one with the shortest
+    expected wait. Backends that look down are still tried after all the healthy ones, so a
+    stale probe never leaves a round without an image. A generation that fails mid-stream moves
+    to the next backend. The request is seeded, but the next backend's quality controller may
+    pick a different step count or preview interval, so frames are compared by their share of
+    the generation done: ones no further along than what the rooms already have are skipped.
+    """
+
+    def __init__(self, backends: List[AIBackend], config: Dict[str, Any]):
+        self.backends = backends
+        self.config = config
+        self.client: Optional[httpx.AsyncClient] = None
+        self.health_task: Optional[asyncio.Task] = None
+        self.generation_failovers = 0
+        self.scoring_failovers = 0
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(self.config["HEALTH_TIMEOUT_S"]))
+        self.health_task = asyncio.create_task(self.check_health())
+
+    async def close(self):
+        if self.health_task:
+            self.health_task.cancel()
+            await asyncio.gather(self.health_task, return_exceptions=True)
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+        await asyncio.gather(*(backend.generation_client.close() for backend in self.backends))
+
+    async def check_health(self):
+        while True:
+            await asyncio.gather(*(self.probe(backend, model) for backend in self.backends
+                                   for model in ("diffusion", "scoring")))
+            await asyncio.sleep(self.config["HEALTH_INTERVAL_S"])
+
+    async def probe(self, backend: AIBackend, model: str):
+        try:
+            response = await self.client.get(f"{backend.health_url}/{model}")
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        self.set_health(backend, model, healthy)
+
+    def set_health(self, backend: AIBackend, model: str, healthy: bool):
+        if backend.healthy[model] != healthy:
+            if healthy:
+                logger.info("AI backend %s: %s is back up.", backend.name, model)
+            else:
+                logger.warning("AI backend %s: %s is down.", backend.name, model)
+        backend.healthy[model] = healthy
+
+    def pick_scorer(self, tried: List[AIBackend]) -> Optional[AIBackend]:
+        """The backend the next scoring attempt should go to, preferring ones not `tried` yet."""
+        ranked = sorted(self.backends, key=lambda b: (b in tried, not b.can_score(), b.scoring_wait_s()))
+        return next((backend for backend in ranked if backend.breaker.allow_request()), None)
+
+    async def generate(
+        self, prompt: str, seed: int, steps: int, client: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """GenerationConnection.generate on the least-loaded backend, failing over until one finishes."""
+        # Fraction of the generation (step / total_steps) the frames yielded so far have reached.
+        progress = 0.0
+        final_sent = False
+        tried: List[AIBackend] = []
+        while True:
+            backend = min(
+                (b for b in self.backends if b not in tried),
+                key=lambda b: (not b.healthy["diffusion"], b.generation_client.in_flight()),
+            )
+            tried.append(backend)
+            try:
+                async with aclosing(backend.generation_client.generate(prompt, seed, steps, client)) as frames:
+                    async for frame in frames:
+                        frame_progress = frame["step"] / max(frame["total_steps"], 1)
+                        if frame["final"] or frame_progress > progress:
+                            progress = frame_progress
+                            final_sent = frame["final"]
+                            yield frame
+                return
+            except Exception as e:
+                self.set_health(backend, "diffusion", False)
+                if final_sent:
+                    return  # Only the completion message was lost; there is nothing left to resume.
+                if len(tried) == len(self.backends):
+                    raise
+                self.generation_failovers += 1
+                logger.warning(
+                    "Generation on AI backend %s failed %.0f%% of the way through, failing over: %r",
+                    backend.name, progress * 100, e,
+                )
+
+
+def create_ai_backend_pool(config: Dict[str, Any], scoring_config: Dict[str, Any]) -> AIBackendPool:
+    if config["BACKENDS"]:
+        backends = [AIBackend.from_base_url(url, scoring_config) for url in config["BACKENDS"]]
+    else:
+        backends = [AIBackend.from_urls(AI_SERVER_URL, AI_SCORING_URL, scoring_config)]
+    return AIBackendPool(backends, config)
+
+
+# --- Generated Frame Cache ---
+FrameKey = Tuple[str, int, int]
+
+
+class FrameSequence:
+    """
+    The intermediate frames of one image generation, recorded with their arrival offsets.
+
+    Rooms replay a sequence either live, while it is still being generated, or later from the
+    cache. In both cases frames are delivered at the cadence they were originally produced.
+    When the last live subscriber stops replaying, the generation itself is cancelled.
+    """
+
+    def __init__(self, key: FrameKey, requested_by: Optional[str] = None):
+        self.key = key
+        self.requested_by = requested_by
+        self.frames: List[Tuple[float, Dict[str, Any]]] = []
+        self.size_bytes = 0
+        # Generated below the requested quality; replayed to the rooms waiting for it, never cached.
+        self.reduced = False
+        self.done = False
+        # Set once the last live subscriber has left; the cancel reaches the task asynchronously.
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.started_at = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self._updated = asyncio.Event()
+
+    def add_frame(self, frame: Dict[str, Any]):
+        self.frames.append((time.monotonic() - self.started_at, frame))
+        self.size_bytes += len(frame["image"])
+        self.reduced = self.reduced or frame.get("reduced", False)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def replay(self):
+        # Live subscribers follow the generation itself; cached sequences replay from now.
+        start = time.monotonic() if self.done else self.started_at
+        index = 0
+        self.subscribers += 1
+        try:
+            while True:
+                if index < len(self.frames):
+                    offset, frame = self.frames[index]
+                    delay = offset - (time.monotonic() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    index += 1
+                    yield frame
+                elif self.done:
+                    if self.error is not None:
+                        raise RuntimeError(f"generation failed: {self.error!r}") from self.error
+                    return
+                else:
+                    await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.task is not None:
+                self.cancelled = True
+                self.task.cancel()
+
+
+class FrameCache:
+    """
+    Memory-bounded LRU of completed frame sequences keyed by (prompt, seed, steps).
+
+    Concurrent requests for a key that is still being generated share the single in-flight
+    generation instead of starting another one, unless that generation is being cancelled. Sequences the AI server generated at reduced
+    quality are not kept, so the next request for the key gets a full-quality generation.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[FrameKey, FrameSequence]" = OrderedDict()
+        self.in_flight: Dict[FrameKey, FrameSequence] = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.joins = 0
+        self.cancelled = 0
+        self.reduced = 0
+
+    def get_or_generate(
+        self, key: FrameKey, generate: Callable[[FrameSequence], Awaitable[None]], requested_by: Optional[str] = None
+    ) -> FrameSequence:
+        sequence = self.entries.get(key)
+        if sequence is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return sequence
+        sequence = self.in_flight.get(key)
+        if sequence is not None and not sequence.cancelled:
+            self.joins += 1
+            return sequence
+
+        self.misses += 1
+        sequence = FrameSequence(key, requested_by)
+        self.in_flight[key] = sequence
+        # The generation runs on its own task, so it outlives any single room that cancels.
+        sequence.task = asyncio.create_task(self._produce(sequence, generate))
+        return sequence
+
+    async def _produce(self, sequence: FrameSequence, generate: Callable[[FrameSequence], Awaitable[None]]):
+        try:
+            await generate(sequence)
+        except asyncio.CancelledError as e:
+            self.cancelled += 1
+            sequence.finish(e)
+            raise
+        except Exception as e:
+            sequence.finish(e)
+        else:
+            sequence.finish()
+            self._store(sequence)
+        finally:
+            if self.in_flight.get(sequence.key) is sequence:
+                del self.in_flight[sequence.key]
+
+    def _store(self, sequence: FrameSequence):
+        if sequence.reduced:
+            self.reduced += 1
+            return
+        if not sequence.frames or sequence.size_bytes > self.max_bytes:
+            return
+        self.entries[sequence.key] = sequence
+        self.size_bytes += sequence.size_bytes
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size_bytes -= evicted.size_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "in_flight": len(self.in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "joins": self.joins,
+            "cancelled": self.cancelled,
+            "reduced": self.reduced,
+        }
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Serializes a message once so the same text can be sent to any number of sockets."""
+    if orjson is not None:
+        return orjson.dumps(message).decode('utf-8')
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def frame_data_url(frame: Dict[str, Any]) -> str:
+    mime_type = CODEC_MIME_TYPES.get(frame["codec"], "image/jpeg")
+    return f"data:{mime_type};base64,{base64.b64encode(frame['image']).decode('utf-8')}"
+
+
+def pack_client_frame(frame: Dict[str, Any]) -> bytes:
+    flags = FRAME_FLAG_FINAL if frame["final"] else 0
+    header = CLIENT_FRAME_HEADER.pack(
+        FRAME_VERSION, CLIENT_MESSAGE_IMAGE_UPDATE, frame["codec"], flags, frame["step"], frame["total_steps"]
+    )
+    return header + frame["image"]
+
+
+def encode_renditions(image: bytes, ladder: List[Tuple[int, int]]) -> List[bytes]:
+    """
+    Decodes a frame once and encodes it at every rung of the ladder smaller than the frame,
+    largest first. Blocking.
+    """
+    with Image.open(io.BytesIO(image)) as decoded:
+        # Only the header has been read so far. Low-resolution previews, such as the AI server's
+        # latent-sized "linear" ones, are often no larger than any rung and are left as they are.
+        rungs = [(max_side, quality) for max_side, quality in sorted(ladder, reverse=True) if max_side < max(decoded.size)]
+        if not rungs:
+            return []
+        current = decoded.convert("RGB")
+    encoded = []
+    for max_side, quality in rungs:
+        # Each rung is downscaled from the previous one, which is cheaper than from the original.
+        current.thumbnail((max_side, max_side), Image.BILINEAR)
+        output = io.BytesIO()
+        current.save(output, format="WEBP", quality=quality, method=0)
+        encoded.append(output.getvalue())
+    return encoded
+
+
+class RenditionEncoder:
+    """
+    Builds the rendition ladder of each intermediate frame once, on a worker pool.
+
+    A frame's ladder is a list of frames, the original first and then each smaller rendition.
+    It is started when the frame arrives from the AI server and stored on the frame, so every
+    room replaying it, live or from the cache, shares the same encode.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.ladder = config["LADDER"] if Image is not None else []
+        if config["LADDER"] and Image is None:
+            logger.warning("FRAME_RENDITIONS is set but Pillow is not installed; sending original frames only.")
+        self.executor = ThreadPoolExecutor(max_workers=config["WORKERS"], thread_name_prefix="renditions")
+
+    def start(self, frame: Dict[str, Any]):
+        frame["renditions"] = asyncio.ensure_future(self.build(frame))
+
+    async def build(self, frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if frame["final"] or not self.ladder:
+            return [frame]
+        started = time.perf_counter()
+        try:
+            images = await asyncio.get_running_loop().run_in_executor(
+                self.executor, encode_renditions, frame["image"], self.ladder
+            )
+        except Exception as e:
+            logger.warning("Could not encode frame renditions: %r", e, extra={"sample": "rendition_error"})
+            return [frame]
+        RENDITION_ENCODE.observe(time.perf_counter() - started)
+        base = {"step": frame["step"], "total_steps": frame["total_steps"], "final": False, "codec": CODEC_WEBP}
+        return [frame] + [{**base, "image": image} for image in images if len(image) < len(frame["image"])]
+
+    async def ladder_for(self, frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        renditions = frame.get("renditions")
+        # Every room replaying the frame waits on the same encode; one room giving up must not
+        # cancel it for the others.
+        return await asyncio.shield(renditions) if renditions is not None else [frame]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Player Connections ---
+# A newer message of these types makes any older undelivered one obsolete.
+# player_update is not among them: its deltas only make sense applied in order.
+LATEST_WINS_MESSAGE_TYPES = {"image_update", "time_left"}
+# Queue marker: close the socket once everything queued before it has been written.
+CLOSE_AFTER_FLUSH = "__close__"
+
+
+class PlayerConnection:
+    """
+    Owns the outbound side of one player's websocket.
+
+    Messages are queued and written by a dedicated writer task, so a slow client never holds
+    up a room broadcast. An undelivered image_update or time_left is replaced by a newer one of
+    the same type (latest wins); all other messages are delivered in order and never dropped.
+    A client that falls too far behind is disconnected instead.
+
+    The writer also measures how fast image frames drain to the client; `pick_rendition` uses
+    that to choose the frame size the client gets.
+    """
+
+    def __init__(self, websocket: WebSocket, transport: str = "json"):
+        self.websocket = websocket
+        self.transport = transport
+        self.queue: deque = deque()
+        self.wakeup = asyncio.Event()
+        self.writer_task: Optional[asyncio.Task] = None
+        self.close_task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.dropped_messages = 0
+        # Smoothed bytes per second of image frames written to the socket, once measured.
+        self.throughput_bps: Optional[float] = None
+        self.dropped_frames = 0
+        self.rendition = 0
+
+    def pick_rendition(self, ladder: List[Dict[str, Any]], frame_interval_s: float) -> int:
+        """Index of the largest rendition in `ladder` this client can take once per frame interval."""
+        if len(ladder) == 1:
+            return 0
+        budget = (self.throughput_bps or float("inf")) * frame_interval_s * RENDITION_CONFIG["HEADROOM"]
+        choice = next((i for i, frame in enumerate(ladder) if self.wire_size(frame) <= budget), len(ladder) - 1)
+        if self.dropped_frames:
+            # Frames were superseded before they could be sent, so the client is falling behind.
+            choice = max(choice, self.rendition + 1)
+            self.dropped_frames = 0
+        self.rendition = min(choice, len(ladder) - 1)
+        return self.rendition
+
+    def wire_size(self, frame: Dict[str, Any]) -> int:
+        """Bytes an image_update carrying `frame` takes on this player's transport, as the writer measures them."""
+        if self.transport == "binary":
+            return CLIENT_FRAME_HEADER.size + len(frame["image"])
+        return 4 * -(-len(frame["image"]) // 3)
+
+    def start(self):
+        self.writer_task = asyncio.create_task(self.run_writer())
+
+    def send_message(self, message: Dict[str, Any]):
+        self.send(message["type"], encode_message(message))
+
+    def send(self, message_type: str, data: str | bytes):
+        """Queues pre-encoded text or bytes; `data` may be shared with other connections."""
+        if self.closed:
+            return
+        if message_type in LATEST_WINS_MESSAGE_TYPES:
+            for i, (queued_type, _, _) in enumerate(self.queue):
+                if queued_type == message_type:
+                    del self.queue[i]
+                    self.dropped_messages += 1
+                    if message_type == "image_update":
+                        self.dropped_frames += 1
+                    break
+        now = time.monotonic()
+        self.queue.append((message_type, data, now))
+        if len(self.queue) > SEND_CONFIG["MAX_QUEUED_MESSAGES"] or now - self.queue[0][2] > SEND_CONFIG["MAX_LAG_S"]:
+            self.close("slow_consumer")
+            return
+        self.wakeup.set()
+
+    def close_after_flush(self, reason: str = ""):
+        """Closes the socket normally once everything already queued has been written."""
+        if self.closed:
+            return
+        self.queue.append((CLOSE_AFTER_FLUSH, reason, time.monotonic()))
+        self.wakeup.set()
+
+    async def write(self, message_type: str, data: str | bytes):
+        if isinstance(data, bytes):
+            await self.websocket.send_bytes(data)
+        else:
+            await self.websocket.send_text(data)
+
+    async def close_transport(self, code: int, reason: str):
+        await self.websocket.close(code=code, reason=reason)
+
+    async def run_writer(self):
+        try:
+            while True:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                message_type, data, _ = self.queue.popleft()
+                if message_type == CLOSE_AFTER_FLUSH:
+                    self.closed = True
+                    await self.close_transport(1000, data)
+                    return
+                started = time.perf_counter()
+                await asyncio.wait_for(self.write(message_type, data), timeout=SEND_CONFIG["MAX_LAG_S"])
+                elapsed = time.perf_counter() - started
+                PLAYER_SEND.observe(elapsed)
+                if message_type == "image_update":
+                    rate = len(data) / max(elapsed, 1e-6)
+                    self.throughput_bps = rate if self.throughput_bps is None else 0.7 * self.throughput_bps + 0.3 * rate
+        except asyncio.TimeoutError:
+            self.close("slow_consumer")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; the receive loop in the endpoint handles the disconnect.
+            self.closed = True
+            self.queue.clear()
+
+    def close(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        logger.info("Disconnecting player: %s.", reason)
+        if self.writer_task and self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
+        # Closing the socket ends the player's receive loop, which removes them from the room.
+        self.close_task = asyncio.create_task(self.close_transport(1013, reason))
+        self.close_task.add_done_callback(self.transport_closed)
+
+    @staticmethod
+    def transport_closed(task: asyncio.Task):
+        # The socket may already be gone, in which case there is nothing left to close.
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Could not close player socket: %r", task.exception(), extra={"sample": "close_error"})
+
+    async def aclose(self):
+        self.closed = True
+        if self.writer_task:
+            self.writer_task.cancel()
+        await asyncio.gather(*(task for task in (self.writer_task, self.close_task) if task), return_exceptions=True)
+
+
+class WorkerLink:
+    """
+    The owning worker's outbound channel to one other worker.
+
+    A room broadcast hands the same encoded message to every player. The link queues it once
+    for all of that worker's players and publishes it as a single "deliver" op that lists their
+    connection ids; the other worker fans it out to its sockets, which do the per-player
+    queueing. An undelivered image_update or time_left for a player is superseded by a newer
+    one, as in PlayerConnection.
+    """
+
+    def __init__(self, backend: "RoomBackend", worker_id: str):
+        self.backend = backend
+        self.channel = f"worker:{worker_id}"
+        # [op, message type, data, connection ids]
+        self.queue: deque = deque()
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    def send(self, connection_id: str, message_type: str, data: str | bytes):
+        if message_type in LATEST_WINS_MESSAGE_TYPES:
+            for entry in self.queue:
+                if entry[1] == message_type and connection_id in entry[3]:
+                    entry[3].remove(connection_id)
+                    break
+        last = self.queue[-1] if self.queue else None
+        if last is not None and last[0] == "deliver" and last[1] == message_type and last[2] is data:
+            last[3].append(connection_id)
+        else:
+            self.queue.append(["deliver", message_type, data, [connection_id]])
+        self.wakeup.set()
+
+    def close(self, connection_id: str, code: int, reason: str):
+        self.queue.append(["close", None, (code, reason), [connection_id]])
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            op, message_type, data, connection_ids = self.queue.popleft()
+            if not connection_ids:
+                continue
+            message: Dict[str, Any] = {"op": op, "conns": connection_ids}
+            if op == "close":
+                message["code"], message["reason"] = data
+            else:
+                message["type"] = message_type
+                message["bytes" if isinstance(data, bytes) else "text"] = data
+            try:
+                await self.backend.publish(self.channel, message)
+            except Exception as e:
+                logger.error("Failed to relay to '%s': %r", self.channel, e, extra={"sample": "relay_error"})
+
+    async def aclose(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class RemotePlayerConnection(PlayerConnection):
+    """
+    A player connected to another worker. Messages go out through the WorkerLink to that
+    worker; the worker holding the player's socket queues and writes them, and reports the
+    throughput and dropped frames that pick_rendition works from.
+    """
+
+    def __init__(self, link: WorkerLink, connection_id: str, transport: str = "json"):
+        super().__init__(websocket=None, transport=transport)
+        self.link = link
+        self.connection_id = connection_id
+
+    def start(self):
+        pass
+
+    def send(self, message_type: str, data: str | bytes):
+        if not self.closed:
+            self.link.send(self.connection_id, message_type, data)
+
+    def close_after_flush(self, reason: str = ""):
+        if not self.closed:
+            self.closed = True
+            self.link.close(self.connection_id, 1000, reason)
+
+    def close(self, reason: str):
+        if not self.closed:
+            self.closed = True
+            logger.info("Disconnecting player: %s.", reason)
+            self.link.close(self.connection_id, 1013, reason)
+
+    async def aclose(self):
+        self.closed = True
+
+
+# --- Room Backends ---
+# Pub/sub messages between workers: the length of a JSON header, the header, then the raw
+# bytes of a binary payload (the header's "bytes" field), so frames are relayed without base64.
+BUS_MESSAGE_HEADER = struct.Struct("!I")
+
+
+def encode_bus_message(message: Dict[str, Any]) -> bytes:
+    payload = message.get("bytes", b"")
+    header = encode_message({key: value for key, value in message.items() if key != "bytes"}).encode('utf-8')
+    return BUS_MESSAGE_HEADER.pack(len(header)) + header + payload
+
+
+def decode_bus_message(data: bytes) -> Dict[str, Any]:
+    (header_length,) = BUS_MESSAGE_HEADER.unpack_from(data)
+    header_end = BUS_MESSAGE_HEADER.size + header_length
+    message = json.loads(data[BUS_MESSAGE_HEADER.size:header_end])
+    if len(data) > header_end:
+        message["bytes"] = data[header_end:]
+    return message
+
+
+class RoomBackend(ABC):
+    """
+    Room registry, room ownership and event fan-out shared by all game server workers.
+
+    Every room is owned by the worker that created it. Other workers look the owner up and
+    relay their players' messages to it over pub/sub channels. Handlers passed to `subscribe`
+    are called synchronously, in publish order, and must not block. A message's "bytes" field
+    may hold raw bytes.
+    """
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def claim_room(self, room_id: str, worker_id: str) -> bool:
+        """Registers `worker_id` as the owner of a new room; False if the id is already taken."""
+
+    @abstractmethod
+    async def refresh_rooms(self, room_ids: List[str], worker_id: str):
+        """Keeps ownership of live rooms from expiring."""
+
+    @abstractmethod
+    async def get_room_owner(self, room_id: str) -> Optional[str]:
+        """The worker that owns `room_id`, or None."""
+
+    @abstractmethod
+    async def release_room(self, room_id: str, worker_id: str):
+        """Gives up ownership of a room, if `worker_id` still holds it."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        """Sends `message` to the handler subscribed to `channel`, on whichever worker it is."""
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: Callable[[Dict[str, Any]], None]):
+        """Calls `handler` with every message published to `channel`."""
+
+
+class InMemoryRoomBackend(RoomBackend):
+    """Single-process backend: every room lives in this worker, as it always has."""
+
+    def __init__(self):
+        self.owners: Dict[str, str] = {}
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+    async def claim_room(self, room_id: str, worker_id: str) -> bool:
+        if room_id in self.owners:
+            return False
+        self.owners[room_id] = worker_id
+        return True
+
+    async def refresh_rooms(self, room_ids: List[str], worker_id: str):
+        pass
+
+    async def get_room_owner(self, room_id: str) -> Optional[str]:
+        return self.owners.get(room_id)
+
+    async def release_room(self, room_id: str, worker_id: str):
+        if self.owners.get(room_id) == worker_id:
+            del self.owners[room_id]
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        handler = self.handlers.get(channel)
+        if handler is not None:
+            handler(message)
+
+    async def subscribe(self, channel: str, handler: Callable[[Dict[str, Any]], None]):
+        self.handlers[channel] = handler
+
+
+class RedisRoomBackend(RoomBackend):
+    """
+    Networked backend on Redis: ownership keys with a TTL refreshed by the owning worker, and
+    Redis pub/sub for relaying messages between workers.
+    """
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("ROOM_BACKEND_URL is set but the 'redis' package is not installed")
+        self.redis = redis_asyncio.from_url(url, decode_responses=True)
+        # Pub/sub carries binary messages (see encode_bus_message), so it needs a raw client.
+        self.bus = redis_asyncio.from_url(url)
+        self.pubsub = self.bus.pubsub()
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self.listener_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def owner_key(room_id: str) -> str:
+        return f"pictionary:room:{room_id}:owner"
+
+    async def close(self):
+        if self.listener_task:
+            self.listener_task.cancel()
+            await asyncio.gather(self.listener_task, return_exceptions=True)
+        await self.pubsub.aclose()
+        await self.bus.aclose()
+        await self.redis.aclose()
+
+    async def claim_room(self, room_id: str, worker_id: str) -> bool:
+        return bool(await self.redis.set(self.owner_key(room_id), worker_id, nx=True, ex=ROOM_OWNERSHIP_TTL_S))
+
+    async def refresh_rooms(self, room_ids: List[str], worker_id: str):
+        if not room_ids:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                pipe.set(self.owner_key(room_id), worker_id, xx=True, ex=ROOM_OWNERSHIP_TTL_S)
+            await pipe.execute()
+
+    async def get_room_owner(self, room_id: str) -> Optional[str]:
+        return await self.redis.get(self.owner_key(room_id))
+
+    async def release_room(self, room_id: str, worker_id: str):
+        # Compare-and-delete: WATCH makes the delete fail if the key changes after the check, so
+        # a worker never deletes ownership another worker has claimed in the meantime.
+        key = self.owner_key(room_id)
+        async with self.redis.pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) != worker_id:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                await pipe.execute()
+            except WatchError:
+                logger.info("Room '%s' changed owner while being released.", room_id)
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.bus.publish(channel, encode_bus_message(message))
+
+    async def subscribe(self, channel: str, handler: Callable[[Dict[str, Any]], None]):
+        self.handlers[channel] = handler
+        await self.pubsub.subscribe(channel)
+        if self.listener_task is None:
+            self.listener_task = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        while True:
+            try:
+                async for message in self.pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    channel = message["channel"].decode('utf-8')
+                    handler = self.handlers.get(channel)
+                    if handler is None:
+                        continue
+                    try:
+                        handler(decode_bus_message(message["data"]))
+                    except Exception as e:
+                        logger.exception("Error handling message on '%s': %r", channel, e)
+            except redis_asyncio.ConnectionError as e:
+                # The pubsub client resubscribes to its channels when it reconnects.
+                logger.error("Lost connection to the room backend: %r", e)
+                await asyncio.sleep(1.0)
+
+
+def create_room_backend(url: str) -> RoomBackend:
+    if not url:
+        return InMemoryRoomBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRoomBackend(url)
+    raise ValueError(f"Unsupported ROOM_BACKEND_URL: {url}")
+
+
+# --- Round Scheduler ---
+class ScheduledCall:
+    """A pending call on the RoundScheduler. Cancelling it leaves it in the heap to be skipped."""
+
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline: float, callback: Callable[[float], Awaitable[None]]):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class RoundScheduler:
+    """
+    Runs the round timers of every room in the process from a single task.
+
+    Timers sit in one heap keyed by an absolute deadline on the event loop clock, and each callback
+    receives the deadline it was scheduled for rather than the time it ran. Rooms chain their next
+    deadline from that value, so a late tick or a slow broadcast never pushes later rounds back.
+    Scheduling and cancelling are O(log n) and O(1), and the process runs one sleeping task no matter
+    how many rooms it hosts. Cancelled calls are dropped when they reach the top of the heap; rooms
+    only schedule up to a round ahead, so they never pile up.
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int, ScheduledCall]] = []
+        self.sequence = 0
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def call_at(self, deadline: float, callback: Callable[[float], Awaitable[None]]) -> ScheduledCall:
+        call = ScheduledCall(deadline, callback)
+        self.sequence += 1
+        heapq.heappush(self.heap, (deadline, self.sequence, call))
+        if self.heap[0][2] is call:
+            self.wakeup.set()
+        return call
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def run(self):
+        while True:
+            now = self.now()
+            while self.heap and self.heap[0][0] <= now:
+                deadline, _, call = heapq.heappop(self.heap)
+                if call.cancelled:
+                    continue
+                ROUND_TIMER_LAG.observe(now - deadline)
+                try:
+                    await call.callback(deadline)
+                except Exception:
+                    logger.exception("Round timer callback failed.")
+                now = self.now()
+            self.wakeup.clear()
+            timeout = self.heap[0][0] - self.now() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
 
 # --- GameRoom Class (with modifications) ---
 class GameRoom:
     """Manages the state and logic for a single game room."""
 
-    def __init__(self, room_id: str):
+    def __init__(self, room_id: str, manager: "ConnectionManager"):
         self.room_id: str = room_id
+        self.manager = manager
         self.host: Optional[str] = None
-        self.players: Dict[str, WebSocket] = {}
+        self.players: Dict[str, PlayerConnection] = {}
         self.scores: Dict[str, int] = {}
         self.game_state: str = "LOBBY"
         self.current_prompt: str = ""
-        self.current_image_b64: str = ""
-        self.round_timer_task: Optional[asyncio.Task] = None
-        self.game_loop_task: Optional[asyncio.Task] = None
+        self.current_frame: Optional[Dict[str, Any]] = None
         self.image_stream_task: Optional[asyncio.Task] = None
+        # Round timing runs on the manager's RoundScheduler, in event loop time.
+        self.round_timer: Optional[ScheduledCall] = None
+        self.tick_timer: Optional[ScheduledCall] = None
+        self.current_round: int = 0
         self.round_start_time: float = 0.0
+        self.round_deadline: float = 0.0
+        # Player list changes since the last player_update: changed fields by player, and players
+        # who left. players_version counts the player_updates sent so far.
+        self.players_version: int = 0
+        self.dirty_players: Dict[str, set] = {}
+        self.removed_players: set = set()
+        self.player_update_timer: Optional[ScheduledCall] = None
+        self.guess_buckets: Dict[str, TokenBucket] = {}
         self.round_best_scores: Dict[str, int] = {}
         self.round_best_similarities: Dict[str, float] = {}
         self.available_prompts: List[str] = []
-        print(f"Room {room_id} created.")
+        self.log = ContextAdapter(logger, {"room_id": room_id})
+        self.log.info("Room created.")
+
+    def player_entry(self, name: str) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "score": self.scores[name],
+            "isHost": name == self.host,
+            "bestSimilarity": self.round_best_similarities.get(name, 0.0)
+        }
 
     def get_full_game_state(self) -> Dict[str, Any]:
         """Helper method to assemble the complete game state for a new player."""
-        player_data = [
-            {
-                "name": name,
-                "score": self.scores[name],
-                "isHost": name == self.host,
-                "bestSimilarity": self.round_best_similarities.get(name, 0.0)
-            }
-            for name in self.players
-        ]
         return {
             "roomId": self.room_id,
-            "players": player_data,
+            "players": [self.player_entry(name) for name in self.players],
+            "playersVersion": self.players_version,
             "gameState": self.game_state,
-            "currentRound": 0,
-            "totalRounds": 10,
-            "timeLeft": 0,
+            "currentRound": self.current_round,
+            "totalRounds": GAME_CONFIG["TOTAL_ROUNDS"],
+            "timeLeft": self.time_left(),
             "promptHint": f"{len(self.current_prompt.split())} words" if self.current_prompt else "",
-            "currentImageB64": self.current_image_b64,
+            "currentImageB64": frame_data_url(self.current_frame) if self.current_frame else "",
             "correctPrompt": self.current_prompt if self.game_state == 'POST_ROUND' else None,
         }
     
-    async def connect(self, websocket: WebSocket, player_name: str):
-        self.players[player_name] = websocket
+    async def connect(self, connection: PlayerConnection, player_name: str):
+        self.players[player_name] = connection
         self.scores[player_name] = 0
         if self.host is None:
             self.host = player_name
         
-        await websocket.send_json({
+        connection.send_message({
             "type": "join_success",
-            "payload": self.get_full_game_state()
+            "payload": {**self.get_full_game_state(), "transport": connection.transport}
         })
 
-        await self.broadcast_player_update()
-        print(f"Player '{player_name}' connected to room '{self.room_id}'. Host is '{self.host}'.")
+        self.mark_player_changed(player_name)
+        self.log.info("Player '%s' connected. Host is '%s'.", player_name, self.host)
 
     async def disconnect(self, player_name: str):
         if player_name in self.players:
             del self.players[player_name]
             del self.scores[player_name]
+            self.guess_buckets.pop(player_name, None)
+            self.mark_player_removed(player_name)
             if self.host == player_name:
                 self.host = next(iter(self.players), None)
-            if not self.players and self.game_loop_task:
-                self.game_loop_task.cancel()
+                if self.host:
+                    self.mark_player_changed(self.host, "isHost")
+            if not self.players:
+                self.cancel_timers()
+                if self.player_update_timer:
+                    self.player_update_timer.cancel()
                 if self.image_stream_task:
                     self.image_stream_task.cancel()
-            await self.broadcast_player_update()
-            print(f"Player '{player_name}' disconnected. New host is '{self.host}'.")
+            self.log.info("Player '%s' disconnected. New host is '%s'.", player_name, self.host)
 
     async def broadcast(self, message: dict):
         if not self.players: return
-        players_to_send = list(self.players.values())
-        await asyncio.gather(
-            *[player.send_json(message) for player in players_to_send],
-            return_exceptions=True
-        )
+        started = time.perf_counter()
+        text = encode_message(message)
+        for player in list(self.players.values()):
+            player.send(message["type"], text)
+        BROADCAST_DURATION.observe(time.perf_counter() - started, message["type"])
 
-    async def broadcast_player_update(self):
-        player_data = [
-            {
-                "name": name,
-                "score": self.scores[name],
-                "isHost": name == self.host,
-                "bestSimilarity": self.round_best_similarities.get(name, 0.0)
-            }
-            for name in self.players
-        ]
-        await self.broadcast({"type": "player_update", "payload": {"players": player_data}})
+    async def broadcast_image_frame(self, ladder: List[Dict[str, Any]]):
+        """
+        Sends a frame to every player in the rendition that suits their connection. `ladder` is
+        the original frame followed by its smaller renditions; each is encoded at most once per
+        transport.
+        """
+        started = time.perf_counter()
+        self.current_frame = ladder[0]
+        frame_interval_s = max(ladder[0].get("step_ms", 0), 1) / 1000
+        messages: Dict[Tuple[int, str], str | bytes] = {}
+        for player in list(self.players.values()):
+            index = player.pick_rendition(ladder, frame_interval_s)
+            message = messages.get((index, player.transport))
+            if message is None:
+                frame = ladder[index]
+                if player.transport == "binary":
+                    message = pack_client_frame(frame)
+                else:
+                    message = encode_message({
+                        "type": "image_update",
+                        "payload": {
+                            "imageBase64": frame_data_url(frame),
+                            "step": frame["step"],
+                            "totalSteps": frame["total_steps"],
+                        }
+                    })
+                messages[(index, player.transport)] = message
+            player.send("image_update", message)
+        BROADCAST_DURATION.observe(time.perf_counter() - started, "image_update")
+
+    def mark_player_changed(self, name: str, *fields: str):
+        """Queues changed player fields (all of them if none are given) for the next player_update."""
+        self.dirty_players.setdefault(name, set()).update(fields or ("score", "isHost", "bestSimilarity"))
+        self.removed_players.discard(name)
+        self.schedule_player_update()
+
+    def mark_player_removed(self, name: str):
+        self.dirty_players.pop(name, None)
+        self.removed_players.add(name)
+        self.schedule_player_update()
+
+    def schedule_player_update(self):
+        if self.player_update_timer is None:
+            scheduler = self.manager.round_scheduler
+            self.player_update_timer = scheduler.call_at(
+                scheduler.now() + GAME_CONFIG["PLAYER_UPDATE_TICK_S"], self.flush_player_update
+            )
+
+    async def flush_player_update(self, deadline: float):
+        """Broadcasts everything that changed since the last player_update as one delta."""
+        self.player_update_timer = None
+        if not self.dirty_players and not self.removed_players:
+            return
+        self.players_version += 1
+        changed = []
+        for name, fields in self.dirty_players.items():
+            entry = self.player_entry(name)
+            changed.append({"name": name, **{field: entry[field] for field in fields}})
+        payload: Dict[str, Any] = {"version": self.players_version, "players": changed}
+        if self.removed_players:
+            payload["removed"] = sorted(self.removed_players)
+        self.dirty_players.clear()
+        self.removed_players.clear()
+        await self.broadcast({"type": "player_update", "payload": payload})
+
+    def send_player_snapshot(self, player_name: str):
+        """Sends the full player list to a client that missed a player_update version."""
+        player = self.players.get(player_name)
+        if player:
+            player.send_message({
+                "type": "player_update",
+                "payload": {
+                    "version": self.players_version, "full": True,
+                    "players": [self.player_entry(name) for name in self.players],
+                },
+            })
 
     async def handle_message(self, player_name: str, data: dict):
         message_type = data.get("type")
         payload = data.get("payload", {})
-        print(f"Room '{self.room_id}' received message from '{player_name}': {message_type}")
+        self.log.debug(
+            "Received %s from '%s'.", message_type, player_name, extra={"player": player_name, "sample": "room_message"}
+        )
 
         if message_type == "start_game" and player_name == self.host:
             await self.start_game()
         elif message_type == "new_guess":
             await self.process_guess(player_name, payload.get("guess"))
+        elif message_type == "resync_players":
+            self.send_player_snapshot(player_name)
     
     async def start_game(self):
         if self.game_state == "LOBBY":
@@ -149,27 +1749,38 @@ class GameRoom:
             # --- CHANGE 2: Create a fresh, shuffled list of prompts for this game session ---
             self.available_prompts = PROMPTS.copy()
             random.shuffle(self.available_prompts)
-            print(f"Room '{self.room_id}' is starting the game with {len(self.available_prompts)} unique prompts.")
+            self.log.info("Starting the game with %d unique prompts.", len(self.available_prompts))
             
             await self.broadcast({"type": "game_starting", "payload": {"roomId": self.room_id}})
-            self.game_loop_task = asyncio.create_task(self.run_game_loop())
+            await self.start_round(1, self.manager.round_scheduler.now())
 
-    async def run_game_loop(self):
-        for round_num in range(1, 11):
-            if not self.players:
-                break
-            await self.start_round(round_num)
-            await asyncio.sleep(GAME_CONFIG["ROUND_DURATION_S"] + GAME_CONFIG["POST_ROUND_DELAY_S"])
-        print(f"Game in room '{self.room_id}' has ended.")
-        self.game_state = "LOBBY"
+    def time_left(self) -> float:
+        """Seconds until the current round ends, or 0 outside a round."""
+        if self.game_state != "IN_GAME":
+            return 0
+        return round(max(0.0, self.round_deadline - self.manager.round_scheduler.now()), 2)
+
+    def schedule(self, deadline: float, callback: Callable[[float], Awaitable[None]]):
+        """Replaces the room's pending round transition."""
+        if self.round_timer:
+            self.round_timer.cancel()
+        self.round_timer = self.manager.round_scheduler.call_at(deadline, callback)
+
+    def cancel_timers(self):
+        for timer in (self.round_timer, self.tick_timer):
+            if timer:
+                timer.cancel()
+        self.round_timer = self.tick_timer = None
 
-    async def start_round(self, round_num: int):
+    async def start_round(self, round_num: int, started_at: float):
+        if not self.players:
+            return
         self.game_state = "IN_GAME"
         
         # --- CHANGE 3: Get a unique prompt for this round ---
         # If we've run out of prompts, reset the list to avoid crashing.
         if not self.available_prompts:
-            print(f"Room '{self.room_id}' ran out of prompts. Resetting and reshuffling.")
+            self.log.info("Ran out of prompts. Resetting and reshuffling.")
             self.available_prompts = PROMPTS.copy()
             random.shuffle(self.available_prompts)
 
@@ -177,73 +1788,90 @@ class GameRoom:
         self.current_prompt = self.available_prompts.pop()
         
         self.round_best_scores.clear()
+        for name in self.round_best_similarities:
+            if name in self.players:
+                self.mark_player_changed(name, "bestSimilarity")
         self.round_best_similarities.clear()
-        self.round_start_time = time.time()
-        print(f"Room '{self.room_id}' Round {round_num}: Prompt is '{self.current_prompt}'")
+        self.current_round = round_num
+        self.round_start_time = started_at
+        self.round_deadline = started_at + GAME_CONFIG["ROUND_DURATION_S"]
+        self.log.info("Round %d: Prompt is '%s'", round_num, self.current_prompt)
         await self.broadcast({
             "type": "new_turn",
             "payload": {
-                "round": round_num, "totalRounds": 10,
-                "timeLeft": GAME_CONFIG["ROUND_DURATION_S"],
+                "round": round_num, "totalRounds": GAME_CONFIG["TOTAL_ROUNDS"],
+                "timeLeft": self.time_left(),
                 "imageBase64": None,
                 "promptHint": f"{len(self.current_prompt.split())} words"
             }
         })
-        await self.broadcast_player_update()
-        if self.round_timer_task: self.round_timer_task.cancel()
+        self.schedule(self.round_deadline, self.end_round)
+        self.schedule_tick(started_at + GAME_CONFIG["TIME_TICK_S"])
         if self.image_stream_task: self.image_stream_task.cancel()
-        self.round_timer_task = asyncio.create_task(self.round_timer())
         self.image_stream_task = asyncio.create_task(self.run_image_generation_and_broadcast())
 
+    def schedule_tick(self, deadline: float):
+        if deadline < self.round_deadline:
+            self.tick_timer = self.manager.round_scheduler.call_at(deadline, self.send_time_left)
+        else:
+            self.tick_timer = None
+
+    async def send_time_left(self, deadline: float):
+        await self.broadcast({"type": "time_left", "payload": {"round": self.current_round, "timeLeft": self.time_left()}})
+        self.schedule_tick(deadline + GAME_CONFIG["TIME_TICK_S"])
+
     async def run_image_generation_and_broadcast(self):
+        key = (self.current_prompt, GAME_CONFIG["GENERATION_SEED"], GAME_CONFIG["GENERATION_STEPS"])
+        started = time.perf_counter()
+        first_frame = True
         try:
-            async with websockets.connect(AI_SERVER_URL) as ai_websocket:
-                await ai_websocket.send(self.current_prompt)
-                while True:
-                    message = await ai_websocket.recv()
-                    if message == "generation_complete":
-                        print(f"Room '{self.room_id}': Generation complete.")
-                        break
-                    self.current_image_b64 = message.decode('utf-8') if isinstance(message, bytes) else message
-                    full_data_url = f"data:image/png;base64,{self.current_image_b64}"
-                    await self.broadcast({
-                        "type": "image_update",
-                        "payload": {"imageBase64": full_data_url}
-                    })
+            sequence = self.manager.frame_cache.get_or_generate(key, self.manager.generate_frames, self.room_id)
+            # Relay time only means something for frames arriving live, not for cached replays.
+            live = not sequence.done
+            # Closing the replay promptly lets the generation stop as soon as no room is watching.
+            async with aclosing(sequence.replay()) as frames:
+                async for frame in frames:
+                    await self.broadcast_image_frame(await self.manager.renditions.ladder_for(frame))
+                    now = time.perf_counter()
+                    if first_frame:
+                        PROMPT_TO_FIRST_FRAME.observe(now - started)
+                        first_frame = False
+                    if live and frame["received_at"] >= started:
+                        FRAME_RELAY.observe(now - frame["received_at"])
+            self.log.info("Generation complete.")
         except Exception as e:
-            print(f"Room '{self.room_id}': Error during image generation stream: {e}")
+            self.log.error("Error during image generation stream: %s", e)
 
-    async def round_timer(self):
-        await asyncio.sleep(GAME_CONFIG["ROUND_DURATION_S"])
-        if self.game_state == "IN_GAME":
-            print(f"Room '{self.room_id}' timer expired.")
-            await self.end_round()
-            
     async def process_guess(self, player_name: str, guess: str):
         if not guess or self.game_state != "IN_GAME": return
-        similarity = 0.0
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(AI_SCORING_URL, json={"prompt": self.current_prompt, "guess": guess}, timeout=10.0)
-                response.raise_for_status()
-                similarity = response.json().get("score", 0.0)
-        except httpx.RequestError as e:
-            print(f"Error calling AI scoring server: {e}")
-            similarity = -1
-        
-        player_websocket = self.players.get(player_name)
-        if player_websocket:
-            await player_websocket.send_json({"type": "guess_feedback", "payload": {"similarity": round(similarity, 2)}})
+        bucket = self.guess_buckets.get(player_name)
+        if bucket is None:
+            bucket = self.guess_buckets[player_name] = TokenBucket(
+                GAME_CONFIG["GUESS_RATE_PER_S"], GAME_CONFIG["GUESS_BURST"]
+            )
+        if not bucket.try_acquire():
+            self.manager.guesses_rate_limited += 1
+            player = self.players.get(player_name)
+            if player:
+                player.send_message({"type": "guess_rate_limited", "payload": {"retryAfter": round(bucket.retry_after(), 2)}})
+            return
+        started = time.perf_counter()
+        similarity = await self.manager.scoring_client.score(self.current_prompt, guess)
+
+        player = self.players.get(player_name)
+        if player:
+            player.send_message({"type": "guess_feedback", "payload": {"similarity": round(similarity, 2)}})
+        GUESS_ROUND_TRIP.observe(time.perf_counter() - started)
         
         if similarity < 0: return
 
         current_best_similarity = self.round_best_similarities.get(player_name, 0.0)
         if similarity > current_best_similarity:
             self.round_best_similarities[player_name] = similarity
-            await self.broadcast_player_update()
+            self.mark_player_changed(player_name, "bestSimilarity")
 
         base_points = int(GAME_CONFIG["POINTS_FOR_CORRECT_GUESS"] * (similarity / 100))
-        time_elapsed = time.time() - self.round_start_time
+        time_elapsed = self.manager.round_scheduler.now() - self.round_start_time
         round_progress = min(1.0, time_elapsed / GAME_CONFIG["ROUND_DURATION_S"])
         time_modifier = 1.0
         if round_progress > 0.8:
@@ -255,13 +1883,18 @@ class GameRoom:
             points_to_add = potential_new_score - current_best_score
             self.scores[player_name] += points_to_add
             self.round_best_scores[player_name] = potential_new_score
-            print(f"IMPROVEMENT for '{player_name}': New round score is {potential_new_score}. Added {points_to_add} to total.")
-            await self.broadcast_player_update()
+            self.log.debug(
+                "Improvement for '%s': new round score is %d, added %d to total.",
+                player_name, potential_new_score, points_to_add,
+                extra={"player": player_name, "sample": "score_improvement"},
+            )
+            self.mark_player_changed(player_name, "score")
 
-    async def end_round(self):
+    async def end_round(self, ended_at: float):
         if self.image_stream_task: self.image_stream_task.cancel()
+        self.cancel_timers()
         self.game_state = "POST_ROUND"
-        print(f"Room '{self.room_id}' round ended.")
+        self.log.info("Round ended.")
         await self.broadcast({
             "type": "round_end",
             "payload": {
@@ -270,36 +1903,286 @@ class GameRoom:
                 "roundBestSimilarities": self.round_best_similarities
             }
         })
+        # The next round is timed from when this one ended, not from when this callback ran.
+        next_start = ended_at + GAME_CONFIG["POST_ROUND_DELAY_S"]
+        if self.current_round < GAME_CONFIG["TOTAL_ROUNDS"]:
+            self.schedule(next_start, functools.partial(self.start_round, self.current_round + 1))
+        else:
+            self.schedule(next_start, self.end_game)
+
+    async def end_game(self, ended_at: float):
+        self.log.info("Game has ended.")
+        self.game_state = "LOBBY"
 
 # --- ConnectionManager and FastAPI App
 class ConnectionManager:
     def __init__(self):
         self.rooms: Dict[str, GameRoom] = {}
         self.active_connections: Dict[WebSocket, tuple[str, str]] = {}
+        self.ai_backends = create_ai_backend_pool(AI_POOL_CONFIG, SCORING_CONFIG)
+        self.scoring_client = ScoringClient(
+            self.ai_backends, SCORING_CONFIG,
+            LocalScoringEngine(LOCAL_SCORING_CONFIG) if LOCAL_SCORING_CONFIG["ENGINE"] == "local" else None,
+        )
+        self.frame_cache = FrameCache(FRAME_CACHE_MAX_BYTES)
+        self.renditions = RenditionEncoder(RENDITION_CONFIG)
+        self.backend = create_room_backend(ROOM_BACKEND_URL)
+        # Players whose room lives on another worker, by connection id.
+        self.forwarded_connections: Dict[str, PlayerConnection] = {}
+        # Inbound queues of players on other workers who joined one of our rooms.
+        self.remote_sessions: Dict[str, asyncio.Queue] = {}
+        self.remote_session_tasks: set = set()
+        # Outbound relays to the workers holding those players' sockets, by worker id.
+        self.worker_links: Dict[str, WorkerLink] = {}
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.round_scheduler = RoundScheduler()
+        self.guesses_rate_limited = 0
+
+    async def startup(self):
+        self.round_scheduler.start()
+        await self.ai_backends.start()
+        await self.scoring_client.start()
+        await self.backend.start()
+        await self.backend.subscribe(f"worker:{WORKER_ID}", self.handle_worker_message)
+        self.heartbeat_task = asyncio.create_task(self.refresh_room_ownership())
+        logger.info("Worker '%s' started with %s.", WORKER_ID, type(self.backend).__name__)
 
-    def create_room(self) -> GameRoom:
-        """Creates a new room with a unique ID, stores it, and returns it."""
+    async def shutdown(self):
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        await self.round_scheduler.stop()
+        for sequence in list(self.frame_cache.in_flight.values()):
+            if sequence.task:
+                sequence.task.cancel()
+        for task in self.remote_session_tasks:
+            task.cancel()
+        await asyncio.gather(*self.remote_session_tasks, return_exceptions=True)
+        for room_id in list(self.rooms):
+            await self.backend.release_room(room_id, WORKER_ID)
+        await asyncio.gather(*(link.aclose() for link in self.worker_links.values()))
+        await self.backend.close()
+        await self.scoring_client.close()
+        await self.ai_backends.close()
+        self.renditions.close()
+
+    async def generate_frames(self, sequence: FrameSequence):
+        """Streams a seeded generation from the AI servers into `sequence`."""
+        prompt, seed, steps = sequence.key
+        async for frame in self.ai_backends.generate(prompt, seed, steps, sequence.requested_by):
+            self.renditions.start(frame)
+            sequence.add_frame(frame)
+        # The frame cache also holds the renditions, so count them once they are all encoded.
+        ladders = await asyncio.gather(*(frame["renditions"] for _, frame in sequence.frames))
+        sequence.size_bytes += sum(len(rendition["image"]) for ladder in ladders for rendition in ladder[1:])
+
+    async def create_room(self) -> GameRoom:
+        """Creates a new room with an ID that is unique across all workers, stores it, and returns it."""
         while True:
             room_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-            if room_id not in self.rooms:
+            if room_id not in self.rooms and await self.backend.claim_room(room_id, WORKER_ID):
                 break
         
-        new_room = GameRoom(room_id)
+        new_room = GameRoom(room_id, self)
         self.rooms[room_id] = new_room
         return new_room
 
     def get_room(self, room_id: str) -> Optional[GameRoom]:
         """Safely retrieves a room by its ID, returning None if not found."""
         return self.rooms.get(room_id)
+
+    async def get_remote_room_owner(self, room_id: str) -> Optional[str]:
+        """Returns the worker that owns `room_id` if it is alive on another worker."""
+        owner = await self.backend.get_room_owner(room_id)
+        return owner if owner not in (None, WORKER_ID) else None
         
-    def remove_room_if_empty(self, room_id: str):
+    async def remove_room_if_empty(self, room_id: str):
         room = self.get_room(room_id)
         if room and not room.players:
             del self.rooms[room_id]
-            print(f"Room '{room_id}' is empty and has been closed.")
+            await self.backend.release_room(room_id, WORKER_ID)
+            logger.info("Room is empty and has been closed.", extra={"room_id": room_id})
+
+    async def refresh_room_ownership(self):
+        while True:
+            await asyncio.sleep(ROOM_OWNERSHIP_TTL_S / 3)
+            try:
+                await self.backend.refresh_rooms(list(self.rooms), WORKER_ID)
+            except Exception as e:
+                logger.error("Failed to refresh room ownership: %r", e)
+
+    @staticmethod
+    def get_join_error(room: GameRoom, player_name: str) -> Optional[str]:
+        if len(room.players) >= GAME_CONFIG["MAX_PLAYERS"]:
+            return "room_full"
+        if player_name in room.players:
+            return "name_taken"
+        return None
+
+    # Cross-worker relaying. The worker holding a player's socket publishes "join", "message"
+    # and "leave" ops to the room owner's channel, plus a periodic "delivery" report of how fast
+    # the player's frames drain so the owner can pick their rendition. The owner answers with
+    # "deliver" and "close", each addressed to a list of connections on that worker.
+
+    def worker_link(self, worker_id: str) -> WorkerLink:
+        link = self.worker_links.get(worker_id)
+        if link is None:
+            link = self.worker_links[worker_id] = WorkerLink(self.backend, worker_id)
+        return link
+
+    def handle_worker_message(self, message: Dict[str, Any]):
+        op = message.get("op")
+        connection_id = message.get("conn")
+        if op in ("join", "message", "delivery", "leave"):
+            queue = self.remote_sessions.get(connection_id)
+            if queue is None and op == "join":
+                queue = asyncio.Queue()
+                self.remote_sessions[connection_id] = queue
+                task = asyncio.create_task(self.run_remote_session(connection_id, message["worker"], queue))
+                self.remote_session_tasks.add(task)
+                task.add_done_callback(self.remote_session_tasks.discard)
+            if queue is not None:
+                queue.put_nowait(message)
+        elif op in ("deliver", "close"):
+            data = message.get("bytes", message.get("text"))
+            for connection_id in message["conns"]:
+                connection = self.forwarded_connections.get(connection_id)
+                if connection is None:
+                    continue
+                if op == "close":
+                    connection.close_after_flush(message.get("reason", ""))
+                else:
+                    connection.send(message["type"], data)
+
+    async def run_remote_session(self, connection_id: str, worker_id: str, queue: asyncio.Queue):
+        """Plays the part of websocket_endpoint for a player whose socket is on another worker."""
+        connection = RemotePlayerConnection(self.worker_link(worker_id), connection_id)
+        room: Optional[GameRoom] = None
+        player_name: Optional[str] = None
+        try:
+            while True:
+                message = await queue.get()
+                op = message["op"]
+                if op == "join":
+                    connection.transport = message.get("transport", "json")
+                    connection.start()
+                    room = self.get_room(message["room_id"])
+                    error = "room_not_found" if room is None else self.get_join_error(room, message["player_name"])
+                    if error:
+                        connection.send_message({"type": "error", "message": error})
+                        connection.close_after_flush()
+                        room = None
+                        continue
+                    player_name = message["player_name"]
+                    await room.connect(connection, player_name)
+                elif op == "message" and room and player_name:
+                    await room.handle_message(player_name, message["data"])
+                elif op == "delivery":
+                    connection.throughput_bps = message["throughput_bps"]
+                    connection.dropped_frames += message["dropped_frames"]
+                elif op == "leave":
+                    break
+        except Exception as e:
+            logger.exception("An unexpected error occurred for remote player %s: %s", player_name, e)
+        finally:
+            self.remote_sessions.pop(connection_id, None)
+            await connection.aclose()
+            if room and player_name and room.players.get(player_name) is connection:
+                await room.disconnect(player_name)
+                await self.remove_room_if_empty(room.room_id)
+
+    async def forward_player(self, websocket: WebSocket, owner: str, room_id: str, player_name: str, transport: str):
+        """Relays a player whose room is owned by another worker, until their socket closes."""
+        connection_id = uuid.uuid4().hex
+        owner_channel = f"worker:{owner}"
+        connection = PlayerConnection(websocket, transport)
+        connection.start()
+        self.forwarded_connections[connection_id] = connection
+        report_task: Optional[asyncio.Task] = None
+        try:
+            await self.backend.publish(owner_channel, {
+                "op": "join", "conn": connection_id, "worker": WORKER_ID,
+                "room_id": room_id, "player_name": player_name, "transport": transport,
+            })
+            report_task = asyncio.create_task(self.report_delivery(connection, owner_channel, connection_id))
+            while True:
+                data = await websocket.receive_json()
+                await self.backend.publish(owner_channel, {"op": "message", "conn": connection_id, "data": data})
+        finally:
+            del self.forwarded_connections[connection_id]
+            if report_task:
+                report_task.cancel()
+                await asyncio.gather(report_task, return_exceptions=True)
+            await connection.aclose()
+            try:
+                await self.backend.publish(owner_channel, {"op": "leave", "conn": connection_id})
+            except Exception as e:
+                logger.error("Failed to notify worker '%s' that a player left: %r", owner, e)
+
+    async def report_delivery(self, connection: PlayerConnection, owner_channel: str, connection_id: str):
+        """
+        Sends the room owner what only this worker can measure about a relayed player: their frame
+        throughput and the frames superseded before they could be written. The owner's
+        RemotePlayerConnection uses them in pick_rendition like a local player's.
+        """
+        reported_bps: Optional[float] = None
+        while True:
+            await asyncio.sleep(RENDITION_CONFIG["REPORT_INTERVAL_S"])
+            if connection.throughput_bps is None or (connection.throughput_bps == reported_bps and not connection.dropped_frames):
+                continue
+            dropped_frames, connection.dropped_frames = connection.dropped_frames, 0
+            reported_bps = connection.throughput_bps
+            try:
+                await self.backend.publish(owner_channel, {
+                    "op": "delivery", "conn": connection_id,
+                    "throughput_bps": reported_bps, "dropped_frames": dropped_frames,
+                })
+            except Exception as e:
+                logger.warning("Failed to report delivery to '%s': %r", owner_channel, e, extra={"sample": "relay_error"})
 
-app = FastAPI()
 manager = ConnectionManager()
+metrics.gauge("game_active_rooms", "Rooms owned by this worker.", lambda: len(manager.rooms))
+metrics.gauge(
+    "game_active_players", "Players in rooms owned by this worker.",
+    lambda: sum(len(room.players) for room in manager.rooms.values()),
+)
+metrics.counter("game_log_records_dropped_total", "Log records dropped because the log queue was full.",
+                lambda: log_handler.dropped)
+metrics.gauge("game_frame_cache_bytes", "Bytes of generated frames held by the frame cache.",
+              lambda: manager.frame_cache.size_bytes)
+metrics.counter("game_generations_cancelled_total", "Generations cancelled because no room was watching them any more.",
+                lambda: manager.frame_cache.cancelled)
+metrics.counter("game_generations_reduced_total", "Generations the AI server scaled down to meet their deadline; not cached.",
+                lambda: manager.frame_cache.reduced)
+metrics.gauge("game_ai_backend_generation_up", "1 while an AI backend's diffusion model passes its health checks.",
+              lambda: {b.name: int(b.healthy["diffusion"]) for b in manager.ai_backends.backends}, labelname="backend")
+metrics.gauge("game_ai_backend_scoring_up", "1 while an AI backend's scoring model passes its health checks.",
+              lambda: {b.name: int(b.healthy["scoring"]) for b in manager.ai_backends.backends}, labelname="backend")
+metrics.gauge("game_ai_backend_generations", "Generations in flight on each AI backend.",
+              lambda: {b.name: b.generation_client.in_flight() for b in manager.ai_backends.backends}, labelname="backend")
+metrics.gauge("game_ai_backend_scoring_latency_seconds", "Recent scoring latency of each AI backend.",
+              lambda: {b.name: b.scoring_latency_s for b in manager.ai_backends.backends}, labelname="backend")
+metrics.counter("game_generation_failovers_total", "Generations moved to another AI backend after theirs failed.",
+                lambda: manager.ai_backends.generation_failovers)
+metrics.counter("game_scoring_failovers_total", "Scoring attempts retried on another AI backend.",
+                lambda: manager.ai_backends.scoring_failovers)
+metrics.gauge("game_score_cache_entries", "Guess scores held by the score cache.",
+              lambda: len(manager.scoring_client.cache.entries))
+metrics.counter("game_score_cache_hits_total", "Guesses answered from the score cache.",
+                lambda: manager.scoring_client.cache.hits)
+metrics.counter("game_score_cache_misses_total", "Guesses that had to be scored.",
+                lambda: manager.scoring_client.cache.misses)
+metrics.gauge("game_local_scoring_ready", "1 once the in-process scoring engine serves guesses.",
+              lambda: int(bool(manager.scoring_client.local_engine and manager.scoring_client.local_engine.ready)))
+metrics.counter("game_guesses_rate_limited_total", "Guesses rejected by the per-player rate limit.",
+                lambda: manager.guesses_rate_limited)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await manager.startup()
+    yield
+    await manager.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173", "http://127.0.0.1:5173", "https://pictionary-ai.pages.dev"
@@ -312,16 +2195,22 @@ app.add_middleware(
 @app.post("/api/rooms")
 async def create_room_endpoint():
     """This is now the only place where a new room is created."""
-    room = manager.create_room()
-    print(f"New room created via API endpoint: {room.room_id}")
+    room = await manager.create_room()
+    logger.info("New room created via API endpoint.", extra={"room_id": room.room_id})
     return {"room_id": room.room_id}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage latency histograms and room gauges in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.websocket("/ws/game")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     room: Optional[GameRoom] = None
     player_name: Optional[str] = None
     room_id: Optional[str] = None
+    connection: Optional[PlayerConnection] = None
     try:
         initial_data = await websocket.receive_json()
         message_type = initial_data.get("type")
@@ -336,25 +2225,28 @@ async def websocket_endpoint(websocket: WebSocket):
                 return
 
             room = manager.get_room(room_id)
+            transport = "binary" if payload.get("transport") == "binary" else "json"
 
             if not room:
+                owner = await manager.get_remote_room_owner(room_id)
+                if owner:
+                    await manager.forward_player(websocket, owner, room_id, player_name, transport)
+                    return
                 await websocket.send_json({"type": "error", "message": "room_not_found"})
                 await websocket.close()
-                print(f"Player '{player_name}' failed to join non-existent room '{room_id}'.")
-                return
-
-            if len(room.players) >= GAME_CONFIG["MAX_PLAYERS"]:
-                await websocket.send_json({"type": "error", "message": "room_full"})
-                await websocket.close()
+                logger.info("Player '%s' failed to join a non-existent room.", player_name, extra={"room_id": room_id})
                 return
 
-            if player_name in room.players:
-                await websocket.send_json({"type": "error", "message": "name_taken"})
+            join_error = manager.get_join_error(room, player_name)
+            if join_error:
+                await websocket.send_json({"type": "error", "message": join_error})
                 await websocket.close()
                 return
 
             manager.active_connections[websocket] = (room_id, player_name)
-            await room.connect(websocket, player_name)
+            connection = PlayerConnection(websocket, transport)
+            connection.start()
+            await room.connect(connection, player_name)
 
             while True:
                 data = await websocket.receive_json()
@@ -364,14 +2256,16 @@ async def websocket_endpoint(websocket: WebSocket):
             return
 
     except WebSocketDisconnect:
-        print(f"WebSocket disconnected for player '{player_name}' in room '{room_id}'.")
+        logger.info("WebSocket disconnected for player '%s'.", player_name, extra={"room_id": room_id})
     except Exception as e:
-        print(f"An unexpected error occurred for {player_name} in {room_id}: {e}")
+        logger.exception("An unexpected error occurred for %s: %s", player_name, e, extra={"room_id": room_id})
     finally:
+        if connection:
+            await connection.aclose()
         if websocket in manager.active_connections:
             room_id, player_name = manager.active_connections.pop(websocket)
             if room_id and player_name:
                 room = manager.get_room(room_id)
                 if room:
                     await room.disconnect(player_name)
-                    manager.remove_room_if_empty(room_id)
\ No newline at end of file
+                    await manager.remove_room_if_empty(room_id)
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+Logging, metrics and the binary frame format shared by ai_server.py and game_server/game_server.py.
+The game server imports it as backend.observability; the AI server, which runs with backend/ as
+its app dir, as observability.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import struct
+import sys
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# --- Logging ---
+# Log records go through a bounded queue to a background thread that does the actual I/O, so the
+# event loop never blocks on stdout. When the queue is full, records are dropped and counted.
+# Records logged with extra={"sample": key} are rate limited per key. Use this for
+# per-message events that would otherwise flood the logs under load.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "text" or "json"
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLES_PER_S = float(os.environ.get("LOG_SAMPLES_PER_S", "5"))
+LOG_CONTEXT_FIELDS = ("room_id", "player", "request_id", "suppressed")
+
+
+class SamplingFilter(logging.Filter):
+    """Lets at most `rate` records per second through for each sample key; the rest are counted."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        # sample key -> [window start, records let through, records suppressed]
+        self.windows: Dict[str, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= 1.0:
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            window = self.windows[key] = [now, 0, 0]
+        if window[1] >= self.rate:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ContextFormatter(logging.Formatter):
+    """Text or JSON lines, including the context fields (room, player, ...) a record carries."""
+
+    def __init__(self, json_lines: bool):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = {
+            field: getattr(record, field) for field in LOG_CONTEXT_FIELDS if getattr(record, field, None) is not None
+        }
+        if self.json_lines:
+            return json.dumps({
+                "ts": record.created, "level": record.levelname, "logger": record.name,
+                "message": record.getMessage(), **context,
+            })
+        line = super().format(record)
+        if context:
+            line += " " + " ".join(f"{field}={value}" for field, value in context.items())
+        return line
+
+
+class ContextAdapter(logging.LoggerAdapter):
+    """Adds fixed context (e.g. a room id) to every record, keeping any extra passed per call."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+def setup_logging(name: str) -> Tuple[logging.Logger, NonBlockingQueueHandler]:
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLES_PER_S))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(ContextFormatter(LOG_FORMAT == "json"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    return logger, queue_handler
+
+
+# --- Metrics ---
+# Served at /metrics in the Prometheus text format. Observing a histogram value is a bisect and
+# two additions, so they can sit on the per-frame and per-message paths; gauges and counters are
+# read from the servers' own state when metrics are scraped.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # label values -> [per-bucket counts (the last one is +Inf), sum of observations]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in list(self.series.items()):
+            label_text = "".join(f'{name}="{value}",' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text}le="{le}"}} {cumulative}')
+            label_block = f"{{{label_text.rstrip(',')}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{label_block} {total}")
+            lines.append(f"{self.name}_count{label_block} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    A gauge whose value is read from `read` when metrics are scraped. With a `labelname`,
+    `read` returns {label value: value} and every entry becomes its own series.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Any], labelname: Optional[str] = None):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labelname = labelname
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        if self.labelname is None:
+            return lines + [f"{self.name} {self.read()}"]
+        return lines + [f'{self.name}{{{self.labelname}="{label}"}} {value}' for label, value in self.read().items()]
+
+
+class Counter(Gauge):
+    """
+    A running total that only ever grows, read like a Gauge when metrics are scraped. Its name
+    ends in `_total`, so rate() and increase() work on it across scrapes and restarts.
+    """
+
+    type = "counter"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Any], labelname: Optional[str] = None) -> Gauge:
+        gauge = Gauge(name, documentation, read, labelname)
+        self.metrics.append(gauge)
+        return gauge
+
+    def counter(self, name: str, documentation: str, read: Callable[[], Any], labelname: Optional[str] = None) -> Counter:
+        counter = Counter(name, documentation, read, labelname)
+        self.metrics.append(counter)
+        return counter
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+# --- Binary Frames ---
+# Frames the AI server sends as binary messages: version, flags, codec, step, total_steps,
+# elapsed_ms, step_ms and id length, followed by the request id and the image bytes.
+AI_FRAME_HEADER = struct.Struct("!BBBHHIIB")
+FRAME_VERSION = 1
+FRAME_FLAG_FINAL = 0x01
+# Set on frames generated below the requested quality to meet a deadline; not to be cached.
+FRAME_FLAG_REDUCED = 0x02
+CODEC_JPEG = 1
+CODEC_WEBP = 2
+CODEC_MIME_TYPES = {CODEC_JPEG: "image/jpeg", CODEC_WEBP: "image/webp"}
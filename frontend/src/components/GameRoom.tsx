@@ -8,25 +8,29 @@ const PLACEHOLDER_IMAGE = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAA
 
 export default function GameRoom() {
   const { gameState, sendMessage, disconnect } = useGame();
-  const { players, playerName, currentRound, totalRounds, timeLeft, currentImageB64, correctPrompt, similarity, gameState: roomState } = gameState;
+  const { players, playerName, currentRound, totalRounds, roundEndsAt, currentImageB64, correctPrompt, similarity, guessesBlockedUntil, gameState: roomState } = gameState;
 
   const [guess, setGuess] = useState("");
-  const [timer, setTimer] = useState(timeLeft);
+  const secondsLeft = () => Math.max(0, Math.ceil((roundEndsAt - Date.now()) / 1000));
+  const [timer, setTimer] = useState(secondsLeft);
 
   useEffect(() => {
-    setTimer(timeLeft);
-    if (timeLeft <= 0) return;
+    setTimer(secondsLeft());
+    if (roundEndsAt <= Date.now()) return;
 
     const interval = setInterval(() => {
-      setTimer(prev => (prev > 0 ? prev - 1 : 0));
-    }, 1000);
+      setTimer(secondsLeft());
+    }, 250);
 
     return () => clearInterval(interval);
-  }, [timeLeft, currentRound]);
+  }, [roundEndsAt, currentRound]);
+
+  // The round timer re-renders this often enough to lift the block on time.
+  const guessesBlocked = guessesBlockedUntil > Date.now();
 
   const handleGuessSubmit = (e: React.FormEvent) => {
     e.preventDefault();
-    if (!guess.trim()) return;
+    if (!guess.trim() || guessesBlocked) return;
     sendMessage("new_guess", { guess });
     setGuess("");
   };
@@ -49,7 +53,7 @@ export default function GameRoom() {
       <Flex flex={1} w="100%" maxW="1100px" mx="auto" gap={8}>
         {/* IMAGE LEFT */}
         <Box flex="1.2" bg="black" borderRadius="md" display="flex" alignItems="center" justifyContent="center" minH="420px" maxH="520px" my={4}>
-          <Image src={currentImageB64 || PLACEHOLDER_IMAGE} alt="AI-generated image" objectFit="contain" maxH="95%" maxW="95%" borderRadius="md" />
+          <Image src={currentImageB64 || PLACEHOLDER_IMAGE} alt="AI-generated image" objectFit="contain" w="95%" maxH="480px" borderRadius="md" />
         </Box>
 
         {/* RIGHT SIDE: SCOREBOARD + GUESS */}
@@ -95,10 +99,16 @@ export default function GameRoom() {
               <HStack>
                 <Text color="orange.200" fontWeight="bold">Guess:</Text>
                 <Input placeholder="Type your guess..." value={guess} onChange={(e) => setGuess(e.target.value)} size="md" bg="white" color="black" _placeholder={{ color: 'gray.500' }} />
-                <Button type="submit" colorScheme="orange" disabled={!guess.trim()}>Guess</Button>
+                <Button type="submit" colorScheme="orange" disabled={!guess.trim() || guessesBlocked}>Guess</Button>
               </HStack>
             </form>
 
+            {guessesBlocked && (
+              <Text mt={2} color="red.300" fontSize="sm" textAlign="center">
+                Too many guesses, slow down a little.
+              </Text>
+            )}
+
             {similarity !== 0 && (
               <Box mt={3} p={2} bg="gray.800" borderRadius="md" textAlign="center">
                 <Text color="yellow.300" fontWeight="bold">
@@ -1,25 +1,46 @@
 import { createContext, useContext, useState, useRef, ReactNode, useCallback, useEffect } from 'react';
-import { GameState, GameContextType } from '@/types';
+import { GameState, GameContextType, Player } from '@/types';
 import { useNavigate } from 'react-router-dom';
 
 const GAME_SERVER_URL = import.meta.env.VITE_GAME_SERVER_URL; // Your game server URL
 
+// Binary image frames: version, message type, codec, flags, step (u16), total steps (u16), then image bytes.
+const CLIENT_FRAME_HEADER_SIZE = 8;
+const MESSAGE_IMAGE_UPDATE = 1;
+const CODEC_MIME_TYPES: Record<number, string> = { 1: 'image/jpeg', 2: 'image/webp' };
+
+// The server's timeLeft is authoritative; counting down to a fixed end time keeps the timer from drifting.
+const roundEndsAt = (timeLeft: number) => Date.now() + timeLeft * 1000;
+
+// player_update deltas carry only the changed fields of each player, plus the players who left.
+const applyPlayerDelta = (players: Player[], changed: Partial<Player>[], removed: string[] = []): Player[] => {
+    const byName = new Map(players.filter(p => !removed.includes(p.name)).map(p => [p.name, p]));
+    for (const change of changed) {
+        const current = byName.get(change.name!) ?? { name: change.name!, score: 0, isHost: false, bestSimilarity: 0 };
+        byName.set(change.name!, { ...current, ...change });
+    }
+    return [...byName.values()];
+};
+
 // Initial state for the game
 const initialState: GameState = {
   playerName: '',
   roomId: null,
   players: [],
+  playersVersion: 0,
   chatMessages: [],
   gameState: 'LOBBY',
   currentRound: 0,
   totalRounds: 10,
   timeLeft: 0,
+  roundEndsAt: 0,
   promptHint: '',
   currentImageB64: null,
   roundWinner: null,
   correctPrompt: null,
   roundEndReason: null,
   similarity: 0,
+  guessesBlockedUntil: 0,
 };
 
 // Create the context with a default value
@@ -29,28 +50,59 @@ const GameContext = createContext<GameContextType | undefined>(undefined);
 export const GameProvider = ({ children }: { children: ReactNode }) => {
     const [gameState, setGameState] = useState<GameState>(initialState);
     const webSocketRef = useRef<WebSocket | null>(null);
+    const imageUrlRef = useRef<string | null>(null);
+    const playersVersionRef = useRef(0);
     const navigate = useNavigate();
 
+    // Image frames arrive as raw bytes, so they skip base64 and JSON entirely.
+    const handleBinaryFrame = useCallback((buffer: ArrayBuffer) => {
+        const view = new DataView(buffer);
+        if (view.getUint8(1) !== MESSAGE_IMAGE_UPDATE) return;
+
+        const mimeType = CODEC_MIME_TYPES[view.getUint8(2)] ?? 'image/jpeg';
+        const url = URL.createObjectURL(new Blob([new Uint8Array(buffer, CLIENT_FRAME_HEADER_SIZE)], { type: mimeType }));
+        if (imageUrlRef.current) URL.revokeObjectURL(imageUrlRef.current);
+        imageUrlRef.current = url;
+        setGameState(prev => ({ ...prev, currentImageB64: url }));
+    }, []);
+
     // Central message handler
     const handleServerMessage = useCallback((event: MessageEvent) => {
+        if (event.data instanceof ArrayBuffer) {
+            handleBinaryFrame(event.data);
+            return;
+        }
+
         const data = JSON.parse(event.data);
         console.log("Received message:", data);
 
         switch (data.type) {
             case 'join_success':
             case 'game_state_update':
+                if (data.payload.playersVersion !== undefined) playersVersionRef.current = data.payload.playersVersion;
                 // CRITICAL FIX: Merge the server's state with the existing state.
                 // This preserves the client's `playerName` while updating everything else.
-                setGameState(prev => ({ ...prev, ...data.payload }));
+                setGameState(prev => ({ ...prev, ...data.payload, roundEndsAt: roundEndsAt(data.payload.timeLeft ?? 0) }));
                 
                 if (data.type === 'join_success' && data.payload.roomId) {
                     navigate(`/lobby/${data.payload.roomId}`);
                 }
                 break;
             
-            case 'player_update':
-                setGameState(prev => ({ ...prev, players: data.payload.players }));
+            case 'player_update': {
+                const { version, full, players, removed } = data.payload;
+                if (full) {
+                    playersVersionRef.current = version;
+                    setGameState(prev => ({ ...prev, players, playersVersion: version }));
+                } else if (version === playersVersionRef.current + 1) {
+                    playersVersionRef.current = version;
+                    setGameState(prev => ({ ...prev, players: applyPlayerDelta(prev.players, players, removed), playersVersion: version }));
+                } else if (version > playersVersionRef.current) {
+                    // We missed an update: ask for the full list instead of applying this one.
+                    webSocketRef.current?.send(JSON.stringify({ type: 'resync_players' }));
+                }
                 break;
+            }
             
             case 'game_starting':
                 setGameState(prev => ({ ...prev, gameState: 'IN_GAME', chatMessages: [], ...data.payload }));
@@ -63,6 +115,7 @@ export const GameProvider = ({ children }: { children: ReactNode }) => {
                     currentRound: data.payload.round,
                     totalRounds: data.payload.totalRounds,
                     timeLeft: data.payload.timeLeft,
+                    roundEndsAt: roundEndsAt(data.payload.timeLeft),
                     currentImageB64: data.payload.imageBase64,
                     promptHint: data.payload.promptHint,
                     roundWinner: null,
@@ -71,6 +124,14 @@ export const GameProvider = ({ children }: { children: ReactNode }) => {
                 }));
                 break;
 
+            case 'time_left':
+                setGameState(prev => ({
+                    ...prev,
+                    timeLeft: data.payload.timeLeft,
+                    roundEndsAt: roundEndsAt(data.payload.timeLeft),
+                }));
+                break;
+
             case 'image_update':
                  setGameState(prev => ({
                     ...prev,
@@ -93,6 +154,13 @@ export const GameProvider = ({ children }: { children: ReactNode }) => {
                 }));
                 break;
 
+            case 'guess_rate_limited':
+                setGameState(prev => ({
+                    ...prev,
+                    guessesBlockedUntil: Date.now() + data.payload.retryAfter * 1000,
+                }));
+                break;
+
             case 'error':
                 console.error("Server error:", data.message);
                 alert(`Error from server: ${data.message}`);
@@ -102,7 +170,7 @@ export const GameProvider = ({ children }: { children: ReactNode }) => {
             default:
                 console.warn("Unhandled message type:", data.type);
         }
-    }, [navigate]);
+    }, [navigate, handleBinaryFrame]);
 
     const sendMessage = useCallback((type: string, payload?: object) => {
         if (webSocketRef.current?.readyState === WebSocket.OPEN) {
@@ -131,11 +199,12 @@ export const GameProvider = ({ children }: { children: ReactNode }) => {
         setGameState({ ...initialState, playerName });
 
         const ws = new WebSocket(GAME_SERVER_URL);
+        ws.binaryType = 'arraybuffer';
         webSocketRef.current = ws;
 
         ws.onopen = () => {
             console.log('WebSocket connection established. Sending join_room message.');
-            sendMessage('join_room', { room_id: roomId, player_name: playerName });
+            sendMessage('join_room', { room_id: roomId, player_name: playerName, transport: 'binary' });
         };
 
         ws.onmessage = handleServerMessage;
@@ -15,17 +15,23 @@ export interface Player {
     playerName: string;
     roomId: string | null;
     players: Player[];
+    // The version of the last player_update applied to `players`.
+    playersVersion: number;
     chatMessages: ChatMessage[];
     gameState: 'LOBBY' | 'IN_GAME' | 'POST_ROUND';
     currentRound: number;
     totalRounds: number;
     timeLeft: number;
+    // When the current round ends on this client's clock (ms since epoch), from the server's timeLeft.
+    roundEndsAt: number;
     promptHint: string;
     currentImageB64: string | null;
     roundWinner: string | null;
     correctPrompt: string | null;
     roundEndReason: string | null;
     similarity: number;
+    // Guesses are rate limited by the server; this is when the next one is accepted (ms since epoch).
+    guessesBlockedUntil: number;
   }
   
   // This defines the structure of the context we will provide
@@ -0,0 +1,214 @@
+# ai_failover_check.py
+# End-to-end check of the game server's AI backend pool (AI_BACKENDS). It starts three fake AI
+# servers and one game server that uses all of them, then verifies four things:
+#   - concurrent rounds are spread over the backends;
+#   - a round whose backend dies mid-generation still gets its final frame from another one;
+#   - guesses keep being scored while a backend is down;
+#   - the dead backend is marked down by the health checks, and back up once it restarts.
+# It also checks in-process that a generation resumed on a backend that picked a different step
+# count only forwards frames further along than the ones the rooms already have.
+# Run from the repository root:
+#   python testing/ai_failover_check.py
+
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+
+from backend.game_server.game_server import SCORING_CONFIG, AIBackend, AIBackendPool
+AI_PORTS = [8301, 8302, 8303]
+GAME_PORT = 8300
+STEPS = 8
+STEP_MS = 300
+
+
+def start_ai_server(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "testing/fake_ai_server.py", "--port", str(port), "--frame-bytes", "2000",
+         "--step-ms", str(STEP_MS), "--score-ms", "5"],
+        cwd=REPO_ROOT,
+    )
+
+
+def start_game_server() -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AI_BACKENDS": ",".join(f"http://127.0.0.1:{port}" for port in AI_PORTS),
+        "AI_HEALTH_INTERVAL_S": "0.3",
+        "GENERATION_STEPS": str(STEPS),
+        "FRAME_RENDITIONS": "",
+        "SCORING_RETRY_BACKOFF_S": "0.01",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.game_server.game_server:app", "--port", str(GAME_PORT),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+
+
+async def wait_for_http(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def backend_metric(name: str) -> Dict[int, float]:
+    """A per-backend gauge from the game server's /metrics, by AI server port."""
+    async with httpx.AsyncClient() as client:
+        text = (await client.get(f"http://127.0.0.1:{GAME_PORT}/metrics")).text
+    pattern = re.compile(rf'^{name}{{backend="http://127\.0\.0\.1:(\d+)"}} (\S+)$', re.MULTILINE)
+    return {int(port): float(value) for port, value in pattern.findall(text)}
+
+
+async def metric(name: str) -> float:
+    async with httpx.AsyncClient() as client:
+        text = (await client.get(f"http://127.0.0.1:{GAME_PORT}/metrics")).text
+    return float(re.search(rf"^{name} (\S+)$", text, re.MULTILINE).group(1))
+
+
+async def all_backends_up() -> bool:
+    up = await backend_metric("game_ai_backend_generation_up")
+    return len(up) == len(AI_PORTS) and all(up.values())
+
+
+async def backend_is(port: int, up: int) -> bool:
+    return (await backend_metric("game_ai_backend_generation_up")).get(port) == up
+
+
+async def wait_until(condition, timeout: float = 5.0, message: str = "condition"):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await condition():
+            return
+        await asyncio.sleep(0.1)
+    raise AssertionError(f"timed out waiting for {message}")
+
+
+async def start_room(player_name: str):
+    async with httpx.AsyncClient() as client:
+        room_id = (await client.post(f"http://127.0.0.1:{GAME_PORT}/api/rooms")).json()["room_id"]
+    websocket = await websockets.connect(f"ws://127.0.0.1:{GAME_PORT}/ws/game", max_size=None)
+    await websocket.send(json.dumps({"type": "join_room", "payload": {"room_id": room_id, "player_name": player_name}}))
+    await next_message(websocket, "join_success")
+    await websocket.send(json.dumps({"type": "start_game", "payload": {}}))
+    return websocket
+
+
+async def next_message(websocket, message_type: str, predicate=lambda message: True, timeout: float = 10) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(websocket.recv(), timeout=timeout))
+        if message["type"] == message_type and predicate(message):
+            return message
+
+
+async def run_checks(ai_servers: Dict[int, subprocess.Popen]):
+    await wait_until(all_backends_up, message="every backend to pass its health checks")
+    print("ok: all three backends pass their health checks")
+
+    players = [await start_room(f"player{i}") for i in range(3)]
+    for player in players:
+        await next_message(player, "image_update")
+    in_flight = await backend_metric("game_ai_backend_generations")
+    # Rooms that drew the same prompt share one generation, so only the spread is checked.
+    assert max(in_flight.values()) - min(in_flight.values()) <= 1 and sum(in_flight.values()) >= 2, in_flight
+    print(f"ok: concurrent rounds are spread over the backends {in_flight}")
+
+    victim = max(in_flight, key=in_flight.get)
+    ai_servers[victim].kill()
+    ai_servers[victim].wait()
+    finals = await asyncio.gather(*(
+        next_message(player, "image_update", lambda m: m["payload"]["step"] == m["payload"]["totalSteps"])
+        for player in players
+    ))
+    failovers = await metric("game_generation_failovers_total")
+    assert len(finals) == 3 and failovers >= 1, failovers
+    print(f"ok: every round got its final frame after backend {victim} died mid-generation ({failovers:g} failovers)")
+
+    await wait_until(lambda: backend_is(victim, 0), message="the dead backend to be marked down")
+    print("ok: the dead backend is marked down")
+
+    for i, player in enumerate(players):
+        await player.send(json.dumps({"type": "new_guess", "payload": {"guess": f"{40 + i}"}}))
+        feedback = await next_message(player, "guess_feedback")
+        assert feedback["payload"]["similarity"] == 40 + i, feedback
+    print("ok: guesses are scored while a backend is down")
+
+    ai_servers[victim] = start_ai_server(victim)
+    await wait_until(lambda: backend_is(victim, 1), timeout=10, message="the restarted backend to be marked up")
+    print("ok: the restarted backend is marked up again")
+
+    for player in players:
+        await player.close()
+
+
+class ScriptedGenerationClient:
+    """Yields every `preview_every`-th of `total_steps` frames, failing after `fail_after_step`."""
+
+    def __init__(self, total_steps: int, preview_every: int = 1, fail_after_step: Optional[int] = None):
+        self.total_steps = total_steps
+        self.preview_every = preview_every
+        self.fail_after_step = fail_after_step
+
+    async def generate(self, prompt: str, seed: int, steps: int, client: Optional[str] = None):
+        for step in range(self.preview_every, self.total_steps + 1, self.preview_every):
+            if self.fail_after_step is not None and step > self.fail_after_step:
+                raise ConnectionError("backend died")
+            yield {"step": step, "total_steps": self.total_steps, "final": step == self.total_steps}
+
+    def in_flight(self) -> int:
+        return 0
+
+    async def close(self):
+        pass
+
+
+async def resumed_frames(first: ScriptedGenerationClient, second: ScriptedGenerationClient) -> List[str]:
+    backends = []
+    for name, generation_client in (("first", first), ("second", second)):
+        backend = AIBackend.from_base_url(f"http://{name}", SCORING_CONFIG)
+        backend.generation_client = generation_client
+        backends.append(backend)
+    pool = AIBackendPool(backends, {})
+    return [f"{frame['step']}/{frame['total_steps']}" async for frame in pool.generate("a prompt", 1, 8)]
+
+
+async def check_resume_with_different_steps():
+    frames = await resumed_frames(ScriptedGenerationClient(8, fail_after_step=4), ScriptedGenerationClient(6, 2))
+    assert frames == ["1/8", "2/8", "3/8", "4/8", "4/6", "6/6"], frames
+    frames = await resumed_frames(ScriptedGenerationClient(4, fail_after_step=2), ScriptedGenerationClient(8))
+    assert frames == ["1/4", "2/4", "5/8", "6/8", "7/8", "8/8"], frames
+    print("ok: a generation resumed with a different step count never goes backwards or skips ahead")
+
+
+async def main():
+    await check_resume_with_different_steps()
+    ai_servers = {port: start_ai_server(port) for port in AI_PORTS}
+    game_server = start_game_server()
+    try:
+        await asyncio.gather(*(wait_for_http(f"http://127.0.0.1:{port}/health/ready") for port in AI_PORTS))
+        await wait_for_http(f"http://127.0.0.1:{GAME_PORT}/metrics")
+        await run_checks(ai_servers)
+        print("All AI failover checks passed.")
+    finally:
+        for process in [game_server, *ai_servers.values()]:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+# broadcast_benchmark.py
+# Micro-benchmark for GameRoom broadcasts: measures the CPU cost of one broadcast against room size,
+# comparing the old per-player send_json path with the serialize-once path.
+# Run from the repository root:
+#   python testing/broadcast_benchmark.py
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import GameRoom, PlayerConnection, encode_message, orjson
+
+ROOM_SIZES = [1, 4, 8, 12, 32]
+ITERATIONS = 200
+
+
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket; send_json serializes exactly like Starlette does."""
+
+    async def send_text(self, text: str):
+        pass
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+async def broadcast_per_player(room: GameRoom, message: dict):
+    """The previous broadcast: every player's send_json serializes the message again."""
+    await asyncio.gather(
+        *[player.websocket.send_json(message) for player in room.players.values()], return_exceptions=True
+    )
+
+
+async def broadcast_serialize_once(room: GameRoom, message: dict):
+    """The current broadcast, including the writer tasks draining every player's queue."""
+    await room.broadcast(message)
+    while any(player.queue for player in room.players.values()):
+        await asyncio.sleep(0)
+
+
+def make_messages() -> dict:
+    image_b64 = base64.b64encode(os.urandom(300 * 1024)).decode('utf-8')
+    players = [
+        {"name": f"player{i}", "score": i * 100, "isHost": i == 0, "bestSimilarity": 42.0}
+        for i in range(12)
+    ]
+    return {
+        "player_update": {"type": "player_update", "payload": {"players": players}},
+        "image_update (300 KB)": {
+            "type": "image_update",
+            "payload": {"imageBase64": f"data:image/jpeg;base64,{image_b64}", "step": 1, "totalSteps": 4},
+        },
+    }
+
+
+async def measure(broadcast, room: GameRoom, message: dict) -> float:
+    """Returns CPU milliseconds per broadcast."""
+    start = time.process_time()
+    for _ in range(ITERATIONS):
+        await broadcast(room, message)
+    return (time.process_time() - start) * 1000 / ITERATIONS
+
+
+async def main():
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json'} ({len(encode_message({}))} byte empty message)")
+    for name, message in make_messages().items():
+        print(f"\n{name}")
+        print(f"{'players':>8} {'per-player ms':>14} {'serialize-once ms':>18} {'speedup':>8}")
+        for size in ROOM_SIZES:
+            room = GameRoom("bench", manager=None)
+            room.players = {f"player{i}": PlayerConnection(FakeWebSocket()) for i in range(size)}
+            for player in room.players.values():
+                player.start()
+            old = await measure(broadcast_per_player, room, message)
+            new = await measure(broadcast_serialize_once, room, message)
+            for player in room.players.values():
+                await player.aclose()
+            print(f"{size:>8} {old:>14.3f} {new:>18.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+# circuit_breaker_check.py
+# Checks the game server's scoring CircuitBreaker and ScoringClient: the breaker opens after
+# consecutive failures, lets a single trial through once its reset timeout has passed, and
+# closes or re-opens on the trial's result; the client retries a failing scorer, returns -1
+# and stops calling it once its breaker is open, and a cancelled request only releases the
+# half-open trial it acquired itself.
+# Runs in-process against httpx.MockTransport; no AI server is needed.
+# Run from the repository root:
+#   python testing/circuit_breaker_check.py
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import SCORING_CONFIG, AIBackend, AIBackendPool, CircuitBreaker, ScoringClient
+
+CONFIG = dict(SCORING_CONFIG, RETRIES=2, RETRY_BACKOFF_S=0, BREAKER_FAILURE_THRESHOLD=3, BREAKER_RESET_S=0.05)
+
+
+def check_breaker_states():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow_request() and not breaker.allow_request(), "more than one half-open trial"
+    breaker.record_failure()
+    assert breaker.state == "open", "a failed trial did not re-open the breaker"
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow_request() and breaker.consecutive_failures == 0
+    print("ok: the breaker opens after consecutive failures and closes again after one good trial")
+
+
+def create_client(handler) -> ScoringClient:
+    backends = [AIBackend.from_base_url(f"http://{name}", CONFIG) for name in ("a", "b")]
+    client = ScoringClient(AIBackendPool(backends, {}), CONFIG)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+async def check_retries_and_fail_fast():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        if request.url.host == "a":
+            return httpx.Response(503)
+        return httpx.Response(200, json={"score": 42.0})
+
+    client = create_client(handler)
+    a, b = client.backends.backends
+    b.scoring_latency_s = 1.0  # a looks faster, so it is tried first
+    assert await client.score("a cat", "a dog") == 42.0 and calls == ["a", "b"], calls
+    assert client.backends.scoring_failovers == 1 and a.breaker.consecutive_failures == 1
+
+    b.breaker.opened_at = time.monotonic()
+    calls.clear()
+    assert await client.score("a cat", "a bird") == -1 and calls == ["a", "a"], calls
+    assert a.breaker.state == "open", a.breaker.state
+    calls.clear()
+    assert await client.score("a cat", "a fish") == -1 and not calls, "called a scorer behind an open breaker"
+    await client.close()
+    print("ok: failed scores are retried on another backend, and open breakers fail fast with -1")
+
+
+async def check_cancelled_trial_is_released():
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await release.wait()
+        return httpx.Response(200, json={"score": 1.0})
+
+    client = create_client(handler)
+    a, b = client.backends.backends
+    for backend in (a, b):
+        backend.breaker.opened_at = time.monotonic() - CONFIG["BREAKER_RESET_S"]
+    first = asyncio.create_task(client.request_remote_score("a cat", "a dog"))
+    second = asyncio.create_task(client.request_remote_score("a cat", "a bird"))
+    await asyncio.sleep(0.01)
+    assert a.breaker.trial_in_flight and b.breaker.trial_in_flight
+
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    assert [a.breaker.trial_in_flight, b.breaker.trial_in_flight].count(True) == 1, "released another request's trial"
+    release.set()
+    assert await second == 1.0
+    await client.close()
+    print("ok: a cancelled score only releases the half-open trial it acquired")
+
+
+async def main():
+    check_breaker_states()
+    await check_retries_and_fail_fast()
+    await check_cancelled_trial_is_released()
+    print("All circuit breaker checks passed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+# embedding_cache_check.py
+# Checks the AI server's scoring embeddings against a tiny stand-in sentence model: the guess
+# EmbeddingCache counts hits and misses and evicts the least recently used entry, and the
+# EmbeddingBatcher encodes concurrent lookups in one call, shares one slot between guesses that
+# only differ in case or whitespace, answers catalog prompts and cached guesses without encoding,
+# and hands an encode failure to every waiter without leaving anything pending.
+# The real models only load when the server starts, so importing ai_server here never touches them.
+# Run from the repository root:
+#   python testing/embedding_cache_check.py
+
+import asyncio
+import os
+import sys
+import zlib
+from typing import List
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import ai_server
+from ai_server import EmbeddingBatcher, EmbeddingCache, normalize_text, score_pairs
+
+
+class TinySentenceModel:
+    """Embeds a sentence as a unit vector seeded by its text, and records every encode call."""
+
+    def __init__(self):
+        self.calls: List[List[str]] = []
+        self.fail = False
+
+    def encode(self, sentences, convert_to_tensor=True, normalize_embeddings=True):
+        self.calls.append(list(sentences))
+        if self.fail:
+            raise RuntimeError("encode failed")
+        vectors = []
+        for sentence in sentences:
+            generator = torch.Generator().manual_seed(zlib.crc32(sentence.encode()))
+            vectors.append(torch.nn.functional.normalize(torch.randn(8, generator=generator), dim=0))
+        return torch.stack(vectors)
+
+
+def check_cache_lru():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("one", torch.ones(1))
+    cache.put("two", torch.ones(1) * 2)
+    assert cache.get("one") is not None and cache.get("three") is None
+    cache.put("three", torch.ones(1) * 3)
+    assert list(cache.entries) == ["one", "three"], list(cache.entries)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 2) and stats["hit_rate"] == 0.5, stats
+
+    disabled = EmbeddingCache(max_size=0)
+    disabled.put("one", torch.ones(1))
+    assert disabled.get("one") is None and not disabled.entries
+    print("ok: the guess cache counts hits and misses and evicts the least recently used embedding")
+
+
+async def check_concurrent_lookups_share_one_encode(model: TinySentenceModel):
+    ai_server.embedding_batcher = EmbeddingBatcher(window_s=0.05, max_batch=64)
+    guesses = ["a red fox", "A  Red Fox", "a blue bird", "a red fox "]
+    scores = await asyncio.gather(*(score_pairs([("a sleeping cat", guess)]) for guess in guesses))
+    assert len(model.calls) == 1, model.calls
+    assert sorted(model.calls[0]) == ["a blue bird", "a red fox", "a sleeping cat"], model.calls
+    assert scores[0] == scores[1] == scores[3] != scores[2], scores
+
+    prompt, guess = (ai_server.guess_embedding_cache.get(key) for key in ("a sleeping cat", "a red fox"))
+    assert abs(scores[0][0] - max(0, torch.dot(prompt, guess).item()) * 100) < 1e-4, scores
+    assert not ai_server.embedding_batcher.pending
+    print("ok: concurrent lookups are encoded in one call, with one slot per normalized sentence")
+
+
+async def check_known_sentences_skip_encoding(model: TinySentenceModel):
+    ai_server.prompt_embeddings[normalize_text("A Catalog Prompt")] = model.encode(["a catalog prompt"])[0]
+    calls = len(model.calls)
+    await score_pairs([("a catalog prompt", "a red fox")])
+    assert all("a catalog prompt" not in call for call in model.calls[calls:]), model.calls[calls:]
+
+    calls, hits = len(model.calls), ai_server.guess_embedding_cache.hits
+    await score_pairs([("A catalog prompt", "A RED FOX"), ("a catalog prompt", "")])
+    assert len(model.calls) == calls, model.calls[calls:]
+    assert ai_server.guess_embedding_cache.hits == hits + 1
+    print("ok: catalog prompts and cached guesses are answered without encoding")
+
+
+async def check_encode_failure_reaches_every_waiter(model: TinySentenceModel):
+    model.fail = True
+    results = await asyncio.gather(
+        *(score_pairs([("a catalog prompt", guess)]) for guess in ("a green frog", "a green frog", "a grey owl")),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results), results
+    assert not ai_server.embedding_batcher.pending and ai_server.guess_embedding_cache.get("a green frog") is None
+
+    model.fail = False
+    assert (await score_pairs([("a catalog prompt", "a green frog")]))[0] >= 0
+    print("ok: an encode failure reaches every waiter, and the next lookup encodes again")
+
+
+async def main():
+    check_cache_lru()
+    model = TinySentenceModel()
+    ai_server.scoring_model.value = model
+    ai_server.scoring_model.state = "ready"
+    ai_server.guess_embedding_cache = EmbeddingCache(max_size=100)
+    await check_concurrent_lookups_share_one_encode(model)
+    await check_known_sentences_skip_encoding(model)
+    await check_encode_failure_reaches_every_waiter(model)
+    print("All embedding cache checks passed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
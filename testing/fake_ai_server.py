@@ -0,0 +1,120 @@
+# fake_ai_server.py
+# A stand-in for ai_server.py that needs no models: it speaks the multiplexed /ws/generate protocol
+# and the scoring endpoints, with configurable frame sizes, step cadence and scoring latency.
+# Every frame's image starts with the time it was generated (a big-endian double from time.time()),
+# so clients can measure frame delivery lag end to end. A guess that contains a number scores as that
+# number, so load tests can control when scores improve.
+#   python testing/fake_ai_server.py --port 8201 --frame-bytes 60000 --step-ms 150 --score-ms 20
+#   AI_BACKENDS=http://127.0.0.1:8201 \
+#       uvicorn backend.game_server.game_server:app
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import struct
+import sys
+import time
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.observability import AI_FRAME_HEADER, CODEC_JPEG, FRAME_FLAG_FINAL, FRAME_VERSION
+
+TIMESTAMP = struct.Struct("!d")
+
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+class ScoringRequest(BaseModel):
+    prompt: str
+    guess: str
+
+
+class BatchScoringRequest(BaseModel):
+    pairs: List[ScoringRequest]
+
+
+def guess_score(guess: str) -> float:
+    match = NUMBER.search(guess)
+    return min(100.0, float(match.group())) if match else 0.0
+
+
+def create_app(frame_bytes: int, step_ms: float, score_ms: float) -> FastAPI:
+    app = FastAPI()
+    padding = os.urandom(max(0, frame_bytes - TIMESTAMP.size))
+
+    @app.get("/health/ready")
+    async def health_ready():
+        return {"ready": True}
+
+    @app.get("/health/ready/{model}")
+    async def health_model_ready(model: str):
+        return {"ready": True}
+
+    @app.post("/score/similarity")
+    async def score_similarity(request: ScoringRequest):
+        await asyncio.sleep(score_ms / 1000)
+        return {"score": guess_score(request.guess)}
+
+    @app.post("/score/similarity/batch")
+    async def score_similarity_batch(request: BatchScoringRequest):
+        await asyncio.sleep(score_ms / 1000)
+        return {"scores": [guess_score(pair.guess) for pair in request.pairs]}
+
+    async def stream_frames(websocket: WebSocket, send_lock: asyncio.Lock, request: dict):
+        request_id = str(request["id"])
+        steps = int(request.get("steps") or 4)
+        started = time.perf_counter()
+        for step in range(1, steps + 1):
+            await asyncio.sleep(step_ms / 1000)
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            header = AI_FRAME_HEADER.pack(
+                FRAME_VERSION, FRAME_FLAG_FINAL if step == steps else 0, CODEC_JPEG,
+                step, steps, elapsed_ms, int(step_ms), len(request_id.encode()),
+            )
+            async with send_lock:
+                await websocket.send_bytes(header + request_id.encode() + TIMESTAMP.pack(time.time()) + padding)
+        async with send_lock:
+            await websocket.send_text(json.dumps({
+                "type": "complete", "id": request_id, "elapsed_ms": (time.perf_counter() - started) * 1000,
+            }))
+
+    @app.websocket("/ws/generate")
+    async def generate(websocket: WebSocket):
+        await websocket.accept()
+        send_lock = asyncio.Lock()
+        tasks = {}
+        try:
+            while True:
+                request = json.loads(await websocket.receive_text())
+                if request.get("type") == "cancel":
+                    if request.get("id") in tasks:
+                        tasks[request["id"]].cancel()
+                    continue
+                task = asyncio.create_task(stream_frames(websocket, send_lock, request))
+                tasks[request["id"]] = task
+                task.add_done_callback(lambda _, request_id=request["id"]: tasks.pop(request_id, None))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in list(tasks.values()):
+                task.cancel()
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model-free stand-in for the AI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8201)
+    parser.add_argument("--frame-bytes", type=int, default=60_000, help="size of every generated image")
+    parser.add_argument("--step-ms", type=float, default=150, help="time between generated frames")
+    parser.add_argument("--score-ms", type=float, default=20, help="latency of every scoring request")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.frame_bytes, args.step_ms, args.score_ms), host=args.host, port=args.port, log_level="warning")
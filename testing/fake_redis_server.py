@@ -0,0 +1,205 @@
+# fake_redis_server.py
+# A tiny in-memory stand-in for Redis, speaking just enough RESP2 for the game server's
+# RedisRoomBackend: PING, SET (NX/XX/EX/PX), GET, DEL, EXPIRE, PUBLISH, SUBSCRIBE, UNSUBSCRIBE,
+# and WATCH/MULTI/EXEC transactions.
+# It lets the multi-worker setup be tested locally without installing Redis:
+#   python testing/fake_redis_server.py --port 6399
+#   ROOM_BACKEND_URL=redis://127.0.0.1:6399/0 uvicorn backend.game_server.game_server:app --workers 2
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        # Bumped on every change to a key, so EXEC can tell whether a WATCHed key was touched.
+        self.versions: Dict[str, int] = {}
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self.values[key]
+            self.touch(key)
+            return None
+        return value
+
+    def touch(self, key: str):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: Set[bytes] = set()
+        # "resp3": the client switched protocols with HELLO 3. "watched": key -> version when
+        # WATCHed. "queued": commands after MULTI, or None.
+        session: Dict[str, Any] = {"resp3": False, "watched": {}, "queued": None}
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                writer.write(self.execute_in_transaction(command, writer, subscriptions, session))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self.subscribers.get(channel, set()).discard(writer)
+            writer.close()
+
+    def execute_in_transaction(
+        self, command: List[bytes], writer: asyncio.StreamWriter, subscriptions: Set[bytes], session: Dict[str, Any]
+    ) -> bytes:
+        name = command[0].upper()
+        if name == b"WATCH":
+            for key in command[1:]:
+                self.get(key.decode())
+                session["watched"][key.decode()] = self.versions.get(key.decode(), 0)
+            return b"+OK\r\n"
+        if name == b"UNWATCH":
+            session["watched"] = {}
+            return b"+OK\r\n"
+        if name == b"MULTI":
+            session["queued"] = []
+            return b"+OK\r\n"
+        if name == b"DISCARD":
+            session["queued"] = None
+            session["watched"] = {}
+            return b"+OK\r\n"
+        if name == b"EXEC":
+            queued, watched = session["queued"] or [], session["watched"]
+            session["queued"] = None
+            session["watched"] = {}
+            for key in watched:
+                self.get(key)
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return null(session)
+            return b"*" + str(len(queued)).encode() + b"\r\n" + b"".join(
+                self.execute(queued_command, writer, subscriptions, session) for queued_command in queued
+            )
+        if session["queued"] is not None:
+            session["queued"].append(command)
+            return b"+QUEUED\r\n"
+        return self.execute(command, writer, subscriptions, session)
+
+    def execute(
+        self, command: List[bytes], writer: asyncio.StreamWriter, subscriptions: Set[bytes], session: Dict[str, Any]
+    ) -> bytes:
+        name = command[0].upper()
+        args = command[1:]
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"HELLO":
+            session["resp3"] = args[:1] == [b"3"]
+            return b"+OK\r\n"
+        if name in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"SET":
+            return self.set(args, session)
+        if name == b"GET":
+            value = self.get(args[0].decode())
+            return null(session) if value is None else encode_bulk(value)
+        if name == b"DEL":
+            removed = 0
+            for key in args:
+                if self.get(key.decode()) is not None:
+                    del self.values[key.decode()]
+                    self.touch(key.decode())
+                    removed += 1
+            return encode_int(removed)
+        if name == b"EXPIRE":
+            value = self.get(args[0].decode())
+            if value is None:
+                return encode_int(0)
+            self.values[args[0].decode()] = (value, time.monotonic() + int(args[1]))
+            self.touch(args[0].decode())
+            return encode_int(1)
+        if name == b"PUBLISH":
+            receivers = self.subscribers.get(args[0], set())
+            message = encode_array([b"message", args[0], args[1]])
+            for receiver in receivers:
+                receiver.write(message)
+            return encode_int(len(receivers))
+        if name == b"SUBSCRIBE":
+            replies = b""
+            for channel in args:
+                subscriptions.add(channel)
+                self.subscribers.setdefault(channel, set()).add(writer)
+                replies += b"*3\r\n" + encode_bulk(b"subscribe") + encode_bulk(channel) + encode_int(len(subscriptions))
+            return replies
+        if name == b"UNSUBSCRIBE":
+            replies = b""
+            for channel in args or list(subscriptions):
+                subscriptions.discard(channel)
+                self.subscribers.get(channel, set()).discard(writer)
+                replies += b"*3\r\n" + encode_bulk(b"unsubscribe") + encode_bulk(channel) + encode_int(len(subscriptions))
+            return replies
+        return b"-ERR unknown command '" + name + b"'\r\n"
+
+    def set(self, args: List[bytes], session: Dict[str, Any]) -> bytes:
+        key, value = args[0].decode(), args[1]
+        options = [arg.upper() for arg in args[2:]]
+        expires_at = None
+        for i, option in enumerate(options):
+            if option == b"EX":
+                expires_at = time.monotonic() + int(args[2 + i + 1])
+            elif option == b"PX":
+                expires_at = time.monotonic() + int(args[2 + i + 1]) / 1000
+        exists = self.get(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return null(session)
+        self.values[key] = (value, expires_at)
+        self.touch(key)
+        return b"+OK\r\n"
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.strip().split()
+    parts = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts
+
+
+def null(session: Dict[str, Any]) -> bytes:
+    return b"_\r\n" if session["resp3"] else b"$-1\r\n"
+
+
+def encode_bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+
+def encode_int(value: int) -> bytes:
+    return b":" + str(value).encode() + b"\r\n"
+
+
+def encode_array(items: List[bytes]) -> bytes:
+    return b"*" + str(len(items)).encode() + b"\r\n" + b"".join(encode_bulk(item) for item in items)
+
+
+async def serve(host: str, port: int):
+    fake = FakeRedis()
+    server = await asyncio.start_server(fake.handle_client, host, port)
+    print(f"Fake Redis listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory stand-in for Redis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
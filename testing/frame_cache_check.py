@@ -0,0 +1,223 @@
+# frame_cache_check.py
+# Checks the game server's cross-room frame cache. FrameCache on its own: requests for a key in
+# flight join its generation, subscribers get every frame at the generation's cadence, the last
+# subscriber leaving cancels it (and the next request starts afresh instead of joining it),
+# failed and reduced-quality sequences are not cached, and completed ones are evicted least
+# recently used first once the byte budget is exceeded. Then with GameRooms: rooms that start
+# the same prompt share one generation, a room that stops watching (its round ended or it
+# emptied) leaves the others replaying it undisturbed, including the rendition encodes they
+# share, and the finished sequence is cached for the next room.
+# Runs GameRooms in-process against a stand-in AI backend; needs Pillow for the renditions.
+# Run from the repository root:
+#   python testing/frame_cache_check.py
+
+import asyncio
+import io
+import os
+import sys
+import time
+import types
+from typing import Any, Dict, List
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import (
+    GAME_CONFIG, RENDITION_CONFIG, ConnectionManager, FrameCache, FrameSequence, GameRoom,
+    PlayerConnection, RenditionEncoder,
+)
+from backend.observability import CODEC_JPEG
+
+PROMPT = "a lighthouse in a storm"
+STEPS = 4
+STEP_S = 0.05
+# Long enough that a room is always waiting on an encode when it is cancelled.
+ENCODE_DELAY_S = 0.15
+
+
+def jpeg(size: int, shade: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (size, size), (shade, 80, 160)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def stand_in_generation(frames: int = STEPS, frame_bytes: int = 100, reduced: bool = False, fail: bool = False):
+    """A FrameCache generate callback that adds `frames` frames STEP_S apart."""
+    calls = []
+
+    async def generate(sequence: FrameSequence):
+        calls.append(sequence.key)
+        for step in range(1, frames + 1):
+            await asyncio.sleep(STEP_S)
+            sequence.add_frame({"step": step, "image": bytes(frame_bytes), "reduced": reduced})
+        if fail:
+            raise ConnectionError("AI server went away")
+
+    generate.calls = calls
+    return generate
+
+
+async def collect(sequence: FrameSequence) -> List[float]:
+    """Replays a sequence, returning how long after the replay started each frame arrived."""
+    started = time.monotonic()
+    return [time.monotonic() - started async for _ in sequence.replay()]
+
+
+async def check_concurrent_requests_join():
+    cache = FrameCache(max_bytes=10_000)
+    generate = stand_in_generation()
+    first = cache.get_or_generate(("a", 1, STEPS), generate)
+    await asyncio.sleep(STEP_S * 1.5)
+    second = cache.get_or_generate(("a", 1, STEPS), generate)
+    assert first is second and len(generate.calls) == 1 and cache.joins == 1, cache.stats()
+
+    early, late = await asyncio.gather(collect(first), collect(second))
+    assert len(early) == len(late) == STEPS, (early, late)
+    # Both follow the generation itself: the frame already made arrives at once, the rest as they are made.
+    assert early[0] < STEP_S / 2 and abs(early[-1] - (STEPS - 1.5) * STEP_S) < STEP_S / 2, early
+    assert all(abs(a - b) < STEP_S / 2 for a, b in zip(early, late)), (early, late)
+
+    assert cache.get_or_generate(("a", 1, STEPS), generate) is first and len(generate.calls) == 1
+    # A cached sequence replays from the start at the cadence it was generated.
+    cached = await collect(first)
+    assert len(cached) == STEPS and abs(cached[-1] - STEPS * STEP_S) < STEP_S / 2, cached
+    assert (cache.hits, cache.misses) == (1, 1), cache.stats()
+    print("ok: requests for a key in flight join its generation, and the finished one replays from the cache")
+
+
+async def check_last_subscriber_cancels():
+    cache = FrameCache(max_bytes=10_000)
+    generate = stand_in_generation()
+    sequence = cache.get_or_generate(("b", 1, STEPS), generate)
+    replay = sequence.replay()
+    await replay.__anext__()
+    await replay.aclose()
+    assert sequence.cancelled, "the generation was not cancelled when its last subscriber left"
+
+    # The cancel has not reached the generation yet, but a new request must not join it.
+    restarted = cache.get_or_generate(("b", 1, STEPS), generate)
+    assert restarted is not sequence and len(generate.calls) == 1 and cache.joins == 0
+    await asyncio.gather(sequence.task, return_exceptions=True)
+    assert sequence.task.cancelled() and cache.cancelled == 1, cache.stats()
+    assert len(await collect(restarted)) == STEPS and ("b", 1, STEPS) in cache.entries
+    print("ok: the last subscriber leaving cancels the generation, and the next request starts a new one")
+
+
+async def check_failed_and_reduced_not_cached():
+    cache = FrameCache(max_bytes=10_000)
+    failed = cache.get_or_generate(("c", 1, STEPS), stand_in_generation(fail=True))
+    try:
+        await collect(failed)
+        raise AssertionError("a failed generation replayed without an error")
+    except RuntimeError:
+        pass
+    reduced = cache.get_or_generate(("d", 1, STEPS), stand_in_generation(reduced=True))
+    assert len(await collect(reduced)) == STEPS
+    await asyncio.sleep(0)
+    assert not cache.entries and not cache.in_flight and cache.reduced == 1, cache.stats()
+    print("ok: failed and reduced-quality generations are not cached")
+
+
+async def check_lru_eviction():
+    cache = FrameCache(max_bytes=STEPS * 100 * 2)
+    for name in ("e", "f"):
+        await collect(cache.get_or_generate((name, 1, STEPS), stand_in_generation()))
+    cache.get_or_generate(("e", 1, STEPS), stand_in_generation())
+    await collect(cache.get_or_generate(("g", 1, STEPS), stand_in_generation()))
+    assert [key[0] for key in cache.entries] == ["e", "g"], list(cache.entries)
+    assert cache.size_bytes == STEPS * 100 * 2, cache.stats()
+
+    await collect(cache.get_or_generate(("h", 1, 1), stand_in_generation(frames=1, frame_bytes=10_000)))
+    assert ("h", 1, 1) not in cache.entries, "a sequence larger than the whole cache was stored"
+    print("ok: completed sequences are evicted least recently used first once over the byte budget")
+
+
+class StandInBackends:
+    """Yields STEPS frames of a 512px image, like AIBackendPool.generate."""
+
+    def __init__(self):
+        self.generations = 0
+
+    async def generate(self, prompt: str, seed: int, steps: int, requested_by: str = None):
+        self.generations += 1
+        for step in range(1, STEPS + 1):
+            await asyncio.sleep(STEP_S)
+            yield {
+                "type": "frame", "step": step, "total_steps": STEPS, "step_ms": STEP_S * 1000,
+                "codec": CODEC_JPEG, "final": step == STEPS, "reduced": False,
+                "image": jpeg(512, step * 40), "received_at": time.perf_counter(),
+            }
+
+
+class SlowRenditionEncoder(RenditionEncoder):
+    async def build(self, frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        await asyncio.sleep(ENCODE_DELAY_S)
+        return await super().build(frame)
+
+
+class RecordingConnection(PlayerConnection):
+    def __init__(self):
+        super().__init__(websocket=None)
+        self.frames = 0
+
+    def send(self, message_type: str, data: str | bytes):
+        self.frames += message_type == "image_update"
+
+
+def create_manager():
+    manager = types.SimpleNamespace(
+        frame_cache=FrameCache(64 * 1024 * 1024),
+        renditions=SlowRenditionEncoder(RENDITION_CONFIG),
+        ai_backends=StandInBackends(),
+    )
+    manager.generate_frames = lambda sequence: ConnectionManager.generate_frames(manager, sequence)
+    return manager
+
+
+async def create_room(manager, room_id: str) -> RecordingConnection:
+    room = GameRoom(room_id, manager)
+    connection = RecordingConnection()
+    room.players["player"] = connection
+    room.current_prompt = PROMPT
+    room.image_stream_task = asyncio.create_task(room.run_image_generation_and_broadcast())
+    return room, connection
+
+
+async def check_cancelled_room_leaves_others_running():
+    manager = create_manager()
+    room_a, _ = await create_room(manager, "room-a")
+    room_b, watcher = await create_room(manager, "room-b")
+    # Room A ends its round while both rooms wait on the first frame's renditions.
+    await asyncio.sleep(STEP_S + ENCODE_DELAY_S / 2)
+    room_a.image_stream_task.cancel()
+    await asyncio.gather(room_a.image_stream_task, return_exceptions=True)
+    await asyncio.wait_for(room_b.image_stream_task, timeout=5)
+
+    key = (PROMPT, GAME_CONFIG["GENERATION_SEED"], GAME_CONFIG["GENERATION_STEPS"])
+    stats = manager.frame_cache.stats()
+    assert watcher.frames == STEPS, f"the room still watching got {watcher.frames} of {STEPS} frames"
+    assert manager.ai_backends.generations == 1, manager.ai_backends.generations
+    assert stats["cancelled"] == 0 and key in manager.frame_cache.entries, stats
+    sequence = manager.frame_cache.entries[key]
+    assert all(not frame["renditions"].cancelled() for _, frame in sequence.frames)
+    print("ok: a room that stops watching leaves the other room's replay and the shared encodes running")
+
+    room_c, late = await create_room(manager, "room-c")
+    await asyncio.wait_for(room_c.image_stream_task, timeout=5)
+    assert late.frames == STEPS and manager.ai_backends.generations == 1, (late.frames, manager.frame_cache.stats())
+    print("ok: the finished generation is replayed from the cache")
+    manager.renditions.close()
+
+
+async def main():
+    await check_concurrent_requests_join()
+    await check_last_subscriber_cancels()
+    await check_failed_and_reduced_not_cached()
+    await check_lru_eviction()
+    await check_cancelled_room_leaves_others_running()
+    print("All frame cache checks passed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,238 @@
+# generation_scheduler_check.py
+# Checks the AI server's GenerationScheduler against a tiny stand-in pipeline on the CPU:
+# concurrent requests share one batched pipeline call, every requester gets only its own frames,
+# seeded results do not depend on what they were batched with, a busy room cannot starve
+# another one, preview modes only change the intermediate frames, cancelled requests stop
+# using the pipeline, the quality controller trades quality for deadlines under load, and
+# malformed requests are rejected with a ValueError.
+# The real models only load
+# when the server starts, so importing ai_server here never touches them.
+# Run from the repository root:
+#   python testing/generation_scheduler_check.py
+
+import asyncio
+import io
+import os
+import sys
+import time
+import types
+
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from ai_server import GenerationScheduler, QualityController, parse_generation_request
+
+
+class TinyVae:
+    config = types.SimpleNamespace(scaling_factor=1.0)
+
+    def decode(self, latents, return_dict=False):
+        # Like the real VAE, the output is larger than the latents.
+        return (latents[:, :3].repeat_interleave(2, dim=2).repeat_interleave(2, dim=3),)
+
+
+class TinyImageProcessor:
+    def postprocess(self, images):
+        # One image per decoded tensor, colored by its values.
+        return [
+            Image.fromarray((image[:3].clamp(-1, 1).add(1).mul(127.5)).byte().permute(1, 2, 0).numpy())
+            for image in images
+        ]
+
+
+class TinyPipeline:
+    """Mimics the parts of a diffusers pipeline the scheduler uses, with 4x8x8 latents."""
+
+    device = torch.device("cpu")
+
+    def __init__(self, step_delay_s: float = 0.01):
+        self.vae = TinyVae()
+        self.image_processor = TinyImageProcessor()
+        self.step_delay_s = step_delay_s
+        self.calls = []
+        self.steps_run = 0
+
+    def __call__(self, prompt, num_inference_steps, generator, callback_on_step_end, **kwargs):
+        self.calls.append(list(prompt))
+        noise = torch.stack([torch.randn(4, 8, 8, generator=g) for g in generator])
+        offsets = torch.tensor([len(p) / 10 for p in prompt]).view(-1, 1, 1, 1)
+        for step in range(num_inference_steps):
+            time.sleep(self.step_delay_s)
+            self.steps_run += 1
+            latents = noise / (step + 1) + offsets
+            callback_on_step_end(self, step, 999 - step, {"latents": latents})
+
+
+async def generate(
+    scheduler: GenerationScheduler, client_id: str, prompt: str, seed: int = 7, steps: int = 4, preview: str = "full",
+    deadline_ms: float = None,
+):
+    frames = []
+    request = parse_generation_request(
+        {"prompt": prompt, "seed": seed, "steps": steps, "preview": preview, "deadline_ms": deadline_ms}
+    )
+    await scheduler.submit(request, client_id, lambda step, total, image: frames.append((step, total, image)))
+    return frames
+
+
+async def check_batching_and_demultiplexing():
+    pipe = TinyPipeline()
+    scheduler = GenerationScheduler(pipe, max_batch=4, window_s=0.02)
+    prompts = ["a cat", "a red bicycle", "a lighthouse at night", "tea"]
+    batched = await asyncio.gather(*(generate(scheduler, f"room{i}", p) for i, p in enumerate(prompts)))
+    assert pipe.calls == [prompts], pipe.calls
+    print("ok: four rooms share a single pipeline call")
+
+    for prompt, frames in zip(prompts, batched):
+        assert [(step, total) for step, total, _ in frames] == [(1, 4), (2, 4), (3, 4), (4, 4)], frames
+        solo = await generate(GenerationScheduler(TinyPipeline(), max_batch=4, window_s=0), "solo", prompt)
+        assert [image for _, _, image in frames] == [image for _, _, image in solo], prompt
+    print("ok: every room gets its own frames, identical to an unbatched run with the same seed")
+
+    stats = scheduler.stats()
+    assert stats["batches"] == 1 and stats["avg_batch_size"] == 4 and stats["queue_depth"] == 0, stats
+    print(f"ok: stats {stats}")
+
+
+async def check_fairness():
+    pipe = TinyPipeline(step_delay_s=0.02)
+    scheduler = GenerationScheduler(pipe, max_batch=2, window_s=0.01)
+    busy = [asyncio.create_task(generate(scheduler, "busy", f"busy {i}")) for i in range(6)]
+    await asyncio.sleep(0.05)
+    quiet = asyncio.create_task(generate(scheduler, "quiet", "quiet"))
+    await asyncio.gather(*busy, quiet)
+    second_batch = pipe.calls[1]
+    assert "quiet" in second_batch, pipe.calls
+    print(f"ok: a late room is served in the next batch instead of after the busy room ({pipe.calls})")
+
+
+async def check_mixed_steps():
+    pipe = TinyPipeline()
+    scheduler = GenerationScheduler(pipe, max_batch=4, window_s=0.02)
+    frames = await asyncio.gather(
+        generate(scheduler, "a", "one", steps=2), generate(scheduler, "b", "two", steps=4),
+        generate(scheduler, "c", "three", steps=2),
+    )
+    assert sorted(pipe.calls) == [["one", "three"], ["two"]], pipe.calls
+    assert [len(f) for f in frames] == [2, 4, 2], frames
+    print("ok: only requests with the same step count are batched together")
+
+
+async def check_cancellation():
+    pipe = TinyPipeline(step_delay_s=0.05)
+    scheduler = GenerationScheduler(pipe, max_batch=1, window_s=0)
+    first = asyncio.create_task(generate(scheduler, "a", "first"))
+    second = asyncio.create_task(generate(scheduler, "b", "second"))
+    await asyncio.sleep(0.02)
+    second.cancel()
+    await first
+    await asyncio.gather(second, return_exceptions=True)
+    assert pipe.calls == [["first"]] and scheduler.queued_jobs() == 0, pipe.calls
+    print("ok: a request cancelled while queued never reaches the pipeline")
+
+
+async def check_running_cancellation():
+    pipe = TinyPipeline(step_delay_s=0.05)
+    scheduler = GenerationScheduler(pipe, max_batch=2, window_s=0)
+    job = asyncio.create_task(generate(scheduler, "a", "doomed", steps=8))
+    await asyncio.sleep(0.12)
+    job.cancel()
+    await asyncio.gather(job, return_exceptions=True)
+    await asyncio.sleep(0.1)
+    stats = scheduler.stats()
+    assert pipe.steps_run < 5 and stats["batches_aborted"] == 1 and stats["reclaimed_s"] > 0, (pipe.steps_run, stats)
+    print(f"ok: a cancelled running request stops the pipeline after {pipe.steps_run} of 8 steps ({stats['reclaimed_s']}s reclaimed)")
+
+    pipe = TinyPipeline(step_delay_s=0.02)
+    scheduler = GenerationScheduler(pipe, max_batch=2, window_s=0.02)
+    kept = asyncio.create_task(generate(scheduler, "a", "kept"))
+    dropped = asyncio.create_task(generate(scheduler, "b", "dropped"))
+    await asyncio.sleep(0.05)
+    dropped.cancel()
+    frames = await kept
+    assert len(frames) == 4 and pipe.steps_run == 4, (len(frames), pipe.steps_run)
+    print("ok: cancelling one request of a batch leaves the others running")
+
+
+async def check_preview_modes():
+    scheduler = GenerationScheduler(TinyPipeline(), max_batch=4, window_s=0.02)
+    full, linear = await asyncio.gather(
+        generate(scheduler, "a", "a cat", preview="full"), generate(scheduler, "b", "a cat", preview="linear"),
+    )
+    sizes = [Image.open(io.BytesIO(image)).size for _, _, image in linear]
+    assert sizes == [(8, 8), (8, 8), (8, 8), (16, 16)], sizes
+    assert linear[-1][2] == full[-1][2]
+    assert [image for _, _, image in linear[:-1]] != [image for _, _, image in full[:-1]]
+    decode_ms = scheduler.stats()["avg_decode_ms"]
+    assert set(decode_ms) == {"full", "linear"}, decode_ms
+    print(f"ok: linear previews are latent-sized, the final frame is a full decode ({decode_ms})")
+
+
+def check_request_validation():
+    for bad in ({"seed": "x"}, {"steps": "many"}, {"deadline_ms": "soon"}, {"deadline_ms": -5}, {"id": 7}):
+        try:
+            parse_generation_request({"prompt": "a cat", **bad})
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad} was accepted")
+    request = parse_generation_request({"id": "r1", "prompt": "a cat", "seed": "3", "steps": 2, "deadline_ms": 500})
+    assert (request["seed"], request["steps"], request["deadline_s"]) == (3, 2, 0.5), request
+    print("ok: malformed generation requests are rejected with a ValueError")
+
+
+def plan(controller: QualityController, steps: int, deadline_s: float, queued_jobs: int = 0) -> tuple:
+    request = parse_generation_request({"prompt": "a cat", "steps": steps, "preview": "linear"})
+    request["deadline_s"] = deadline_s
+    controller.plan(request, queued_jobs, 2, running=False)
+    return request["steps"], request["size"], request["preview_every"], request["reduced"]
+
+
+async def check_quality_controller():
+    controller = QualityController([256, 512], min_steps=1)
+    assert plan(controller, 4, 1.0) == (4, 512, 1, False)
+    controller.observe_step(512, 0.2)
+    controller.observe_decode("full", 512, 0.1)
+    controller.observe_decode("linear", 512, 0.01)
+    controller.observe_batch(1.0)
+    assert plan(controller, 4, 1.0) == (4, 512, 1, False)
+    assert plan(controller, 4, 0.6) == (2, 512, 1, True)
+    # 256 pixels has not run yet, so it is estimated at a quarter of the 512 latencies.
+    assert plan(controller, 4, 0.23) == (4, 256, 2, True)
+    assert plan(controller, 4, 1.0, queued_jobs=4) == (1, 256, 1, True)
+    assert plan(controller, 4, 0.01) == (1, 256, 1, True)
+    print("ok: quality drops from steps to image size as the deadline tightens or the queue grows")
+
+    pinned = QualityController([256, 512], min_steps=1, force_steps=2, force_preview_every=2)
+    pinned.step_s, pinned.decode_s, pinned.batch_s = controller.step_s, controller.decode_s, controller.batch_s
+    assert plan(pinned, 4, 0.01) == (2, 256, 2, True) and plan(pinned, 4, 10) == (2, 512, 2, False)
+    disabled = QualityController([256, 512], min_steps=1, enabled=False)
+    disabled.step_s, disabled.decode_s, disabled.batch_s = controller.step_s, controller.decode_s, controller.batch_s
+    assert plan(disabled, 4, 0.01) == (4, 512, 1, False)
+    print("ok: pinned decisions and a disabled controller are honored")
+
+    pipe = TinyPipeline(step_delay_s=0.05)
+    scheduler = GenerationScheduler(pipe, max_batch=1, window_s=0, quality=QualityController([None], min_steps=1))
+    warmup = await generate(scheduler, "a", "warmup", steps=8)
+    assert len(warmup) == 8, warmup
+    frames = await asyncio.gather(*(generate(scheduler, f"room{i}", f"p{i}", steps=8, deadline_ms=600) for i in range(3)))
+    steps = [frame[-1][1] for frame in frames]
+    assert steps[0] > steps[-1] and all(frame[-1][0] == frame[-1][1] for frame in frames), steps
+    print(f"ok: requests queued behind others get fewer steps to meet their deadline ({steps} of 8)")
+
+
+async def main():
+    await check_batching_and_demultiplexing()
+    await check_fairness()
+    await check_mixed_steps()
+    await check_cancellation()
+    await check_running_cancellation()
+    await check_preview_modes()
+    await check_quality_controller()
+    check_request_validation()
+    print("All generation scheduler checks passed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
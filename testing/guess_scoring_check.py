@@ -0,0 +1,87 @@
+# guess_scoring_check.py
+# Checks the game server's guess handling helpers: normalize_guess maps guesses that only differ
+# in case, whitespace or punctuation to the same score cache key (while keeping numbers like 3.5
+# intact), the per-player TokenBucket allows a burst and then refills at its rate, and ScoreCache
+# entries expire after their TTL and are evicted least recently used first.
+# Runs in-process; no AI server is needed.
+# Run from the repository root:
+#   python testing/guess_scoring_check.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import ScoreCache, TokenBucket, normalize_guess
+
+# guess -> normalized key
+NORMALIZATION_EXAMPLES = {
+    "A Cat": "a cat",
+    "  a   cat  ": "a cat",
+    "a cat!!!": "a cat",
+    "A cat, sleeping.": "a cat sleeping",
+    "the cat's hat": "the cats hat",
+    "the cat’s hat": "the cats hat",
+    "cat-like_robot": "cat like robot",
+    "3.5 apples": "3.5 apples",
+    "version 2.0.": "version 2.0",
+    "...": "",
+    "Ünïcode Café": "ünïcode café",
+}
+
+
+def check_normalization():
+    for guess, expected in NORMALIZATION_EXAMPLES.items():
+        assert normalize_guess(guess) == expected, (guess, normalize_guess(guess), expected)
+    print(f"ok: {len(NORMALIZATION_EXAMPLES)} guesses normalize to the expected cache keys")
+
+
+def check_rate_limit_refill():
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert abs(bucket.retry_after() - 0.5) < 0.01, bucket.retry_after()
+
+    # Half a second at 2 tokens per second buys exactly one more guess.
+    bucket.updated_at -= 0.5
+    assert [bucket.try_acquire() for _ in range(2)] == [True, False]
+
+    # A long pause refills the bucket to its burst, never beyond it.
+    bucket.updated_at -= 60
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    empty = TokenBucket(rate=0, burst=0)
+    assert not empty.try_acquire() and empty.retry_after() == float("inf")
+    print("ok: the guess rate limit allows a burst, then refills at its rate up to the burst")
+
+
+def check_cache_ttl():
+    cache = ScoreCache(max_entries=10, ttl_s=0.05)
+    cache.put(("a prompt", "a cat"), 80.0)
+    assert cache.get(("a prompt", "a cat")) == 80.0
+    assert cache.get(("a prompt", "a dog")) is None
+    time.sleep(0.1)
+    assert cache.get(("a prompt", "a cat")) is None and not cache.entries, cache.entries
+    assert (cache.hits, cache.misses) == (1, 2), (cache.hits, cache.misses)
+
+    cache = ScoreCache(max_entries=2, ttl_s=60)
+    cache.put(("p", "one"), 1.0)
+    cache.put(("p", "two"), 2.0)
+    cache.get(("p", "one"))
+    cache.put(("p", "three"), 3.0)
+    assert list(cache.entries) == [("p", "one"), ("p", "three")], list(cache.entries)
+
+    disabled = ScoreCache(max_entries=0, ttl_s=60)
+    disabled.put(("p", "one"), 1.0)
+    assert disabled.get(("p", "one")) is None
+    print("ok: cached scores expire after their TTL, and the least recently used entry is evicted")
+
+
+def main():
+    check_normalization()
+    check_rate_limit_refill()
+    check_cache_ttl()
+    print("All guess scoring checks passed.")
+
+
+if __name__ == "__main__":
+    main()
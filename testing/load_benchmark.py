@@ -0,0 +1,320 @@
+# load_benchmark.py
+# Load test for one game server process. It starts the game server against testing/fake_ai_server.py,
+# then drives N rooms x M simulated players through /api/rooms and /ws/game. Each room joins,
+# starts a game, and sends bursts of guesses while the image streams. It reports p50/p99 for:
+#   broadcast latency  - a guess that improves a score -> the player_update reaching every player
+#   guess round trip   - new_guess -> guess_feedback for the guesser
+#   frame lag          - the fake AI server producing a frame -> the frame reaching a player
+#   start latency      - start_game -> new_turn reaching every player in the room
+# and writes everything as JSON, so runs can be compared for regressions.
+# Run from the repository root:
+#   python testing/load_benchmark.py --rooms 20 --players 8 --duration 20 --output results.json
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Must match the game server's CLIENT_FRAME_HEADER and the fake AI server's timestamp prefix.
+CLIENT_FRAME_HEADER = struct.Struct("!BBBBHH")
+TIMESTAMP = struct.Struct("!d")
+
+
+class Metrics:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {
+            "broadcast_latency_ms": [], "guess_round_trip_ms": [], "frame_lag_ms": [], "start_latency_ms": [],
+        }
+        self.counters: Dict[str, int] = {
+            "guesses_sent": 0, "feedback_received": 0, "frames_received": 0, "player_updates_received": 0,
+            "guesses_rate_limited": 0, "errors": 0, "disconnects": 0,
+        }
+
+    def record(self, name: str, seconds: float):
+        self.samples[name].append(seconds * 1000)
+
+    def summary(self) -> dict:
+        return {
+            name: summarize(values) for name, values in self.samples.items()
+        } | {"counters": self.counters}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.50), 3),
+        "p90": round(percentile(values, 0.90), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(values[-1], 3),
+        "mean": round(sum(values) / len(values), 3),
+    }
+
+
+class SimulatedRoom:
+    """Guess timestamps shared by the players of one room, to time the broadcasts they cause."""
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        # (player name, best similarity) -> when the guess that set it was sent
+        self.improvements: Dict[tuple, float] = {}
+        self.start_sent_at: Optional[float] = None
+        self.all_joined = asyncio.Event()
+        self.joined = 0
+        # The first player the server admits becomes host; join_success and player updates say who that is.
+        self.host: Optional[str] = None
+        self.host_known = asyncio.Event()
+
+
+class SimulatedPlayer:
+    def __init__(self, args, metrics: Metrics, room: SimulatedRoom, name: str, binary: bool):
+        self.args = args
+        self.metrics = metrics
+        self.room = room
+        self.name = name
+        self.binary = binary
+        self.websocket = None
+        self.joined = asyncio.Event()
+        self.round_started_at: Optional[float] = None
+        self.pending_guesses: List[float] = []
+        self.seen_improvements = set()
+        self.guess_count = 0
+
+    async def run(self, url: str, stop_at: float):
+        self.websocket = await websockets.connect(url, max_size=None)
+        await self.websocket.send(json.dumps({"type": "join_room", "payload": {
+            "room_id": self.room.room_id, "player_name": self.name, "transport": "binary" if self.binary else "json",
+        }}))
+        receiver = asyncio.create_task(self.receive())
+        try:
+            await asyncio.wait_for(self.joined.wait(), timeout=10)
+            self.room.joined += 1
+            if self.room.joined == self.args.players:
+                self.room.all_joined.set()
+            await self.room.all_joined.wait()
+            await self.room.host_known.wait()
+            if self.name == self.room.host:
+                self.room.start_sent_at = time.time()
+                await self.websocket.send(json.dumps({"type": "start_game"}))
+            await self.send_guesses(stop_at)
+        finally:
+            await self.websocket.close()
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+
+    async def send_guesses(self, stop_at: float):
+        # Let the round start before guessing.
+        while self.round_started_at is None and time.time() < stop_at:
+            await asyncio.sleep(0.05)
+        while time.time() < stop_at:
+            for _ in range(self.args.burst):
+                self.guess_count += 1
+                # The fake AI server scores a guess as the number in it; each guess beats the last one.
+                similarity = round(min(99.0, 1 + self.guess_count * 0.01), 2)
+                sent_at = time.time()
+                self.room.improvements[(self.name, similarity)] = sent_at
+                self.pending_guesses.append(sent_at)
+                self.metrics.counters["guesses_sent"] += 1
+                await self.websocket.send(json.dumps({"type": "new_guess", "payload": {"guess": f"guess {similarity}"}}))
+            await asyncio.sleep(self.args.burst_interval)
+
+    async def receive(self):
+        try:
+            async for message in self.websocket:
+                now = time.time()
+                if isinstance(message, bytes):
+                    self.on_frame(now, message[CLIENT_FRAME_HEADER.size:])
+                    continue
+                data = json.loads(message)
+                message_type = data.get("type")
+                if message_type == "join_success":
+                    self.on_player_update(now, data["payload"]["players"])
+                    self.joined.set()
+                elif message_type == "image_update":
+                    image_b64 = data["payload"]["imageBase64"].split(",", 1)[1]
+                    self.on_frame(now, base64.b64decode(image_b64[:16]))
+                elif message_type == "new_turn":
+                    self.round_started_at = now
+                    if self.room.start_sent_at is not None and data["payload"]["round"] == 1:
+                        self.metrics.record("start_latency_ms", now - self.room.start_sent_at)
+                elif message_type == "guess_feedback":
+                    self.metrics.counters["feedback_received"] += 1
+                    if self.pending_guesses:
+                        self.metrics.record("guess_round_trip_ms", now - self.pending_guesses.pop(0))
+                elif message_type == "guess_rate_limited":
+                    self.metrics.counters["guesses_rate_limited"] += 1
+                    if self.pending_guesses:
+                        self.pending_guesses.pop(0)
+                elif message_type == "player_update":
+                    self.metrics.counters["player_updates_received"] += 1
+                    self.on_player_update(now, data["payload"]["players"])
+                elif message_type == "error":
+                    self.metrics.counters["errors"] += 1
+        except websockets.ConnectionClosed:
+            self.metrics.counters["disconnects"] += 1
+
+    def on_frame(self, now: float, image: bytes):
+        self.metrics.counters["frames_received"] += 1
+        (generated_at,) = TIMESTAMP.unpack(image[:TIMESTAMP.size])
+        # Frames replayed to a room that joined a generation late were available from its round start.
+        available_at = max(generated_at, self.round_started_at or generated_at)
+        self.metrics.record("frame_lag_ms", now - available_at)
+
+    def on_player_update(self, now: float, players: List[dict]):
+        # Player updates are deltas: a player appears with only the fields that changed.
+        for player in players:
+            if player.get("isHost"):
+                self.room.host = player["name"]
+                self.room.host_known.set()
+        # Older improvements may have been coalesced away; time the ones this update shows first.
+        for player in players:
+            key = (player["name"], player.get("bestSimilarity"))
+            sent_at = self.room.improvements.get(key)
+            if sent_at is not None and key not in self.seen_improvements:
+                self.seen_improvements.add(key)
+                self.metrics.record("broadcast_latency_ms", now - sent_at)
+
+
+def start_process(args_list: List[str], env: dict, log_path: Optional[str]) -> subprocess.Popen:
+    output = open(log_path, "a") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(args_list, cwd=REPO_ROOT, env={**os.environ, **env}, stdout=output, stderr=output)
+
+
+async def wait_for_http(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(200):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(args, base_url: str) -> dict:
+    metrics = Metrics()
+    async with httpx.AsyncClient() as client:
+        room_ids = [(await client.post(f"{base_url}/api/rooms")).json()["room_id"] for _ in range(args.rooms)]
+
+    ws_url = base_url.replace("http", "ws", 1) + "/ws/game"
+    players = []
+    json_every = round(1 / args.json_fraction) if args.json_fraction > 0 else 0
+    for room_id in room_ids:
+        room = SimulatedRoom(room_id)
+        for i in range(args.players):
+            binary = not (json_every and (len(players) % json_every) == 0)
+            players.append(SimulatedPlayer(args, metrics, room, f"player{i}", binary))
+
+    started = time.time()
+    stop_at = started + args.duration
+    results = await asyncio.gather(*(player.run(ws_url, stop_at) for player in players), return_exceptions=True)
+    failures = [repr(result) for result in results if isinstance(result, Exception)]
+    summary = metrics.summary()
+    summary["counters"]["player_failures"] = len(failures)
+    summary["wall_time_s"] = round(time.time() - started, 3)
+    summary["guesses_per_s"] = round(metrics.counters["guesses_sent"] / args.duration, 1)
+    if failures:
+        summary["failure_examples"] = failures[:5]
+    return summary
+
+
+def print_report(summary: dict):
+    print(f"{'metric':<22} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name in ("broadcast_latency_ms", "guess_round_trip_ms", "frame_lag_ms", "start_latency_ms"):
+        stats = summary[name]
+        if not stats["count"]:
+            print(f"{name:<22} {0:>7}")
+            continue
+        print(f"{name:<22} {stats['count']:>7} {stats['p50']:>9.1f} {stats['p90']:>9.1f} {stats['p99']:>9.1f} {stats['max']:>9.1f}")
+    print(json.dumps(summary["counters"]))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Synthetic load test for the game server")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--players", type=int, default=6, help="players per room (the server allows 12)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of guessing (rounds last 30s)")
+    parser.add_argument("--burst", type=int, default=3, help="guesses sent back to back")
+    parser.add_argument("--burst-interval", type=float, default=2.0, help="seconds between a player's bursts")
+    parser.add_argument("--json-fraction", type=float, default=0.0, help="share of players on the JSON transport")
+    parser.add_argument("--frame-bytes", type=int, default=60_000)
+    parser.add_argument("--step-ms", type=float, default=150)
+    parser.add_argument("--steps", type=int, default=20, help="frames per generated image")
+    parser.add_argument("--score-ms", type=float, default=20)
+    parser.add_argument("--game-port", type=int, default=8200)
+    parser.add_argument("--ai-port", type=int, default=8201)
+    parser.add_argument("--server-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the game server, e.g. SEND_MAX_LAG_S=2")
+    parser.add_argument("--log", help="append both servers' output to this file")
+    parser.add_argument("--output", default="load_benchmark_results.json")
+    args = parser.parse_args()
+
+    ai_server = start_process(
+        [sys.executable, os.path.join("testing", "fake_ai_server.py"), "--port", str(args.ai_port),
+         "--frame-bytes", str(args.frame_bytes), "--step-ms", str(args.step_ms), "--score-ms", str(args.score_ms)],
+        {}, args.log,
+    )
+    game_env = {
+        "AI_SERVER_URL": f"ws://127.0.0.1:{args.ai_port}/ws/generate",
+        "AI_SCORING_URL": f"http://127.0.0.1:{args.ai_port}/score/similarity",
+        "GENERATION_STEPS": str(args.steps),
+        # Live generations only: a cached replay would carry the timestamps of the original run.
+        "FRAME_CACHE_MAX_BYTES": "0",
+        **dict(item.split("=", 1) for item in args.server_env),
+    }
+    game_server = start_process(
+        [sys.executable, "-m", "uvicorn", "backend.game_server.game_server:app", "--port", str(args.game_port),
+         "--log-level", "warning"],
+        game_env, args.log,
+    )
+    base_url = f"http://127.0.0.1:{args.game_port}"
+    try:
+        await asyncio.gather(wait_for_http(f"http://127.0.0.1:{args.ai_port}/health/ready"), wait_for_http(f"{base_url}/docs"))
+        summary = await run_load(args, base_url)
+    finally:
+        for process in (game_server, ai_server):
+            process.terminate()
+            await asyncio.to_thread(process.wait)
+
+    print_report(summary)
+    result = {
+        "benchmark": "load_benchmark",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("log", "output")},
+        "results": summary,
+    }
+    with open(args.output, "w") as output:
+        json.dump(result, output, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+# local_scoring_check.py
+# Checks that the game server's in-process scoring engine (SCORING_ENGINE=local) agrees with the AI
+# server's scores. Every catalog prompt is scored against a set of guesses ranging from the prompt
+# itself to unrelated words. The reference is the full-precision sentence-transformers model computed
+# the way ai_server.py does it, or a running AI server with --scoring-url. Reports the absolute error
+# in score points and how often the two engines rank a prompt's guesses the same way, and fails if
+# the error exceeds --max-error.
+# Needs numpy, onnxruntime and tokenizers, plus sentence-transformers unless --scoring-url is given.
+# Run from the repository root:
+#   python testing/local_scoring_check.py
+#   python testing/local_scoring_check.py --scoring-url http://localhost:8000/score/similarity/batch
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import LOCAL_SCORING_CONFIG, PROMPTS, LocalScoringEngine
+
+GENERIC_GUESSES = ["a cat", "a dog running on the beach", "robot", "a painting", "music", "space", "food on a plate"]
+
+
+def build_pairs() -> List[Tuple[str, str]]:
+    pairs = []
+    for i, prompt in enumerate(PROMPTS):
+        words = prompt.split()
+        guesses = [prompt, prompt.upper(), " ".join(words[: max(1, len(words) // 2)]), PROMPTS[(i + 1) % len(PROMPTS)]]
+        pairs.extend((prompt, guess) for guess in guesses + GENERIC_GUESSES)
+    return pairs
+
+
+def reference_scores_local(model_id: str, pairs: List[Tuple[str, str]]) -> List[float]:
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_id, device="cpu")
+    texts = list(dict.fromkeys(text for pair in pairs for text in pair))
+    embeddings = dict(zip(texts, model.encode(texts, normalize_embeddings=True)))
+    return [max(0.0, float(np.dot(embeddings[prompt], embeddings[guess]))) * 100 for prompt, guess in pairs]
+
+
+def reference_scores_remote(url: str, pairs: List[Tuple[str, str]]) -> List[float]:
+    scores = []
+    with httpx.Client(timeout=60) as client:
+        for start in range(0, len(pairs), 256):
+            chunk = pairs[start:start + 256]
+            response = client.post(url, json={"pairs": [{"prompt": p, "guess": g} for p, g in chunk]})
+            response.raise_for_status()
+            scores.extend(response.json()["scores"])
+    return scores
+
+
+def rank_agreement(pairs: List[Tuple[str, str]], local: List[float], reference: List[float]) -> float:
+    """Share of same-prompt guess pairs that both engines order the same way."""
+    by_prompt = {}
+    for (prompt, _), a, b in zip(pairs, local, reference):
+        by_prompt.setdefault(prompt, []).append((a, b))
+    agree = total = 0
+    for scores in by_prompt.values():
+        for (a1, b1), (a2, b2) in itertools.combinations(scores, 2):
+            if abs(b1 - b2) < 1.0:
+                continue  # A tie in the reference has no order to keep.
+            total += 1
+            agree += (a1 - a2) * (b1 - b2) > 0
+    return agree / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare in-process scoring with the AI server's scores")
+    parser.add_argument("--model-id", default=LOCAL_SCORING_CONFIG["MODEL_ID"],
+                        help="hub id or directory of the quantized export")
+    parser.add_argument("--model-file", default=LOCAL_SCORING_CONFIG["MODEL_FILE"])
+    parser.add_argument("--reference-model", default=os.environ.get("SCORING_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--scoring-url", help="compare against a running AI server's /score/similarity/batch instead")
+    parser.add_argument("--max-error", type=float, default=5.0, help="largest allowed difference in score points")
+    args = parser.parse_args()
+
+    engine = LocalScoringEngine({**LOCAL_SCORING_CONFIG, "MODEL_ID": args.model_id, "MODEL_FILE": args.model_file})
+    started = time.perf_counter()
+    engine.load()
+    print(f"Loaded {args.model_id}/{args.model_file} in {time.perf_counter() - started:.1f}s")
+
+    pairs = build_pairs()
+    started = time.perf_counter()
+    local = [engine.score_pairs([pair])[0] for pair in pairs]
+    per_guess_ms = (time.perf_counter() - started) * 1000 / len(pairs)
+    if args.scoring_url:
+        reference = reference_scores_remote(args.scoring_url, pairs)
+    else:
+        reference = reference_scores_local(args.reference_model, pairs)
+    engine.close()
+
+    errors = np.abs(np.array(local) - np.array(reference))
+    agreement = rank_agreement(pairs, local, reference)
+    print(f"{len(pairs)} pairs, {per_guess_ms:.2f} ms per guess on one thread")
+    print(f"absolute error in points: mean {errors.mean():.2f}, p95 {np.percentile(errors, 95):.2f}, max {errors.max():.2f}")
+    print(f"rank agreement within a prompt: {agreement:.1%}")
+    worst = int(errors.argmax())
+    print(f"worst pair: {pairs[worst]} local {local[worst]:.2f} reference {reference[worst]:.2f}")
+    if errors.max() > args.max_error:
+        sys.exit(f"FAILED: error of {errors.max():.2f} points exceeds --max-error {args.max_error}")
+    print("Local scoring check passed.")
+
+
+if __name__ == "__main__":
+    main()
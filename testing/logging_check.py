@@ -0,0 +1,81 @@
+# logging_check.py
+# Checks the servers' shared logging: the SamplingFilter lets at most LOG_SAMPLES_PER_S records
+# per sample key through each second and reports how many it suppressed on the next record it
+# lets through, records without a sample key are never sampled, a full log queue drops and
+# counts records instead of blocking, and room/player context reaches the text and JSON lines.
+# Runs in-process; no server is needed.
+# Run from the repository root:
+#   python testing/logging_check.py
+
+import json
+import logging
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.observability import ContextAdapter, ContextFormatter, NonBlockingQueueHandler, SamplingFilter
+
+
+def record(message: str = "message", **extra) -> logging.LogRecord:
+    log_record = logging.LogRecord("check", logging.WARNING, __file__, 1, message, None, None)
+    log_record.__dict__.update(extra)
+    return log_record
+
+
+def check_sampling():
+    sampler = SamplingFilter(rate=3)
+    passed = [sampler.filter(record(sample="scoring_error")) for _ in range(10)]
+    assert passed == [True] * 3 + [False] * 7, passed
+    assert sampler.filter(record(sample="bad_request")), "one key's budget was spent by another"
+    assert all(sampler.filter(record()) for _ in range(100)), "a record without a sample key was sampled"
+
+    # The next window starts with a fresh budget, and its first record reports what was suppressed.
+    sampler.windows["scoring_error"][0] -= 1.0
+    first = record(sample="scoring_error")
+    assert sampler.filter(first) and first.suppressed == 7, getattr(first, "suppressed", None)
+    second = record(sample="scoring_error")
+    assert sampler.filter(second) and not hasattr(second, "suppressed")
+
+    sampler.windows["bad_request"][0] -= 1.0
+    quiet = record(sample="bad_request")
+    assert sampler.filter(quiet) and not hasattr(quiet, "suppressed"), "reported suppressions that never happened"
+    print("ok: each sample key is rate limited on its own, and suppressed records are reported in the next window")
+
+
+def check_full_queue_drops():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    for i in range(5):
+        handler.emit(record(f"message {i}"))
+    assert handler.queue.qsize() == 2 and handler.dropped == 3, (handler.queue.qsize(), handler.dropped)
+    print("ok: a full log queue drops and counts records instead of blocking")
+
+
+def check_context():
+    logger = logging.getLogger("logging_check")
+    logger.propagate = False
+    log_queue: queue.Queue = queue.Queue()
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+    room_logger = ContextAdapter(logger, {"room_id": "ABCD"})
+    room_logger.warning("Guess from %s", "alice", extra={"player": "alice", "sample": "guess"})
+    log_record = log_queue.get_nowait()
+    assert (log_record.room_id, log_record.player, log_record.sample) == ("ABCD", "alice", "guess")
+
+    text = ContextFormatter(json_lines=False).format(log_record)
+    assert text.endswith("logging_check: Guess from alice room_id=ABCD player=alice"), text
+    line = json.loads(ContextFormatter(json_lines=True).format(log_record))
+    assert line["message"] == "Guess from alice" and line["room_id"] == "ABCD" and line["player"] == "alice", line
+    assert line["level"] == "WARNING" and "sample" not in line, line
+    print("ok: room and player context reaches both the text and the JSON log lines")
+
+
+def main():
+    check_sampling()
+    check_full_queue_drops()
+    check_context()
+    print("All logging checks passed.")
+
+
+if __name__ == "__main__":
+    main()
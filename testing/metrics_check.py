@@ -0,0 +1,105 @@
+# metrics_check.py
+# Checks the Prometheus text the servers serve at /metrics: histogram buckets are cumulative
+# and count a value equal to a bound in that bucket, _sum and _count match what was observed,
+# labelled series render one line each, counters are typed as counters and named *_total, and
+# the game server's and AI server's full /metrics output parses, with every sample belonging
+# to a metric declared once with HELP and TYPE.
+# Importing the servers never loads models or connects anywhere, so no AI server is needed.
+# Run from the repository root:
+#   python testing/metrics_check.py
+
+import asyncio
+import os
+import re
+import sys
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.observability import MetricsRegistry
+
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_]\w*="[^"]*",?)*)\})? (\S+)$')
+HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def parse(text: str) -> Tuple[Dict[str, str], List[Tuple[str, Dict[str, str], float]]]:
+    """Metric types by name, and (name, labels, value) samples. Fails on anything malformed."""
+    assert text.endswith("\n"), "the exposition must end with a newline"
+    types: Dict[str, str] = {}
+    helps = set()
+    samples = []
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split(" ")[2]
+            assert name not in helps, f"{name} declared twice"
+            helps.add(name)
+        elif line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert name in helps and name not in types, f"TYPE for {name} without a single HELP"
+            types[name] = metric_type
+        else:
+            match = SAMPLE_LINE.match(line)
+            assert match, f"malformed sample line: {line!r}"
+            name, label_text, value = match.groups()
+            labels = dict(re.findall(r'(\w+)="([^"]*)"', label_text or ""))
+            family = next((name[:-len(s)] for s in HISTOGRAM_SUFFIXES if name.endswith(s) and name[:-len(s)] in types), name)
+            assert family in types, f"sample {name} belongs to no declared metric"
+            if types[family] == "counter":
+                assert name.endswith("_total"), f"counter {name} is not named *_total"
+            samples.append((name, labels, float(value)))
+    return types, samples
+
+
+def check_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("check_seconds", "A check histogram.", ("stage",), buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value, "encode")
+    histogram.observe(0.7, "send")
+    types, samples = parse(registry.render())
+    assert types == {"check_seconds": "histogram"}, types
+
+    encode = {labels.get("le", name): value for name, labels, value in samples if labels["stage"] == "encode"}
+    assert encode == {"0.1": 2, "0.5": 3, "1.0": 3, "+Inf": 4, "check_seconds_sum": 2.45,
+                      "check_seconds_count": 4}, encode
+    send = {labels.get("le", name): value for name, labels, value in samples if labels["stage"] == "send"}
+    assert send["0.5"] == 0 and send["1.0"] == 1 and send["check_seconds_count"] == 1, send
+    print("ok: histogram buckets are cumulative per series, with _sum and _count")
+
+
+def check_gauges_and_counters():
+    registry = MetricsRegistry()
+    state = {"rooms": 3, "failovers": {"a": 1, "b": 0}}
+    registry.gauge("check_rooms", "Rooms.", lambda: state["rooms"])
+    registry.counter("check_failovers_total", "Failovers.", lambda: state["failovers"], labelname="backend")
+    types, samples = parse(registry.render())
+    assert types == {"check_rooms": "gauge", "check_failovers_total": "counter"}, types
+    assert samples == [("check_rooms", {}, 3), ("check_failovers_total", {"backend": "a"}, 1),
+                       ("check_failovers_total", {"backend": "b"}, 0)], samples
+
+    state["rooms"] = 5
+    assert ("check_rooms", {}, 5) in parse(registry.render())[1], "gauges must be read when scraped"
+    print("ok: gauges and counters are read when scraped, one line per labelled series")
+
+
+def check_server_metrics():
+    from backend import ai_server
+    from backend.game_server import game_server
+
+    for name, server in (("game_server", game_server), ("ai_server", ai_server)):
+        response = asyncio.run(server.metrics_endpoint())
+        types, samples = parse(response.body.decode())
+        assert response.media_type.startswith("text/plain; version=0.0.4")
+        assert "counter" in types.values() and "histogram" in types.values(), types
+        print(f"ok: {name} serves {len(types)} metrics ({len(samples)} samples) that parse")
+
+
+def main():
+    check_histogram()
+    check_gauges_and_counters()
+    check_server_metrics()
+    print("All metrics checks passed.")
+
+
+if __name__ == "__main__":
+    main()
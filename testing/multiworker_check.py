@@ -0,0 +1,162 @@
+# multiworker_check.py
+# End-to-end check of the networked room backend: starts the fake Redis stand-in and two game
+# server workers sharing it, then verifies that players joining the same room through different
+# workers see each other, that one broadcast reaches every player relayed through a worker, that
+# the room's rules are enforced across workers, that leaving hands the host role over, and that a
+# worker releasing a room never deletes a claim another worker made in the meantime.
+# Run from the repository root:
+#   python testing/multiworker_check.py
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_redis_server import serve as serve_fake_redis
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+REDIS_PORT = 6399
+WORKER_PORTS = [8101, 8102]
+
+
+def start_worker(port: int) -> subprocess.Popen:
+    env = {**os.environ, "ROOM_BACKEND_URL": f"redis://127.0.0.1:{REDIS_PORT}/0", "WORKER_ID": f"worker-{port}"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.game_server.game_server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+
+
+async def wait_for_worker(port: int):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/docs")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+async def join(port: int, room_id: str, player_name: str):
+    websocket = await websockets.connect(f"ws://127.0.0.1:{port}/ws/game")
+    await websocket.send(json.dumps({"type": "join_room", "payload": {"room_id": room_id, "player_name": player_name}}))
+    return websocket
+
+
+async def next_message(websocket, message_type: str, predicate=lambda message: True) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5))
+        if message["type"] == message_type and predicate(message):
+            return message
+
+
+def player_names(message: dict) -> set:
+    """Players a player_update delta adds or changes."""
+    return {player["name"] for player in message["payload"]["players"]}
+
+
+async def run_checks():
+    async with httpx.AsyncClient() as client:
+        room_id = (await client.post(f"http://127.0.0.1:{WORKER_PORTS[0]}/api/rooms")).json()["room_id"]
+
+    alice = await join(WORKER_PORTS[0], room_id, "alice")
+    await next_message(alice, "join_success")
+    bob = await join(WORKER_PORTS[1], room_id, "bob")
+    joined = await next_message(bob, "join_success")
+    assert joined["payload"]["roomId"] == room_id, joined
+    print("ok: bob joined a room owned by the other worker")
+
+    await next_message(alice, "player_update", lambda message: "bob" in player_names(message))
+    print("ok: player updates fan out across workers")
+
+    carol = await join(WORKER_PORTS[1], room_id, "carol")
+    await next_message(carol, "join_success")
+    for websocket in (alice, bob):
+        await next_message(websocket, "player_update", lambda message: "carol" in player_names(message))
+    await carol.close()
+    await next_message(bob, "player_update", lambda message: "carol" in message["payload"].get("removed", []))
+    print("ok: broadcasts reach every player relayed through the same worker")
+
+    impostor = await join(WORKER_PORTS[1], room_id, "alice")
+    error = await next_message(impostor, "error")
+    assert error["message"] == "name_taken", error
+    print("ok: join rules are enforced by the owning worker")
+
+    await alice.close()
+    update = await next_message(bob, "player_update", lambda message: "alice" in message["payload"].get("removed", []))
+    players = update["payload"]["players"]
+    assert [(p["name"], p["isHost"]) for p in players] == [("bob", True)], players
+    print("ok: host role moves to the remote player when the host leaves")
+    await bob.close()
+
+
+def check_bus_message_encoding():
+    from backend.game_server.game_server import decode_bus_message, encode_bus_message
+
+    frame = {"op": "deliver", "conns": ["a", "b"], "type": "image_update", "bytes": bytes(range(256))}
+    assert decode_bus_message(encode_bus_message(frame)) == frame
+    text = {"op": "deliver", "conns": ["a"], "type": "time_left", "text": '{"type": "time_left"}'}
+    assert decode_bus_message(encode_bus_message(text)) == text
+    print("ok: relayed frames keep their raw bytes")
+
+
+async def check_release_room():
+    from backend.game_server.game_server import RedisRoomBackend
+
+    backend = RedisRoomBackend(f"redis://127.0.0.1:{REDIS_PORT}/0")
+    assert await backend.claim_room("released", "worker-a")
+    await backend.release_room("released", "worker-b")
+    assert await backend.get_room_owner("released") == "worker-a"
+    await backend.release_room("released", "worker-a")
+    assert await backend.get_room_owner("released") is None
+
+    # Another worker claims the room between worker-a's ownership check and its delete.
+    assert await backend.claim_room("contended", "worker-a")
+    pipeline = backend.redis.pipeline
+
+    def racing_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        get = pipe.get
+
+        async def get_then_steal(key):
+            owner = await get(key)
+            await backend.redis.set(key, "worker-b")
+            return owner
+
+        pipe.get = get_then_steal
+        return pipe
+
+    backend.redis.pipeline = racing_pipeline
+    await backend.release_room("contended", "worker-a")
+    assert await backend.get_room_owner("contended") == "worker-b"
+    await backend.close()
+    print("ok: releasing a room never deletes another worker's claim")
+
+
+async def main():
+    check_bus_message_encoding()
+    redis_task = asyncio.create_task(serve_fake_redis("127.0.0.1", REDIS_PORT))
+    workers = [start_worker(port) for port in WORKER_PORTS]
+    try:
+        await asyncio.gather(*(wait_for_worker(port) for port in WORKER_PORTS))
+        await run_checks()
+        await check_release_room()
+        print("All multi-worker checks passed.")
+    finally:
+        for worker in workers:
+            worker.terminate()
+            # Keep serving the fake Redis while the workers shut down.
+            await asyncio.to_thread(worker.wait)
+        redis_task.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+# player_update_check.py
+# Checks the game server's versioned player_update deltas against a client that applies them the
+# way the frontend does: changes within one PLAYER_UPDATE_TICK_S go out as a single delta carrying
+# only the changed fields, players who leave are listed in `removed` (and never also as changed),
+# and a client that misses a version asks for a full snapshot and carries on from it.
+# Runs a GameRoom in-process with recording connections; no AI server is needed.
+# Run from the repository root:
+#   python testing/player_update_check.py
+
+import asyncio
+import json
+import os
+import sys
+import types
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import GAME_CONFIG, GameRoom, PlayerConnection, RoundScheduler
+
+TICK_S = GAME_CONFIG["PLAYER_UPDATE_TICK_S"]
+
+
+class RecordingConnection(PlayerConnection):
+    """Keeps every message sent to the player instead of writing it to a socket."""
+
+    def __init__(self):
+        super().__init__(websocket=None)
+        self.messages: List[Dict[str, Any]] = []
+
+    def send(self, message_type: str, data: str | bytes):
+        self.messages.append(json.loads(data))
+
+    def player_updates(self) -> List[Dict[str, Any]]:
+        return [message["payload"] for message in self.messages if message["type"] == "player_update"]
+
+
+class PlayerListClient:
+    """The frontend's handling of player_update: apply the next version, resync on a gap."""
+
+    def __init__(self, join_payload: Dict[str, Any]):
+        self.version = join_payload["playersVersion"]
+        self.players = {player["name"]: dict(player) for player in join_payload["players"]}
+
+    def apply(self, payload: Dict[str, Any]) -> bool:
+        """Applies one player_update; True when the client has to ask for a resync."""
+        if payload.get("full"):
+            self.version = payload["version"]
+            self.players = {player["name"]: dict(player) for player in payload["players"]}
+        elif payload["version"] == self.version + 1:
+            self.version = payload["version"]
+            for name in payload.get("removed", []):
+                self.players.pop(name, None)
+            for change in payload["players"]:
+                self.players.setdefault(change["name"], {}).update(change)
+        elif payload["version"] > self.version:
+            return True
+        return False
+
+
+async def next_tick():
+    await asyncio.sleep(TICK_S * 3)
+
+
+def room_players(room: GameRoom) -> Dict[str, Dict[str, Any]]:
+    return {name: room.player_entry(name) for name in room.players}
+
+
+async def join(room: GameRoom, name: str) -> RecordingConnection:
+    connection = RecordingConnection()
+    await room.connect(connection, name)
+    return connection
+
+
+async def check_merge_within_tick(room: GameRoom):
+    alice = await join(room, "alice")
+    client = PlayerListClient(alice.messages[0]["payload"])
+    await join(room, "bob")
+    room.scores["alice"] = 10
+    room.mark_player_changed("alice", "score")
+    room.scores["alice"] = 25
+    room.mark_player_changed("alice", "score")
+    await next_tick()
+
+    updates = alice.player_updates()
+    assert len(updates) == 1, updates
+    assert updates[0]["version"] == room.players_version and "removed" not in updates[0], updates
+    assert not client.apply(updates[0]) and client.players == room_players(room), client.players
+
+    room.scores["bob"] = 5
+    room.mark_player_changed("bob", "score")
+    await next_tick()
+    delta = alice.player_updates()[-1]
+    assert delta["players"] == [{"name": "bob", "score": 5}], delta
+    assert not client.apply(delta) and client.players == room_players(room), client.players
+    print("ok: changes within a tick go out as one delta with only the changed fields")
+    return alice, client
+
+
+async def check_removed(room: GameRoom, alice: RecordingConnection, client: PlayerListClient):
+    await join(room, "carol")
+    await room.disconnect("carol")
+    await room.disconnect("alice")
+    bob = room.players["bob"]
+    await next_tick()
+
+    delta = bob.player_updates()[-1]
+    assert delta["removed"] == ["alice", "carol"], delta
+    assert [change["name"] for change in delta["players"]] == ["bob"] and delta["players"][0]["isHost"], delta
+    assert len(alice.player_updates()) == 2, "a player who left still got updates"
+
+    bob_client = PlayerListClient({"playersVersion": delta["version"] - 1, "players": list(client.players.values())})
+    assert not bob_client.apply(delta) and bob_client.players == room_players(room), bob_client.players
+
+    await join(room, "dave")
+    await room.disconnect("dave")
+    await join(room, "dave")
+    await next_tick()
+    delta = bob.player_updates()[-1]
+    assert "removed" not in delta and [change["name"] for change in delta["players"]] == ["dave"], delta
+    assert not bob_client.apply(delta) and bob_client.players == room_players(room), bob_client.players
+    print("ok: players who leave are listed in removed, and rejoining within the tick cancels it")
+    return bob, bob_client
+
+
+async def check_resync_after_gap(room: GameRoom, bob: RecordingConnection, client: PlayerListClient):
+    for score in (1, 2):
+        room.scores["dave"] = score
+        room.mark_player_changed("dave", "score")
+        await next_tick()
+    missed, gapped = bob.player_updates()[-2:]
+    assert gapped["version"] == missed["version"] + 1, (missed, gapped)
+    assert client.apply(gapped), "a delta after a missed version was applied"
+    assert client.version == missed["version"] - 1
+
+    await room.handle_message("bob", {"type": "resync_players"})
+    snapshot = bob.player_updates()[-1]
+    assert snapshot["full"] and snapshot["version"] == room.players_version, snapshot
+    assert not client.apply(snapshot) and client.players == room_players(room), client.players
+
+    room.scores["bob"] = 7
+    room.mark_player_changed("bob", "score")
+    await next_tick()
+    assert not client.apply(bob.player_updates()[-1]) and client.players == room_players(room), client.players
+    print("ok: a client that misses a version resyncs from a full snapshot and applies later deltas")
+
+
+async def main():
+    scheduler = RoundScheduler()
+    scheduler.start()
+    room = GameRoom("check", types.SimpleNamespace(round_scheduler=scheduler))
+    try:
+        alice, client = await check_merge_within_tick(room)
+        bob, bob_client = await check_removed(room, alice, client)
+        await check_resync_after_gap(room, bob, bob_client)
+    finally:
+        await scheduler.stop()
+    print("All player update checks passed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
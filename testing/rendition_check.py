@@ -0,0 +1,126 @@
+# rendition_check.py
+# Checks the game server's adaptive frame renditions: encode_renditions only produces rungs
+# smaller than the frame, RenditionEncoder builds each intermediate frame's ladder once (the
+# original first, then WebP rungs) and falls back to the original for final or undecodable
+# frames, pick_rendition compares each rendition in the bytes the player's
+# transport sends (base64 text for JSON, raw bytes plus a header for binary) against the measured
+# throughput and steps down after dropped frames, and a player relayed by another worker gets the
+# throughput that worker measured.
+# Runs in-process; needs Pillow.
+# Run from the repository root:
+#   python testing/rendition_check.py
+
+import asyncio
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import (
+    RENDITION_CONFIG, ConnectionManager, PlayerConnection, RenditionEncoder, encode_renditions,
+)
+from backend.observability import CODEC_JPEG, CODEC_WEBP
+
+LADDER = [(384, 70), (192, 55)]
+
+
+def jpeg(size: int) -> bytes:
+    output = io.BytesIO()
+    Image.effect_noise((size, size), 64).convert("RGB").save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def check_encode_renditions():
+    sizes = {side: [Image.open(io.BytesIO(image)).size[0] for image in encode_renditions(jpeg(side), LADDER)]
+             for side in (512, 300, 192, 64)}
+    assert sizes == {512: [384, 192], 300: [192], 192: [], 64: []}, sizes
+    print("ok: only rungs smaller than the frame are encoded, so latent-sized previews are left alone")
+
+
+async def check_rendition_encoder():
+    encoder = RenditionEncoder(dict(RENDITION_CONFIG, LADDER=LADDER))
+
+    def frame(image: bytes, final: bool = False):
+        return {"step": 3, "total_steps": 8, "final": final, "codec": CODEC_JPEG, "image": image}
+
+    original = frame(jpeg(512))
+    encoder.start(original)
+    ladder = await encoder.ladder_for(original)
+    assert await encoder.ladder_for(original) is ladder, "the ladder was encoded twice"
+    assert ladder[0] is original and [rung["codec"] for rung in ladder[1:]] == [CODEC_WEBP, CODEC_WEBP], ladder
+    assert all(rung["step"] == 3 and rung["total_steps"] == 8 and not rung["final"] for rung in ladder)
+    sizes = [len(rung["image"]) for rung in ladder]
+    assert sizes == sorted(sizes, reverse=True), sizes
+
+    final, broken, unstarted = frame(jpeg(512), final=True), frame(b"not an image"), frame(jpeg(512))
+    for untouched in (final, broken):
+        encoder.start(untouched)
+        assert await encoder.ladder_for(untouched) == [untouched]
+    assert await encoder.ladder_for(unstarted) == [unstarted]
+    encoder.close()
+    print("ok: each frame's ladder is encoded once, and final or undecodable frames are sent as they are")
+
+
+def check_pick_rendition():
+    ladder = [{"image": bytes(30000)}, {"image": bytes(12000)}, {"image": bytes(3000)}]
+    headroom = RENDITION_CONFIG["HEADROOM"]
+    # 36000 bytes per 100ms frame after headroom: the original fits as raw bytes, not as base64 (40000).
+    binary, text = PlayerConnection(None, "binary"), PlayerConnection(None, "json")
+    for player in (binary, text):
+        player.throughput_bps = 360000 / headroom
+    assert binary.pick_rendition(ladder, 0.1) == 0 and text.pick_rendition(ladder, 0.1) == 1
+    assert PlayerConnection(None, "json").pick_rendition(ladder, 0.1) == 0, "an unmeasured player starts at full size"
+
+    binary.dropped_frames = 1
+    assert binary.pick_rendition(ladder, 0.1) == 1 and binary.dropped_frames == 0
+    binary.dropped_frames = 3
+    assert binary.pick_rendition(ladder, 0.1) == 2
+    binary.dropped_frames = 1
+    assert binary.pick_rendition(ladder, 0.1) == 2, "the smallest rendition is the floor"
+    print("ok: renditions are picked in the bytes each transport sends, and step down after dropped frames")
+
+
+async def check_relayed_player_throughput():
+    RENDITION_CONFIG["REPORT_INTERVAL_S"] = 0.02
+    manager = ConnectionManager()
+    room = await manager.create_room()
+    manager.handle_worker_message({
+        "op": "join", "conn": "relayed", "worker": "other-worker",
+        "room_id": room.room_id, "player_name": "bob", "transport": "binary",
+    })
+    await asyncio.sleep(0.05)
+    bob = room.players["bob"]
+    assert bob.throughput_bps is None
+
+    # The relaying worker measures the socket and reports to the owner's channel.
+    forwarded = PlayerConnection(None, "binary")
+    forwarded.throughput_bps, forwarded.dropped_frames = 50000.0, 2
+    await manager.backend.subscribe("worker:owner", manager.handle_worker_message)
+    report = asyncio.create_task(manager.report_delivery(forwarded, "worker:owner", "relayed"))
+    await asyncio.sleep(0.1)
+    report.cancel()
+    await asyncio.gather(report, return_exceptions=True)
+    assert bob.throughput_bps == 50000.0 and bob.dropped_frames == 2, (bob.throughput_bps, bob.dropped_frames)
+    assert forwarded.dropped_frames == 0
+
+    manager.handle_worker_message({"op": "leave", "conn": "relayed"})
+    await asyncio.sleep(0.05)
+    assert "bob" not in room.players
+    await asyncio.gather(*(link.aclose() for link in manager.worker_links.values()))
+    manager.renditions.close()
+    print("ok: the worker relaying a player reports their throughput to the room owner")
+
+
+def main():
+    check_encode_renditions()
+    asyncio.run(check_rendition_encoder())
+    check_pick_rendition()
+    asyncio.run(check_relayed_player_throughput())
+    print("All rendition checks passed.")
+
+
+if __name__ == "__main__":
+    main()
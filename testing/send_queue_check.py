@@ -0,0 +1,116 @@
+# send_queue_check.py
+# Checks the game server's per-player send queue against a socket that stalls: while a player
+# is behind, a newer image_update or time_left replaces the queued one (latest wins) and every
+# other message is still delivered in order, a player whose queue grows past
+# SEND_MAX_QUEUED_MESSAGES or whose socket stalls for SEND_MAX_LAG_S is disconnected with 1013,
+# and close_after_flush writes everything queued before closing normally.
+# Runs PlayerConnections in-process against a stand-in websocket; no AI server is needed.
+# Run from the repository root:
+#   python testing/send_queue_check.py
+
+import asyncio
+import json
+import os
+import sys
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.game_server.game_server import SEND_CONFIG, PlayerConnection
+
+SEND_CONFIG.update(MAX_QUEUED_MESSAGES=8, MAX_LAG_S=0.3)
+
+
+class StallingWebSocket:
+    """Records what is written; writes wait while `flowing` is clear."""
+
+    def __init__(self):
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+        self.sent: List[dict] = []
+        self.closed_with: Optional[Tuple[int, str]] = None
+
+    async def send_text(self, data: str):
+        await self.flowing.wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int, reason: str):
+        self.closed_with = (code, reason)
+
+
+def queue(connection: PlayerConnection, message_type: str, payload):
+    connection.send_message({"type": message_type, "payload": payload})
+
+
+async def connect() -> Tuple[PlayerConnection, StallingWebSocket]:
+    websocket = StallingWebSocket()
+    connection = PlayerConnection(websocket)
+    connection.start()
+    # The first message is written straight away and leaves the writer waiting on the socket.
+    websocket.flowing.clear()
+    queue(connection, "chat", "hello")
+    await asyncio.sleep(0.01)
+    return connection, websocket
+
+
+async def check_latest_wins():
+    connection, websocket = await connect()
+    for step in range(1, 6):
+        queue(connection, "image_update", {"step": step})
+        queue(connection, "chat", f"message {step}")
+        queue(connection, "time_left", 60 - step)
+    assert len(connection.queue) == 7 and connection.dropped_messages == 8, list(connection.queue)
+    assert connection.dropped_frames == 4
+
+    websocket.flowing.set()
+    await asyncio.sleep(0.05)
+    delivered = [(message["type"], message["payload"]) for message in websocket.sent]
+    # The newest frame and timer go to the back of the queue, behind everything queued before them.
+    assert delivered == [
+        ("chat", "hello"), *[("chat", f"message {step}") for step in range(1, 5)],
+        ("image_update", {"step": 5}), ("chat", "message 5"), ("time_left", 55),
+    ], delivered
+    assert not connection.closed and websocket.closed_with is None
+    await connection.aclose()
+    print("ok: a player who falls behind gets only the latest frame and timer, and every other message in order")
+
+
+async def check_slow_consumer_disconnected():
+    connection, websocket = await connect()
+    for i in range(SEND_CONFIG["MAX_QUEUED_MESSAGES"] + 1):
+        queue(connection, "chat", f"message {i}")
+    await asyncio.sleep(0.01)
+    assert connection.closed and not connection.queue and websocket.closed_with == (1013, "slow_consumer")
+    queue(connection, "chat", "after close")
+    assert not connection.queue, "queued a message for a disconnected player"
+    await connection.aclose()
+
+    connection, websocket = await connect()
+    await asyncio.sleep(SEND_CONFIG["MAX_LAG_S"] + 0.1)
+    assert connection.closed and websocket.closed_with == (1013, "slow_consumer"), websocket.closed_with
+    await connection.aclose()
+    print("ok: a player whose queue overflows or whose socket stalls is disconnected as a slow consumer")
+
+
+async def check_close_after_flush():
+    connection, websocket = await connect()
+    queue(connection, "round_end", {"prompt": "a cat"})
+    connection.close_after_flush("room_closed")
+    queue(connection, "chat", "too late")
+    websocket.flowing.set()
+    await asyncio.sleep(0.05)
+    assert [message["type"] for message in websocket.sent] == ["chat", "round_end"], websocket.sent
+    assert websocket.closed_with == (1000, "room_closed") and connection.closed
+    await connection.aclose()
+    print("ok: close_after_flush writes what was already queued, then closes normally")
+
+
+async def main():
+    await check_latest_wins()
+    await check_slow_consumer_disconnected()
+    await check_close_after_flush()
+    print("All send queue checks passed.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())